@@ -9,6 +9,7 @@ from flask_mail import Mail
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_migrate import Migrate # <-- 1. IMPORTAR MIGRATE
+from flask_redis import FlaskRedis
 from dotenv import load_dotenv
 import os
 import logging
@@ -32,13 +33,16 @@ limiter = Limiter(
     storage_uri=os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
 )
 migrate = Migrate() # <-- 2. INICIALIZAR MIGRATE
+redis_client = FlaskRedis(decode_responses=True)
 
 @login_manager.user_loader
 def load_user(user_id):
-    from .models import User
-    return User.query.get(int(user_id))
+    # Identidade em cache (memória + Redis): evita uma consulta ao utilizador em cada pedido autenticado.
+    from .services.identidade import carregar_identidade
+    return carregar_identidade(int(user_id))
 
-def create_app():
+def create_app(config=None):
+    """Cria a aplicação. `config` sobrepõe-se às definições lidas do ambiente (usado pelos testes)."""
     app = Flask(__name__, instance_relative_config=True)
 
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
@@ -55,21 +59,37 @@ def create_app():
     app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
     app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
     
+    app.config['REDIS_URL'] = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
     app.config['STRIPE_PUBLIC_KEY'] = os.getenv('STRIPE_PUBLIC_KEY')
     stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
 
+    if config:
+        app.config.update(config)
+
     db.init_app(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
     cache.init_app(app)
     mail.init_app(app)
     migrate.init_app(app, db) # <-- 3. CONECTAR MIGRATE COM O APP E O DB
+    redis_client.init_app(app)
     if not app.debug:
         limiter.init_app(app)
 
+    from .services.perfil_db import PERFIL_DB_ATIVO, iniciar_perfil_db
+    if PERFIL_DB_ATIVO:
+        iniciar_perfil_db(app)
+
     from .routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
 
+    from .commands import api_football_cli, analises_cli, visualizacoes_cli, perfil_db_cli
+    app.cli.add_command(api_football_cli)
+    app.cli.add_command(analises_cli)
+    app.cli.add_command(visualizacoes_cli)
+    app.cli.add_command(perfil_db_cli)
+
     # REMOVA OU COMENTE ESTA PARTE PARA QUE O MIGRATE CONTROLE A CRIAÇÃO DE TABELAS
     # with app.app_context():
     #     db.create_all()
@@ -0,0 +1,97 @@
+# app/commands.py
+import json
+import click
+from flask.cli import AppGroup
+
+api_football_cli = AppGroup('api-football', help='Ferramentas de acompanhamento da API-Football.')
+
+
+@api_football_cli.command('cota')
+def mostrar_cota():
+    """Mostra o orçamento atual de pedidos à API-Football partilhado pelos workers."""
+    from app.services.cota_api import governador
+    click.echo(json.dumps(governador.obter_orcamento(), indent=2))
+
+
+analises_cli = AppGroup('analises', help='Geração antecipada de análises.')
+
+
+@analises_cli.command('pregerar')
+@click.option('--data', 'data_para_buscar', default=None, help="Data no formato YYYY-MM-DD (por omissão, amanhã).")
+@click.option('--workers', default=None, type=int, help="Número de partidas analisadas em paralelo.")
+@click.option('--tentativas', default=None, type=int, help="Tentativas por partida antes de desistir.")
+@click.option('--modo', type=click.Choice(['direto', 'batch']), default='direto', show_default=True,
+              help="'batch' envia todos os prompts num lote da Batch API da OpenAI (mais barato, até 24h).")
+@click.option('--batch-id', default=None, help="Retoma um lote já submetido (apenas com --modo batch).")
+def pregerar(data_para_buscar, workers, tentativas, modo, batch_id):
+    """Gera as análises de todas as partidas de uma data para que os utilizadores só leiam da base de dados."""
+    from app.services import pregeracao
+    if modo == 'batch':
+        from app.services import ia_batch
+        resumo = ia_batch.pregerar_em_lote(data_para_buscar, workers=workers or pregeracao.PREGERACAO_WORKERS, batch_id=batch_id)
+        click.echo(json.dumps(resumo, indent=2))
+        return
+    resumo = pregeracao.pregerar_analises(
+        data_para_buscar,
+        workers=workers or pregeracao.PREGERACAO_WORKERS,
+        tentativas=tentativas or pregeracao.PREGERACAO_TENTATIVAS
+    )
+    click.echo(json.dumps(resumo, indent=2))
+
+
+@analises_cli.command('agendador')
+@click.option('--hora', default='03:00', help="Hora diária de execução (HH:MM, São Paulo).")
+@click.option('--workers', default=None, type=int, help="Número de partidas analisadas em paralelo.")
+def agendador(hora, workers):
+    """Processo contínuo que pré-gera todos os dias as análises do dia seguinte."""
+    from app.services import pregeracao
+    pregeracao.executar_agendador(hora, workers=workers or pregeracao.PREGERACAO_WORKERS)
+
+
+@analises_cli.command('progresso')
+@click.option('--data', 'data_para_buscar', default=None, help="Data no formato YYYY-MM-DD (por omissão, amanhã).")
+def progresso(data_para_buscar):
+    """Mostra o progresso registado da pré-geração de uma data."""
+    from app.services import pregeracao
+    click.echo(json.dumps(pregeracao.obter_progresso(data_para_buscar or pregeracao.data_de_amanha()), indent=2))
+
+
+@analises_cli.command('particoes')
+@click.option('--meses', default=None, type=int, help="Meses futuros a preparar além do corrente.")
+def particoes(meses):
+    """Cria as partições mensais da tabela de análises que ainda não existem."""
+    from app.services import arquivo
+    criadas = arquivo.garantir_particoes(meses if meses is not None else arquivo.PARTICOES_MESES_A_FRENTE)
+    click.echo(f"Partições criadas: {', '.join(criadas) or 'nenhuma'}.")
+
+
+@analises_cli.command('arquivar')
+@click.option('--dias', default=None, type=int, help="Horizonte em dias; meses inteiros anteriores são arquivados.")
+@click.option('--dias-visualizacoes', default=None, type=int, help="Horizonte em dias das visualizações diárias a manter.")
+def arquivar(dias, dias_visualizacoes):
+    """Move as análises antigas para o arquivo comprimido e apaga as visualizações diárias antigas."""
+    from app.services import arquivo
+    resumo = arquivo.arquivar_analises(dias if dias is not None else arquivo.ARQUIVO_HORIZONTE_DIAS)
+    resumo['visualizacoes_apagadas'] = arquivo.purgar_visualizacoes(
+        dias_visualizacoes if dias_visualizacoes is not None else arquivo.VISUALIZACOES_HORIZONTE_DIAS)
+    click.echo(json.dumps(resumo, indent=2))
+
+
+visualizacoes_cli = AppGroup('visualizacoes', help='Contagem de visualizações do plano gratuito.')
+
+
+@visualizacoes_cli.command('descarregar')
+def descarregar_visualizacoes():
+    """Grava já na base de dados as visualizações que estão na fila do Redis (útil antes de um deploy)."""
+    from app.services.visualizacoes import medidor
+    click.echo(f"{medidor.descarregar()} visualizações gravadas.")
+
+
+perfil_db_cli = AppGroup('perfil-db', help='Métricas das consultas SQL por endpoint (requer PERFIL_DB=1).')
+
+
+@perfil_db_cli.command('relatorio')
+def relatorio_perfil_db():
+    """Mostra as médias de consultas, tempo de base de dados e espera no pool por endpoint."""
+    from app.services.perfil_db import obter_metricas
+    click.echo(json.dumps(obter_metricas(), indent=2))
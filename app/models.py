@@ -2,7 +2,10 @@
 # app/models.py
 from . import db
 from flask_login import UserMixin
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime, date
+import json
+import zlib
 from itsdangerous import URLSafeTimedSerializer as Serializer
 from flask import current_app
 
@@ -34,21 +37,71 @@ class User(db.Model, UserMixin):
 
 # ... (resto do arquivo models.py sem alterações)
 class Analysis(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, db.Sequence('analysis_id_seq'), primary_key=True)
     match_api_id = db.Column(db.Integer, nullable=False)
-    analysis_date = db.Column(db.String(10), nullable=False) # Formato 'YYYY-MM-DD'
-    content = db.Column(db.Text, nullable=False) # Guarda o JSON completo da análise
+    # Chave de partição (uma partição por mês); por isso faz parte da chave primária.
+    analysis_date = db.Column(db.Date, primary_key=True)
+    content = db.Column(JSONB, nullable=False) # Guarda o JSON completo da análise
     generated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    __table_args__ = (db.Index('idx_match_date', "match_api_id", "analysis_date"), )
+
+    # Campos do card projetados do conteúdo, para listagens que não precisam da análise completa.
+    mandante_nome = db.Column(db.String(100))
+    mandante_escudo = db.Column(db.String(255))
+    visitante_nome = db.Column(db.String(100))
+    visitante_escudo = db.Column(db.String(255))
+    liga_nome = db.Column(db.String(100))
+    horario = db.Column(db.String(5)) # Horário de início em São Paulo, 'HH:MM'
+    recomendacao = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index('idx_match_date', "match_api_id", "analysis_date", unique=True),
+        {'postgresql_partition_by': 'RANGE (analysis_date)'}
+    )
+
+    # Colunas suficientes para montar um card; usar com load_only para não carregar o conteúdo.
+    CARD_COLUMNS = ('id', 'mandante_nome', 'mandante_escudo', 'visitante_nome', 'visitante_escudo', 'liga_nome', 'horario', 'recomendacao')
 
     def __repr__(self):
         return f"Analysis for match {self.match_api_id} on {self.analysis_date}"
 
+    def to_card(self):
+        return {
+            "horario": self.horario,
+            "mandante_nome": self.mandante_nome,
+            "visitante_nome": self.visitante_nome,
+            "mandante_escudo": self.mandante_escudo,
+            "visitante_escudo": self.visitante_escudo,
+            "liga_nome": self.liga_nome,
+            "recomendacao": self.recomendacao,
+            "analysis_id": self.id
+        }
+
+class AnalysisArquivo(db.Model):
+    """Análises antigas movidas da tabela particionada (ver services/arquivo.py), com o conteúdo comprimido."""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    match_api_id = db.Column(db.Integer, nullable=False)
+    analysis_date = db.Column(db.Date, nullable=False)
+    generated_at = db.Column(db.DateTime, nullable=False)
+    mandante_nome = db.Column(db.String(100))
+    visitante_nome = db.Column(db.String(100))
+    conteudo_comprimido = db.Column(db.LargeBinary, nullable=False) # JSON da análise comprimido com zlib
+
+    @staticmethod
+    def comprimir(content):
+        return zlib.compress(json.dumps(content, ensure_ascii=False).encode('utf-8'), 9)
+
+    @property
+    def content(self):
+        return json.loads(zlib.decompress(self.conteudo_comprimido).decode('utf-8'))
+
+    def __repr__(self):
+        return f"Archived analysis for match {self.match_api_id} on {self.analysis_date}"
+
 class DailyUserView(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     analysis_id = db.Column(db.Integer, nullable=False)
-    view_date = db.Column(db.Date, nullable=False, default=date.today)
+    view_date = db.Column(db.Date, nullable=False, default=date.today, index=True)
 
     __table_args__ = (db.UniqueConstraint('user_id', 'analysis_id', 'view_date', name='_user_analysis_date_uc'),)
 
@@ -1,20 +1,25 @@
 # app/routes.py
 
 from flask import (render_template, url_for, flash, redirect, Blueprint, 
-                   request, Response, stream_with_context, jsonify, make_response)
+                   request, Response, stream_with_context, jsonify, make_response, abort)
 from . import db, bcrypt, mail, limiter 
-from app.models import User, Analysis, DailyUserView, ContactMessage
+from app.models import User, Analysis, ContactMessage
 import os
 from flask_mail import Message
 from flask_login import login_user, current_user, logout_user, login_required
 from datetime import date, datetime
-import json
 from functools import wraps
 import stripe
+from sqlalchemy.orm import load_only
 
 from app.forms import (RegistrationForm, LoginForm, RequestResetForm, ResetPasswordForm, 
                        ChangePasswordForm, ContactForm)
-from app.services.analysis_logic import gerar_analises
+from app.services.analysis_logic import obter_snapshot
+from app.services.transmissao import transmitir_eventos, formatar_eventos_sse
+from app.services import sitemap as sitemap_service
+from app.services.visualizacoes import medidor as medidor_visualizacoes
+from app.services.identidade import invalidar_identidade
+from app.services.arquivo import obter_analise
 
 main = Blueprint('main', __name__)
 
@@ -60,18 +65,20 @@ def confirmed_required(f):
 @login_required
 def create_checkout_session():
     price_id = request.form.get('price_id')
+    user = current_user.modelo()
     
-    if not current_user.stripe_customer_id:
+    if not user.stripe_customer_id:
         customer = stripe.Customer.create(
-            email=current_user.email,
-            name=current_user.username
+            email=user.email,
+            name=user.username
         )
-        current_user.stripe_customer_id = customer.id
+        user.stripe_customer_id = customer.id
         db.session.commit()
+        invalidar_identidade(user.id)
 
     try:
         checkout_session = stripe.checkout.Session.create(
-            customer=current_user.stripe_customer_id,
+            customer=user.stripe_customer_id,
             line_items=[
                 {
                     "price": price_id,
@@ -130,6 +137,7 @@ def stripe_webhook():
             if user:
                 user.subscription_tier = 'member'
                 db.session.commit()
+                invalidar_identidade(user.id)
                 print(f"Assinatura ativada para o usuário: {user.email}")
 
     if event['type'] == 'invoice.payment_succeeded':
@@ -140,6 +148,7 @@ def stripe_webhook():
             if user:
                 user.subscription_tier = 'member'
                 db.session.commit()
+                invalidar_identidade(user.id)
                 print(f"Assinatura renovada para o usuário: {user.email}")
 
     if event['type'] == 'customer.subscription.deleted' or (event['type'] == 'customer.subscription.updated' and event['data']['object'].get('cancel_at_period_end')):
@@ -150,6 +159,7 @@ def stripe_webhook():
             if user:
                 user.subscription_tier = 'free'
                 db.session.commit()
+                invalidar_identidade(user.id)
                 print(f"Assinatura cancelada para o usuário: {user.email}")
 
     return 'OK', 200
@@ -159,16 +169,9 @@ def stripe_webhook():
 @main.route("/")
 @main.route("/home")
 def index():
-    today_str = date.today().strftime('%Y-%m-%d')
-    todays_analyses_db = Analysis.query.filter_by(analysis_date=today_str).all()
-    analyses_list = []
-    for analysis_obj in todays_analyses_db:
-        try:
-            analysis_data = json.loads(analysis_obj.content)
-            analysis_data['analysis_id'] = analysis_obj.id
-            analyses_list.append(analysis_data)
-        except json.JSONDecodeError:
-            continue
+    card_columns = [getattr(Analysis, column) for column in Analysis.CARD_COLUMNS]
+    todays_analyses_db = Analysis.query.options(load_only(*card_columns)).filter_by(analysis_date=date.today()).all()
+    analyses_list = [analysis_obj.to_card() for analysis_obj in todays_analyses_db]
     page_description = "Análises de futebol para os jogos de hoje, geradas por Inteligência Artificial para ajudar nos seus prognósticos."
     return render_template('home.html', title='Início', description=page_description, analyses=analyses_list)
 
@@ -178,10 +181,9 @@ def index():
 def futebol():
     views_today_count = 0
     if current_user.is_authenticated and current_user.subscription_tier == 'free':
-        today = date.today()
-        views_today_count = DailyUserView.query.filter_by(user_id=current_user.id, view_date=today).count()
+        views_today_count = medidor_visualizacoes.contar(current_user.id)
     page_description = "Acesse análises de jogos de futebol do dia. Use os filtros para encontrar as partidas e veja os prognósticos da nossa IA."
-    return render_template('futebol.html', title='Análises de Futebol', description=page_description, views_today=views_today_count)
+    return render_template('futebol.html', title='Análises de Futebol', description=page_description, views_today=views_today_count, views_limit=medidor_visualizacoes.limite)
 
 @main.route("/basquete")
 @login_required
@@ -206,7 +208,12 @@ def api_analise():
     if current_user.is_authenticated:
         user_tier = current_user.subscription_tier
     data_selecionada = request.args.get('date', default=str(date.today()), type=str)
-    return Response(stream_with_context(gerar_analises(data_selecionada, user_tier)), mimetype='text/event-stream')
+    # Em reconexões o EventSource envia o ID do último evento recebido; o stream retoma a partir daí.
+    ultimo_id = request.headers.get('Last-Event-ID', default=0, type=int)
+    snapshot = obter_snapshot(data_selecionada)
+    if snapshot:
+        return Response(formatar_eventos_sse(snapshot, user_tier, ultimo_id), mimetype='text/event-stream')
+    return Response(stream_with_context(transmitir_eventos(data_selecionada, user_tier, ultimo_id)), mimetype='text/event-stream')
 
 # --- ROTAS DE AUTENTICAÇÃO E VERIFICAÇÃO ---
 @main.route("/register", methods=['GET', 'POST'])
@@ -257,6 +264,7 @@ def confirm_email(token):
     if user and user.id == current_user.id:
         user.email_verified = True
         db.session.commit()
+        invalidar_identidade(user.id)
         flash('A sua conta foi verificada com sucesso!', 'success')
     else:
         flash('O link de confirmação é inválido ou expirou.', 'danger')
@@ -274,7 +282,7 @@ def unconfirmed():
 def resend_confirmation():
     if current_user.email_verified:
         return redirect(url_for('main.futebol'))
-    send_verification_email(current_user)
+    send_verification_email(current_user.modelo())
     flash('Um novo e-mail de confirmação foi enviado para a sua caixa de entrada.', 'success')
     return redirect(url_for('main.unconfirmed'))
 
@@ -313,6 +321,7 @@ def reset_token(token):
         hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
         user.password = hashed_password
         db.session.commit()
+        invalidar_identidade(user.id)
         flash('A sua senha foi atualizada! Já pode fazer login.', 'success')
         return redirect(url_for('main.login'))
         
@@ -327,24 +336,16 @@ def analysis_detail(analysis_id):
     limit_reached = False
     
     if current_user.is_authenticated and current_user.subscription_tier == 'free':
-        today = date.today()
-        
-        views_today = DailyUserView.query.filter_by(user_id=current_user.id, view_date=today).all()
-        is_already_viewed = any(view.analysis_id == analysis_id for view in views_today)
-        
-        if not is_already_viewed and len(views_today) >= 3:
-            limit_reached = True
-        
-        elif not is_already_viewed:
-            new_view = DailyUserView(user_id=current_user.id, analysis_id=analysis_id, view_date=today)
-            db.session.add(new_view)
-            db.session.commit()
+        limit_reached = not medidor_visualizacoes.registar(current_user.id, analysis_id)
 
-    analysis_obj = Analysis.query.get_or_404(analysis_id)
-    analysis_data = json.loads(analysis_obj.content)
+    # As análises antigas saem da tabela particionada para o arquivo, mas o link continua válido.
+    analysis_obj = obter_analise(analysis_id)
+    if analysis_obj is None:
+        abort(404)
+    analysis_data = analysis_obj.content
     
-    page_title = f"{analysis_data.get('mandante_nome', 'Análise')} vs {analysis_data.get('visitante_nome', 'Detalhada')}"
-    page_description = f"Análise detalhada e prognóstico para o jogo entre {analysis_data.get('mandante_nome')} e {analysis_data.get('visitante_nome')}. Veja estatísticas, mercados favoráveis e o cenário mais provável gerado por IA."
+    page_title = f"{analysis_obj.mandante_nome or 'Análise'} vs {analysis_obj.visitante_nome or 'Detalhada'}"
+    page_description = f"Análise detalhada e prognóstico para o jogo entre {analysis_obj.mandante_nome} e {analysis_obj.visitante_nome}. Veja estatísticas, mercados favoráveis e o cenário mais provável gerado por IA."
     
     return render_template('analysis_detail.html', 
                            title=page_title, 
@@ -363,10 +364,12 @@ def account():
 def change_password():
     form = ChangePasswordForm()
     if form.validate_on_submit():
-        if bcrypt.check_password_hash(current_user.password, form.current_password.data):
+        user = current_user.modelo()
+        if bcrypt.check_password_hash(user.password, form.current_password.data):
             hashed_password = bcrypt.generate_password_hash(form.new_password.data).decode('utf-8')
-            current_user.password = hashed_password
+            user.password = hashed_password
             db.session.commit()
+            invalidar_identidade(user.id)
             flash('A sua senha foi alterada com sucesso!', 'success')
         else:
             flash('A sua senha atual está incorreta. Por favor, tente novamente.', 'danger')
@@ -380,8 +383,10 @@ def change_password():
 @main.route("/account/delete", methods=['POST'])
 @login_required
 def delete_account():
-    db.session.delete(current_user)
+    user = current_user.modelo()
+    db.session.delete(user)
     db.session.commit()
+    invalidar_identidade(user.id)
     logout_user()
     flash('A sua conta foi excluída com sucesso.', 'info')
     return redirect(url_for('main.index'))
@@ -436,29 +441,23 @@ def contact():
 
 @main.route('/sitemap.xml')
 def sitemap():
-    """Gera o sitemap.xml dinamicamente."""
-    pages = []
-    lastmod = datetime.now().strftime('%Y-%m-%d')
-
-    static_urls = [
-        url_for('main.index', _external=True),
-        url_for('main.futebol', _external=True),
-        url_for('main.plans', _external=True),
-        url_for('main.terms', _external=True),
-        url_for('main.privacy', _external=True),
-        url_for('main.contact', _external=True),
-    ]
-    for url in static_urls:
-        pages.append({'loc': url, 'lastmod': lastmod, 'changefreq': 'daily', 'priority': '0.8'})
-
-    analyses = Analysis.query.order_by(Analysis.generated_at.desc()).all()
-    for analysis in analyses:
-        url = url_for('main.analysis_detail', analysis_id=analysis.id, _external=True)
-        analysis_lastmod = analysis.generated_at.strftime('%Y-%m-%d')
-        pages.append({'loc': url, 'lastmod': analysis_lastmod, 'changefreq': 'weekly', 'priority': '1.0'})
-
-    sitemap_xml = render_template('sitemap_template.xml', pages=pages)
+    """Sitemap index: aponta para o sitemap das páginas estáticas e para os sitemaps paginados das análises."""
+    return _xml_response(sitemap_service.gerar_indice())
+
+@main.route('/sitemap-paginas.xml')
+def sitemap_paginas():
+    return _xml_response(sitemap_service.gerar_sitemap_paginas())
+
+@main.route('/sitemap-analises-<int:pagina>.xml')
+def sitemap_analises(pagina):
+    sitemap_xml = sitemap_service.gerar_sitemap_analises(pagina) if pagina >= 1 else None
+    if sitemap_xml is None:
+        abort(404)
+    if not isinstance(sitemap_xml, str):
+        sitemap_xml = stream_with_context(sitemap_xml)
+    return _xml_response(sitemap_xml)
+
+def _xml_response(sitemap_xml):
     response = make_response(sitemap_xml)
     response.headers["Content-Type"] = "application/xml"
-
-    return response
\ No newline at end of file
+    return response
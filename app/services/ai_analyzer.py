@@ -3,9 +3,18 @@
 import os
 import openai
 import json
+import hashlib
+import re
+import redis
 from flask import current_app
+from app import cache, redis_client
 from . import football_api
 
+try:
+    import tiktoken
+except ImportError:  # a contagem de tokens passa a ser uma estimativa (ver contar_tokens)
+    tiktoken = None
+
 # --- Novas importações do Pydantic ---
 from pydantic import BaseModel, ValidationError
 from typing import List, Dict
@@ -51,22 +60,32 @@ try:
 except Exception as e:
     print(f"❌ ERRO: Não foi possível configurar a IA da OpenAI. Erro: {e}")
 
+MODELO_IA = os.getenv('OPENAI_MODELO', 'gpt-4o')
+TEMPERATURA_IA = 0.5
+# Incrementar sempre que o prompt mudar de forma relevante: invalida as respostas guardadas em cache.
+IA_PROMPT_VERSAO = 5
+MENSAGEM_SISTEMA = "Você é um analista de futebol que gera análises detalhadas em formato JSON."
 
-def gerar_analise_ia(partida, dados_para_analise):
-    """Gera a análise de uma partida usando o modelo da OpenAI e valida a sua estrutura."""
-    if not client:
-        current_app.logger.error("Tentativa de gerar análise com o cliente da OpenAI não configurado.")
-        return None, "Erro na IA: IA não configurada."
-    
-    dados_json_str = json.dumps(dados_para_analise, indent=2)
+# Validade (segundos) das respostas da IA em cache; 0 = sem expiração (a remoção fica a cargo da política
+# maxmemory do Redis).
+IA_CACHE_TIMEOUT = int(os.getenv('IA_CACHE_TIMEOUT', 30 * 86400))
+IA_LOCK_TIMEOUT = 300
+# Espera máxima por outro pedido com o mesmo prompt. Corre dentro da espera de analisar_partida
+# (ANALISE_LOCK_ESPERA), que passa o tempo que lhe resta em `espera_lock`; esgotada, segue sem coordenação.
+IA_LOCK_ESPERA = int(os.getenv('IA_LOCK_ESPERA', 30))
+# Em streaming o mercado principal chega ao cliente assim que é escrito, em vez de no fim da resposta.
+IA_STREAMING = os.getenv('IA_STREAMING', '1').lower() in ['true', 'on', '1']
+# "mercado_principal": "<string JSON completa>" (só casa depois de a aspa de fecho ter chegado).
+PADRAO_MERCADO_PRINCIPAL = re.compile(r'"mercado_principal"\s*:\s*"((?:[^"\\]|\\.)*)"')
 
-    # --- Prompt (sem alterações) ---
-    prompt = f"""
-    Você é o "Mat, o Analista", um especialista em apostas esportivas que segue um sistema rigoroso e conservador baseado em dados quantitativos. Sua análise deve ser baseada EXCLUSIVAMENTE nos dados fornecidos.
+# Orçamento de tokens de entrada por análise; prompts acima dele não são enviados.
+IA_PROMPT_MAX_TOKENS = int(os.getenv('IA_PROMPT_MAX_TOKENS', 4000))
 
-    Crie um relatório pré-jogo para a partida entre {partida['mandante_nome']} e {partida['visitante_nome']}.
+# Colunas do histórico enviadas à IA; escudos e outros campos só usados na interface ficam de fora.
+COLUNAS_HISTORICO = ('data', 'mandante_nome', 'mandante_gols', 'visitante_gols', 'visitante_nome', 'total_gols', 'diferenca_gols')
 
-    ⚠️ INSTRUÇÕES DE ANÁLISE (SIGA ESTA LÓGICA PASSO A PASSO):
+# Instruções completas: a IA aplica ela própria as regras dos PASSOS 1 a 4.
+INSTRUCOES_PASSOS = """    ⚠️ INSTRUÇÕES DE ANÁLISE (SIGA ESTA LÓGICA PASSO A PASSO):
 
     **PASSO 1: Análise de Gols (Over/Under)**
     1.  Observe a quantidade de gols nos "ultimos_jogos_mandante", "ultimos_jogos_visitante" e "confrontos_diretos", analise "total_gols" de cada jogo e encontre padrões.
@@ -84,7 +103,7 @@ def gerar_analise_ia(partida, dados_para_analise):
     5.  **REGRA CRÍTICA:** Se não houver confronto direto evite sugerir mercados de vencedor. É necessário ter dados de confronto direto para tomar uma decisão para este mercado.
 
     **PASSO 3: Análise de Escanteios e Cartões**
-    1. **Análise o total de escanteios e o total de cartões para cada partida individualmente dos ultimos jogos de ambas as equipas e nos confrontos diretos.**
+    1. **Análise o total de escanteios e o total de cartões para cada partida individualmente dos ultimos jogos de ambas as equipas e nos confrontos diretos (secção TOTAIS_PARTIDA; a secção ESTATISTICAS tem apenas os números de cada time).**
     2. Procure um padrão consistente nos totais. A tendência (consistentemente acima ou abaixo de um número) deve repetir-se na maioria dos jogos e ser semelhante nos quatros conjuntos de dados (forma do mandante, forma do visitante e H2H).
     3. Se encontrar um padrão claro, sugira um mercado com uma margem de segurança.
         Exemplo Over: Se os totais de escanteios são consistentemente 10, 11, 12, uma sugestão conservadora é "Mais de 8.5 Escanteios".
@@ -97,9 +116,161 @@ def gerar_analise_ia(partida, dados_para_analise):
 
     **REGRA CRÍTICA: Sempre sugira o mercado com uma margem de segurança, por exemplo se over 2.5 está forte fale sobre isso mas sua sugestão é over 1.5 para ter uma margem de seguraça.**
 
-    DADOS ESTATÍSTICOS PARA ANÁLISE:
-    ```json
-    {dados_json_str}
+"""
+
+# Instruções quando a pré-análise já aplicou os PASSOS 1 a 3 (pre_analise): só falta escolher e redigir.
+INSTRUCOES_CANDIDATOS = """    ⚠️ INSTRUÇÕES DE ANÁLISE:
+
+    Os mercados em "CANDIDATOS" já foram calculados a partir dos dados: cada um cumpre as regras de consistência
+    entre a forma do mandante, a forma do visitante e o confronto direto, já com margem de segurança.
+    1.  Escolha o "mercado_principal" APENAS entre os CANDIDATOS (normalmente o de maior confiança). Não invente
+        outros mercados nem altere as linhas.
+    2.  "mercados_favoraveis" contém apenas CANDIDATOS; use a evidência de cada um na justificativa.
+    3.  O mercado em "cenario_provavel" DEVE SER EXATAMENTE o "mercado_principal".
+    4.  Descreva a forma das equipas e o confronto direto com base nos dados estatísticos.
+
+"""
+
+_codificador = None
+
+
+def contar_tokens(texto):
+    """Tokens do texto no tokenizer do modelo (tiktoken); sem tiktoken, estimativa de 4 caracteres por token."""
+    global _codificador
+    if tiktoken is not None and _codificador is None:
+        try:
+            _codificador = tiktoken.encoding_for_model(MODELO_IA)
+        except Exception:
+            _codificador = tiktoken.get_encoding('o200k_base')
+    if _codificador is not None:
+        return len(_codificador.encode(texto))
+    return len(texto) // 4
+
+
+def formatar_dados_compactos(dados_para_analise):
+    """Serializa os dados da análise em tabelas de texto (uma linha por jogo, colunas separadas por |)."""
+    linhas = [f"HISTORICO_RECENTE (colunas: {'|'.join(COLUNAS_HISTORICO)})"]
+    for categoria, historico in dados_para_analise.get('historico_recente', {}).items():
+        jogos = historico.get('jogos', [])
+        linhas.append(f"{categoria}:" if jogos else f"{categoria}: sem jogos")
+        linhas.extend("|".join(str(jogo.get(coluna, '')) for coluna in COLUNAS_HISTORICO) for jogo in jogos)
+
+    linhas.append("ESTATISTICAS (escanteios/cartões do próprio time por jogo, não são totais da partida)")
+    for tipo_stat, times in dados_para_analise.get('estatisticas', {}).items():
+        for time, stats in times.items():
+            valores = " ".join(f"{nome}={','.join(map(str, dados['jogos'])) or '-'}" for nome, dados in stats.items())
+            linhas.append(f"{tipo_stat}.{time}: {valores}")
+
+    totais = dados_para_analise.get('totais_partida')
+    if totais:
+        linhas.append("TOTAIS_PARTIDA (escanteios/cartões dos dois times somados, por jogo; use estes para Over/Under)")
+        for conjunto, valores in totais.items():
+            linhas.append(f"{conjunto}: escanteios={','.join(map(str, valores['corners'])) or '-'} "
+                          f"cartoes={','.join(map(str, valores['cards'])) or '-'}")
+
+    candidatos = dados_para_analise.get('candidatos')
+    if candidatos:
+        linhas.append("CANDIDATOS (mercado|confianca|evidencia)")
+        linhas.extend(f"{c['mercado']}|{c['confianca']}|{c['evidencia']}" for c in candidatos)
+    return "\n".join(linhas)
+
+
+def parametros_pedido(mensagens):
+    """Corpo do pedido de chat completion (o mesmo nas chamadas diretas e nos pedidos em lote)."""
+    return {"messages": mensagens, "model": MODELO_IA, "response_format": {"type": "json_object"}, "temperature": TEMPERATURA_IA}
+
+
+def chave_cache_ia(mensagens):
+    """Chave endereçada pelo conteúdo: hash do pedido exato enviado à OpenAI (modelo, parâmetros e mensagens)."""
+    pedido = {'modelo': MODELO_IA, 'temperatura': TEMPERATURA_IA, 'versao_prompt': IA_PROMPT_VERSAO, 'mensagens': mensagens}
+    canonico = json.dumps(pedido, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return f"analise_ia:{hashlib.sha256(canonico.encode('utf-8')).hexdigest()}"
+
+
+def montar_mensagens(partida, dados_para_analise):
+    """Mensagens do pedido à OpenAI, ou None se o prompt exceder IA_PROMPT_MAX_TOKENS."""
+    prompt = montar_prompt(partida, dados_para_analise)
+    tokens_prompt = contar_tokens(prompt)
+    current_app.logger.info(f"Prompt de {partida['mandante_nome']} vs {partida['visitante_nome']}: {tokens_prompt} tokens.")
+    if tokens_prompt > IA_PROMPT_MAX_TOKENS:
+        current_app.logger.error(f"Prompt com {tokens_prompt} tokens excede o orçamento de {IA_PROMPT_MAX_TOKENS}.")
+        return None
+
+    return [
+        {"role": "system", "content": MENSAGEM_SISTEMA},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def gerar_analise_ia(partida, dados_para_analise, ao_mercado_principal=None, espera_lock=IA_LOCK_ESPERA):
+    """Gera a análise de uma partida usando o modelo da OpenAI e valida a sua estrutura.
+
+    As respostas validadas ficam em cache pela chave do conteúdo do pedido, por isso dados idênticos (a mesma
+    partida pedida noutra data, ou depois de um reinício) nunca são enviados duas vezes à OpenAI.
+    Se `ao_mercado_principal` for indicado (e IA_STREAMING estiver ativo), a resposta é recebida em streaming
+    e a função é chamada com o mercado principal assim que este estiver completo, antes da validação final.
+    `espera_lock` limita (em segundos) a espera por um pedido idêntico em curso; com 0 não espera.
+    """
+    if not client:
+        current_app.logger.error("Tentativa de gerar análise com o cliente da OpenAI não configurado.")
+        return None, "Erro na IA: IA não configurada."
+
+    mensagens = montar_mensagens(partida, dados_para_analise)
+    if mensagens is None:
+        return None, "Erro na IA: dados da partida excedem o orçamento de tokens."
+
+    chave = chave_cache_ia(mensagens)
+    resultado = cache.get(chave)
+    if resultado is not None:
+        current_app.logger.info(f"Análise de IA em cache para: {partida['mandante_nome']} vs {partida['visitante_nome']}")
+        return resultado, None
+
+    # Pedidos idênticos em simultâneo esperam pelo primeiro em vez de pagarem outra chamada.
+    lock = redis_client.lock(f"lock:{chave}", timeout=IA_LOCK_TIMEOUT)
+    try:
+        if espera_lock > 0:
+            adquirido = lock.acquire(blocking=True, blocking_timeout=espera_lock)
+        else:
+            adquirido = lock.acquire(blocking=False)
+        if not adquirido:
+            current_app.logger.info(f"Pedido idêntico em curso para {partida['mandante_nome']} vs {partida['visitante_nome']}; a gerar sem esperar mais.")
+    except redis.exceptions.RedisError as e:
+        current_app.logger.warning(f"Lock da análise de IA indisponível, a gerar sem coordenação: {e}")
+        adquirido = False
+    try:
+        if adquirido:
+            resultado = cache.get(chave)
+            if resultado is not None:
+                return resultado, None
+        resultado, erro = _pedir_analise(partida, mensagens, ao_mercado_principal, dados_para_analise.get('candidatos'))
+        if resultado is not None:
+            cache.set(chave, resultado, timeout=IA_CACHE_TIMEOUT)
+        return resultado, erro
+    finally:
+        if adquirido:
+            try:
+                lock.release()
+            except redis.exceptions.LockError:
+                pass
+
+
+def montar_prompt(partida, dados_para_analise, serializar=formatar_dados_compactos):
+    """Prompt da análise. `serializar` converte os dados em texto (o formato compacto, por omissão).
+
+    Com candidatos da pré-análise (pre_analise.calcular_candidatos) os passos de contagem já vêm resolvidos
+    e o prompt só pede a escolha do mercado principal e o texto.
+    """
+    dados_str = serializar(dados_para_analise)
+    instrucoes = INSTRUCOES_CANDIDATOS if dados_para_analise.get('candidatos') else INSTRUCOES_PASSOS
+
+    prompt = f"""
+    Você é o "Mat, o Analista", um especialista em apostas esportivas que segue um sistema rigoroso e conservador baseado em dados quantitativos. Sua análise deve ser baseada EXCLUSIVAMENTE nos dados fornecidos.
+
+    Crie um relatório pré-jogo para a partida entre {partida['mandante_nome']} e {partida['visitante_nome']}.
+
+{instrucoes}    DADOS ESTATÍSTICOS PARA ANÁLISE:
+    ```
+    {dados_str}
     ```
     ---
     Com base na sua análise passo a passo dos dados acima, preencha a seguinte estrutura JSON obrigatória:
@@ -119,31 +290,70 @@ def gerar_analise_ia(partida, dados_para_analise):
       }}
     }}
     """
-    
-    # --- Bloco TRY/EXCEPT MODIFICADO para incluir validação Pydantic ---
+    return prompt
+
+
+def extrair_mercado_principal(texto_parcial):
+    """Devolve o mercado principal se já estiver completo no JSON parcial recebido, ou None."""
+    correspondencia = PADRAO_MERCADO_PRINCIPAL.search(texto_parcial)
+    if correspondencia is None:
+        return None
+    return json.loads(f'"{correspondencia.group(1)}"')
+
+
+def _receber_em_streaming(partida, mensagens, ao_mercado_principal):
+    """Consome a resposta em streaming e avisa com o mercado principal logo que ele esteja completo."""
+    stream = client.chat.completions.create(**parametros_pedido(mensagens), stream=True)
+    response_text = ""
+    avisado = False
+    for chunk in stream:
+        if not chunk.choices or not chunk.choices[0].delta.content:
+            continue
+        response_text += chunk.choices[0].delta.content
+        if not avisado:
+            mercado = extrair_mercado_principal(response_text)
+            if mercado is not None:
+                avisado = True
+                try:
+                    ao_mercado_principal(mercado)
+                except Exception as e:
+                    current_app.logger.warning(f"Falha ao enviar o card provisório de {partida['mandante_nome']} vs {partida['visitante_nome']}: {e}")
+    return response_text
+
+
+def _normalizar_mercado(mercado):
+    return " ".join(mercado.split()).casefold()
+
+
+def mercado_candidato(mercado, candidatos):
+    """O nome exato do candidato que corresponde a `mercado` (ignorando maiúsculas e espaços), ou None."""
+    normalizado = _normalizar_mercado(mercado)
+    return next((c['mercado'] for c in candidatos if _normalizar_mercado(c['mercado']) == normalizado), None)
+
+
+def validar_resposta(partida, response_text, candidatos=None):
+    """Valida o JSON devolvido pelo modelo com AnaliseCompletaIA. Devolve (análise, None) ou (None, erro).
+
+    Com `candidatos` (pré-análise), o mercado principal tem de ser um deles; é gravado com o nome do candidato.
+    """
     try:
-        current_app.logger.info(f"Gerando análise de IA para: {partida['mandante_nome']} vs {partida['visitante_nome']}")
-        
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "Você é um analista de futebol que gera análises detalhadas em formato JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            model="gpt-4o",
-            response_format={"type": "json_object"},
-            temperature=0.5
-        )
-        
-        response_text = chat_completion.choices[0].message.content
         response_json = json.loads(response_text)
         
         # --- ETAPA DE VALIDAÇÃO COM PYDANTIC ---
         # Tentamos criar uma instância do nosso modelo AnaliseCompletaIA com os dados recebidos.
         # Se a estrutura não corresponder (chaves em falta, tipos errados), o Pydantic levantará um erro ValidationError.
-        analise_validada = AnaliseCompletaIA(**response_json)
-        
+        analise = AnaliseCompletaIA(**response_json).model_dump()
+
+        if candidatos:
+            mercado = mercado_candidato(analise['mercado_principal'], candidatos)
+            if mercado is None:
+                current_app.logger.error(f"Mercado principal '{analise['mercado_principal']}' fora dos candidatos para {partida['mandante_nome']} vs {partida['visitante_nome']}: {[c['mercado'] for c in candidatos]}")
+                return None, "A IA escolheu um mercado fora dos candidatos da pré-análise. A análise foi descartada."
+            analise['mercado_principal'] = mercado
+            analise['analise_detalhada']['cenario_provavel']['mercado'] = mercado
+
         # Se a validação for bem-sucedida, retornamos o JSON como um dicionário Python.
-        return analise_validada.model_dump(), None
+        return analise, None
 
     except ValidationError as e:
         # Se a validação do Pydantic falhar.
@@ -156,7 +366,29 @@ def gerar_analise_ia(partida, dados_para_analise):
         current_app.logger.error(f"Erro ao validar JSON da IA para {partida['mandante_nome']} vs {partida['visitante_nome']}: {e}")
         current_app.logger.warning(f"--- JSON INVÁLIDO RECEBIDO --- \n{response_text}\n-----------------------------")
         return None, "Erro no formato da resposta da IA. Não foi possível decodificar o JSON."
+
+
+def _pedir_analise(partida, mensagens, ao_mercado_principal=None, candidatos=None):
+    # --- Bloco TRY/EXCEPT MODIFICADO para incluir validação Pydantic ---
+    response_text = None
+    try:
+        current_app.logger.info(f"Gerando análise de IA para: {partida['mandante_nome']} vs {partida['visitante_nome']}")
         
+        if ao_mercado_principal and IA_STREAMING:
+            avisar = ao_mercado_principal
+            if candidatos:
+                # Um mercado fora dos candidatos vai ser rejeitado: não chega a aparecer no card provisório.
+                def avisar(mercado):
+                    mercado = mercado_candidato(mercado, candidatos)
+                    if mercado is not None:
+                        ao_mercado_principal(mercado)
+            response_text = _receber_em_streaming(partida, mensagens, avisar)
+        else:
+            chat_completion = client.chat.completions.create(**parametros_pedido(mensagens))
+            response_text = chat_completion.choices[0].message.content
+
+        return validar_resposta(partida, response_text, candidatos)
+
     except Exception as e:
         # Outros erros (ex: problema de conexão com a API da OpenAI).
         current_app.logger.error(f"Erro ao gerar análise da IA para {partida['mandante_nome']} vs {partida['visitante_nome']}: {e}")
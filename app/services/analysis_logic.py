@@ -1,12 +1,35 @@
 # app/services/analysis_logic.py
 import json
-from app import cache, db
-from . import football_api, ai_analyzer
+from app import cache, db, redis_client
+from . import football_api, ai_analyzer, pre_analise
 from app.models import Analysis, Match
 from flask import current_app
+from .concorrencia import com_contexto_da_app
+from .sitemap import invalidar_sitemap
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque
+import queue
 from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only
 import pytz
 import math
+import os
+import time
+import redis
+
+# Número de partidas analisadas em simultâneo por gerar_analises (1 = sequencial) e quantas podem
+# ficar em curso à frente da próxima a ser emitida no stream.
+ANALISES_CONCORRENCIA = int(os.getenv('ANALISES_CONCORRENCIA', 4))
+ANALISES_JANELA = int(os.getenv('ANALISES_JANELA', 2 * ANALISES_CONCORRENCIA))
+
+# Validade do lock de geração de uma análise e tempo máximo que outro pedido espera por ele (segundos).
+# ANALISE_LOCK_ESPERA é o orçamento total de espera de um pedido: o que sobrar depois do lock da análise
+# é o máximo que a IA espera pelo seu próprio lock (ai_analyzer.IA_LOCK_ESPERA), nunca mais do que isso.
+ANALISE_LOCK_TIMEOUT = int(os.getenv('ANALISE_LOCK_TIMEOUT', 300))
+ANALISE_LOCK_ESPERA = int(os.getenv('ANALISE_LOCK_ESPERA', 240))
+# Validade (segundos) do stream SSE materializado de uma data já totalmente analisada.
+SNAPSHOT_TIMEOUT = int(os.getenv('SNAPSHOT_TIMEOUT', 6 * 3600))
 
 # --- LISTA DE LIGAS E COPAS SELECIONADAS ---
 LIGAS_SELECIONADAS = {
@@ -51,6 +74,10 @@ LIGAS_SELECIONADAS = {
     "World Cup": {"id": 1, "pais": "World", "flag": "https://media.api-sports.io/flags/un.svg"}
 }
 
+LIGAS_GRATUITAS_NOMES = ["Brasileirão Série A", "Brasileirão Série B", "La Liga", "Serie A", "UEFA Europa League", "Eredivisie"]
+LIGAS_GRATUITAS = {nome: LIGAS_SELECIONADAS[nome] for nome in LIGAS_GRATUITAS_NOMES if nome in LIGAS_SELECIONADAS}
+LIGAS_MEMBROS = LIGAS_SELECIONADAS
+
 def convert_utc_to_sao_paulo_datetime(utc_dt_str):
     """Converte uma string de data UTC para um objeto datetime de São Paulo."""
     if not utc_dt_str:
@@ -75,31 +102,100 @@ def obter_ligas_definidas():
     cache.set("lista_ligas_definidas", LIGAS_SELECIONADAS, timeout=86400)
     return LIGAS_SELECIONADAS
 
-def analisar_partida(partida, analysis_date):
+def _resultado_do_cache(cached_analysis):
+    return cached_analysis.to_card()
+
+def _buscar_analise_existente(partida, analysis_date):
+    return (Analysis.query.options(load_only(*[getattr(Analysis, coluna) for coluna in Analysis.CARD_COLUMNS]))
+            .filter_by(match_api_id=partida['id'], analysis_date=analysis_date).first())
+
+def colunas_analise(match_api_id, analysis_date, resultado_final):
+    """Valores das colunas de Analysis: o conteúdo completo e os campos do card projetados em colunas."""
+    return dict(
+        match_api_id=match_api_id,
+        analysis_date=analysis_date,
+        content=resultado_final,
+        mandante_nome=resultado_final['mandante_nome'],
+        mandante_escudo=resultado_final['mandante_escudo'],
+        visitante_nome=resultado_final['visitante_nome'],
+        visitante_escudo=resultado_final['visitante_escudo'],
+        liga_nome=resultado_final['liga_nome'],
+        horario=resultado_final['horario'],
+        recomendacao=resultado_final['recomendacao']
+    )
+
+def criar_analise(match_api_id, analysis_date, resultado_final):
+    """Cria o registo Analysis com o conteúdo completo e os campos do card projetados em colunas."""
+    return Analysis(**colunas_analise(match_api_id, analysis_date, resultado_final))
+
+def analisar_partida(partida, analysis_date, ao_progredir=None):
+    """Devolve o card da análise da partida (da base de dados ou gerado agora).
+
+    `ao_progredir`, se indicado, recebe um card provisório (status 'provisional') assim que a IA
+    escrever o mercado principal, antes de a análise completa estar validada e gravada.
+    """
     partida_info = f"{partida['mandante_nome']} vs {partida['visitante_nome']}"
     current_app.logger.info(f"Analisando Jogo: {partida_info}")
     
-    cached_analysis = Analysis.query.filter_by(match_api_id=partida['id'], analysis_date=analysis_date).first()
+    cached_analysis = _buscar_analise_existente(partida, analysis_date)
     if cached_analysis:
         current_app.logger.info(f"--> Análise para '{partida_info}' encontrada no cache do banco de dados.")
-        resultado_cache = json.loads(cached_analysis.content)
-        resultado_cache['analysis_id'] = cached_analysis.id
-        return resultado_cache
+        return _resultado_do_cache(cached_analysis)
 
-    current_app.logger.info(f"--> Análise para '{partida_info}' não encontrada no cache. Gerando com a IA...")
-    
-    _, mandante_ids = football_api.buscar_ultimos_jogos(partida['mandante_id'])
-    _, visitante_ids = football_api.buscar_ultimos_jogos(partida['visitante_id'])
-    _, h2h_ids = football_api.buscar_h2h(partida['mandante_id'], partida['visitante_id'])
+    # Single-flight: só um pedido gera a análise de (partida, data); os restantes esperam pelo resultado dele.
+    prazo = time.monotonic() + ANALISE_LOCK_ESPERA
+    lock = redis_client.lock(f"lock:analise:{partida['id']}:{analysis_date}", timeout=ANALISE_LOCK_TIMEOUT)
+    adquirido = False
+    try:
+        try:
+            adquirido = lock.acquire(blocking=False)
+            if not adquirido:
+                current_app.logger.info(f"--> Análise para '{partida_info}' já está a ser gerada por outro pedido. Aguardando o resultado...")
+                adquirido = lock.acquire(blocking=True, blocking_timeout=ANALISE_LOCK_ESPERA)
+                cached_analysis = _buscar_analise_existente(partida, analysis_date)
+                if cached_analysis:
+                    current_app.logger.info(f"--> Análise para '{partida_info}' gerada por outro pedido.")
+                    return _resultado_do_cache(cached_analysis)
+        except redis.exceptions.RedisError as e:
+            # Sem Redis seguimos sem lock; a restrição única na base de dados impede duplicados.
+            current_app.logger.warning(f"Lock de geração indisponível para '{partida_info}': {e}")
+
+        espera_lock_ia = min(ai_analyzer.IA_LOCK_ESPERA, max(0, prazo - time.monotonic()))
+        return _gerar_analise(partida, analysis_date, partida_info, ao_progredir, espera_lock_ia)
+    finally:
+        if adquirido:
+            try:
+                lock.release()
+            except redis.exceptions.LockError:
+                pass
+
+def _card_provisorio(partida, mercado_principal):
+    return {"status": "provisional", "match_id": partida['id'], "horario": convert_utc_to_sao_paulo_time(partida.get('data')), "mandante_nome": partida['mandante_nome'], "visitante_nome": partida['visitante_nome'], "mandante_escudo": partida['mandante_escudo'], "visitante_escudo": partida['visitante_escudo'], "liga_nome": partida['liga_nome'], "recomendacao": mercado_principal}
+
+def coletar_dados_partida(partida):
+    """Reúne o histórico, as estatísticas e os candidatos da pré-análise de uma partida.
 
-    ultimos_jogos_mandante_list = football_api.buscar_ultimos_jogos_estruturados(partida['mandante_id'])
-    ultimos_jogos_visitante_list = football_api.buscar_ultimos_jogos_estruturados(partida['visitante_id'])
-    confrontos_diretos_list = football_api.buscar_h2h_estruturado(partida['mandante_id'], partida['visitante_id'])
+    Devolve um dicionário com "estatisticas" e "dados_brutos" (gravados no conteúdo da análise) e
+    "dados_para_ia" (o que é enviado ao modelo, já com os "candidatos"), ou None se o histórico estiver incompleto.
+    """
+    historico_mandante, historico_visitante, historico_h2h = football_api.buscar_historicos_partida(partida['mandante_id'], partida['visitante_id'])
+
+    if historico_mandante['erro'] or historico_visitante['erro'] or historico_h2h['erro']:
+        return None
+
+    mandante_ids = historico_mandante['ids']
+    visitante_ids = historico_visitante['ids']
+    h2h_ids = historico_h2h['ids']
+
+    ultimos_jogos_mandante_list = historico_mandante['estruturados']
+    ultimos_jogos_visitante_list = historico_visitante['estruturados']
+    confrontos_diretos_list = historico_h2h['estruturados']
     
-    stats_mandante = football_api.buscar_estatisticas_time_em_jogos(partida['mandante_id'], mandante_ids)
-    stats_visitante = football_api.buscar_estatisticas_time_em_jogos(partida['visitante_id'], visitante_ids)
-    stats_h2h_mandante = football_api.buscar_estatisticas_time_em_jogos(partida['mandante_id'], h2h_ids)
-    stats_h2h_visitante = football_api.buscar_estatisticas_time_em_jogos(partida['visitante_id'], h2h_ids)
+    estatisticas_por_jogo = football_api.pre_carregar_estatisticas(mandante_ids + visitante_ids + h2h_ids)
+    stats_mandante = football_api.buscar_estatisticas_time_em_jogos(partida['mandante_id'], mandante_ids, estatisticas_por_jogo)
+    stats_visitante = football_api.buscar_estatisticas_time_em_jogos(partida['visitante_id'], visitante_ids, estatisticas_por_jogo)
+    stats_h2h_mandante = football_api.buscar_estatisticas_time_em_jogos(partida['mandante_id'], h2h_ids, estatisticas_por_jogo)
+    stats_h2h_visitante = football_api.buscar_estatisticas_time_em_jogos(partida['visitante_id'], h2h_ids, estatisticas_por_jogo)
 
     def calculate_avg(data_list):
         return round(sum(data_list) / len(data_list), 1) if data_list else 0.0
@@ -124,7 +220,33 @@ def analisar_partida(partida, analysis_date):
             dados_para_ia["estatisticas"][tipo_stat][time]["escanteios"].pop("media", None)
             dados_para_ia["estatisticas"][tipo_stat][time]["cartoes"].pop("media", None)
     
-    dados_ia, erro = ai_analyzer.gerar_analise_ia(partida, dados_para_ia)
+    # Os PASSOS 1-3 (contagens e consistência) são calculados localmente; a IA só escolhe entre os candidatos.
+    totais_por_conjunto = { "mandante": football_api.buscar_totais_jogos(mandante_ids, estatisticas_por_jogo), "visitante": football_api.buscar_totais_jogos(visitante_ids, estatisticas_por_jogo), "h2h": football_api.buscar_totais_jogos(h2h_ids, estatisticas_por_jogo) }
+    dados_para_ia["totais_partida"] = totais_por_conjunto
+    dados_para_ia["candidatos"] = pre_analise.calcular_candidatos(partida, dados_brutos, totais_por_conjunto)
+    return { "estatisticas": estatisticas, "dados_brutos": dados_brutos, "dados_para_ia": dados_para_ia }
+
+def montar_resultado_final(partida, dados_ia, dados_partida):
+    """Conteúdo gravado em Analysis.content a partir da análise validada e dos dados da partida."""
+    return { "horario": convert_utc_to_sao_paulo_time(partida.get('data')), "mandante_nome": partida['mandante_nome'], "visitante_nome": partida['visitante_nome'], "mandante_escudo": partida['mandante_escudo'], "visitante_escudo": partida['visitante_escudo'], "liga_nome": partida['liga_nome'], "recomendacao": dados_ia.get("mercado_principal", "Ver Análise Detalhada"), "analise_detalhada": dados_ia.get("analise_detalhada", {}), "estatisticas": dados_partida["estatisticas"], "dados_brutos": dados_partida["dados_brutos"] }
+
+def _gerar_analise(partida, analysis_date, partida_info, ao_progredir=None, espera_lock_ia=ai_analyzer.IA_LOCK_ESPERA):
+    current_app.logger.info(f"--> Análise para '{partida_info}' não encontrada no cache. Gerando com a IA...")
+    
+    dados_partida = coletar_dados_partida(partida)
+    if dados_partida is None:
+        # Sem histórico a IA analisaria dados vazios; devolvemos erro sem gravar para que a próxima visita tente de novo.
+        current_app.logger.error(f"Histórico incompleto da API-Football para '{partida_info}'. Análise não gerada.")
+        return {"mandante_nome": partida['mandante_nome'], "visitante_nome": partida['visitante_nome'], "mandante_escudo": partida['mandante_escudo'], "visitante_escudo": partida['visitante_escudo'], "recomendacao": "Dados indisponíveis", "error": True, "horario": convert_utc_to_sao_paulo_time(partida.get('data'))}
+
+    if not dados_partida["dados_para_ia"]["candidatos"] and pre_analise.PRE_ANALISE_SALTAR_IA:
+        current_app.logger.info(f"--> Nenhum mercado consistente para '{partida_info}'. Análise gerada sem IA.")
+        dados_ia, erro = pre_analise.analise_sem_sinal(partida, dados_partida["dados_brutos"]), None
+    else:
+        ao_mercado_principal = None
+        if ao_progredir:
+            ao_mercado_principal = lambda mercado: ao_progredir(_card_provisorio(partida, mercado))
+        dados_ia, erro = ai_analyzer.gerar_analise_ia(partida, dados_partida["dados_para_ia"], ao_mercado_principal=ao_mercado_principal, espera_lock=espera_lock_ia)
 
     horario_jogo_para_erro = convert_utc_to_sao_paulo_time(partida.get('data'))
     if erro:
@@ -132,25 +254,166 @@ def analisar_partida(partida, analysis_date):
         return {"mandante_nome": partida['mandante_nome'], "visitante_nome": partida['visitante_nome'], "mandante_escudo": partida['mandante_escudo'], "visitante_escudo": partida['visitante_escudo'], "recomendacao": "Erro na Análise", "error": True, "horario": horario_jogo_para_erro}
     
     try:
-        horario_jogo = convert_utc_to_sao_paulo_time(partida.get('data'))
-        recomendacao_principal = dados_ia.get("mercado_principal", "Ver Análise Detalhada")
-        resultado_final = { "horario": horario_jogo, "mandante_nome": partida['mandante_nome'], "visitante_nome": partida['visitante_nome'], "mandante_escudo": partida['mandante_escudo'], "visitante_escudo": partida['visitante_escudo'], "liga_nome": partida['liga_nome'], "recomendacao": recomendacao_principal, "analise_detalhada": dados_ia.get("analise_detalhada", {}), "estatisticas": estatisticas, "dados_brutos": dados_brutos }
-        nova_analise = Analysis(match_api_id=partida['id'], analysis_date=analysis_date, content=json.dumps(resultado_final))
+        resultado_final = montar_resultado_final(partida, dados_ia, dados_partida)
+        nova_analise = criar_analise(partida['id'], analysis_date, resultado_final)
         db.session.add(nova_analise)
         db.session.commit()
-        current_app.logger.info(f"--> Nova análise para '{partida_info}' guardada no banco de dados.")
-        resultado_final['analysis_id'] = nova_analise.id
-        return resultado_final
+    except IntegrityError:
+        # Outro processo gravou a mesma análise primeiro (restrição única em match_api_id + analysis_date).
+        db.session.rollback()
+        current_app.logger.warning(f"--> Análise para '{partida_info}' já tinha sido guardada por outro pedido.")
+        return _resultado_do_cache(_buscar_analise_existente(partida, analysis_date))
     except Exception as e:
         current_app.logger.error(f"Erro inesperado ao processar a resposta da IA para '{partida_info}': {e}")
         return {"mandante_nome": partida['mandante_nome'], "visitante_nome": partida['visitante_nome'], "recomendacao": "Erro inesperado.", "error": True, "horario": horario_jogo_para_erro}
 
-def gerar_analises(data_para_buscar, user_tier='free'):
-    todas_as_ligas = LIGAS_SELECIONADAS
-    LIGAS_GRATUITAS_NOMES = ["Brasileirão Série A", "Brasileirão Série B", "La Liga", "Serie A", "UEFA Europa League", "Eredivisie"]
-    LIGAS_GRATUITAS = {nome: todas_as_ligas[nome] for nome in LIGAS_GRATUITAS_NOMES if nome in todas_as_ligas}
-    LIGAS_MEMBROS = todas_as_ligas
-    watchlist = LIGAS_GRATUITAS if user_tier == 'free' else LIGAS_MEMBROS
+    # Fora do try: a análise já está gravada, uma falha ao invalidar caches não a pode transformar num erro.
+    current_app.logger.info(f"--> Nova análise para '{partida_info}' guardada no banco de dados.")
+    invalidar_snapshots(analysis_date)
+    invalidar_sitemap(nova_analise.id)
+    return nova_analise.to_card()
+
+def _chave_snapshot(data_para_buscar):
+    return f"snapshot_sse:{data_para_buscar}"
+
+def obter_snapshot(data_para_buscar):
+    """Devolve os eventos já materializados do stream completo (plano membro) da data, ou None se ainda não existir."""
+    try:
+        snapshot = redis_client.get(_chave_snapshot(data_para_buscar))
+        return json.loads(snapshot) if snapshot else None
+    except redis.exceptions.RedisError as e:
+        current_app.logger.warning(f"Não foi possível ler o snapshot de {data_para_buscar}: {e}")
+        return None
+
+def _guardar_snapshot(data_para_buscar, eventos):
+    try:
+        redis_client.set(_chave_snapshot(data_para_buscar), json.dumps(eventos), ex=SNAPSHOT_TIMEOUT)
+    except redis.exceptions.RedisError as e:
+        current_app.logger.warning(f"Não foi possível guardar o snapshot de {data_para_buscar}: {e}")
+
+def invalidar_snapshots(data_para_buscar):
+    """Apaga o snapshot da data (chamado sempre que uma nova análise é gravada)."""
+    try:
+        redis_client.delete(_chave_snapshot(data_para_buscar))
+    except redis.exceptions.RedisError as e:
+        current_app.logger.warning(f"Não foi possível invalidar o snapshot de {data_para_buscar}: {e}")
+
+class ProjecaoPlano:
+    """Filtra, evento a evento, o stream completo (plano membro) para o plano do utilizador.
+
+    As ligas gratuitas são um subconjunto das ligas de membros, por isso o stream gratuito é apenas
+    o stream de membros sem as ligas pagas (o evento league_start e os jogos que se lhe seguem).
+    """
+
+    def __init__(self, user_tier):
+        self.gratuito = user_tier == 'free'
+        self.liga_visivel = True
+
+    def visivel(self, evento):
+        if not self.gratuito:
+            return True
+        status = evento.get('status')
+        if status == 'league_start':
+            self.liga_visivel = evento.get('liga_nome') in LIGAS_GRATUITAS
+            return self.liga_visivel
+        if status is None or status == 'provisional':
+            return self.liga_visivel
+        return True
+
+def listar_jogos_por_liga(data_para_buscar, data_seguinte_str, data_selecionada_obj, watchlist):
+    """Carrega a agenda das duas datas UTC em bloco e agrupa por liga os jogos que caem na data local de São Paulo."""
+    ids_ligas = {liga_dados['id'] for liga_dados in watchlist.values()}
+    todos_os_jogos_api = (football_api.buscar_jogos_por_data(data_para_buscar, ids_ligas) +
+                          football_api.buscar_jogos_por_data(data_seguinte_str, ids_ligas))
+
+    jogos_por_liga = {}
+    ids_vistos = set()
+    for jogo in todos_os_jogos_api:
+        if jogo['id'] in ids_vistos:
+            continue
+        
+        data_jogo_local = convert_utc_to_sao_paulo_datetime(jogo.get('data'))
+        if data_jogo_local and data_jogo_local.date() == data_selecionada_obj:
+            jogos_por_liga.setdefault(jogo['liga_id'], []).append(jogo)
+            ids_vistos.add(jogo['id'])
+    return jogos_por_liga
+
+def carregar_analises_existentes(partidas, analysis_date):
+    """Carrega numa única query (IN) as análises já guardadas para as partidas da data, indexadas pelo ID da partida."""
+    ids_partidas = [partida['id'] for partida in partidas]
+    if not ids_partidas:
+        return {}
+    colunas = [getattr(Analysis, coluna) for coluna in Analysis.CARD_COLUMNS + ('match_api_id',)]
+    analises = (Analysis.query.options(load_only(*colunas))
+                .filter(Analysis.analysis_date == analysis_date, Analysis.match_api_id.in_(ids_partidas)).all())
+    return {analise.match_api_id: analise for analise in analises}
+
+def analisar_partidas_em_ordem(partidas, analysis_date, analises_existentes=None, max_workers=ANALISES_CONCORRENCIA, janela=ANALISES_JANELA, provisorios=False):
+    """Analisa as partidas em paralelo e devolve os resultados na ordem original.
+
+    Partidas presentes em `analises_existentes` são servidas diretamente dali, sem passar pelo pool.
+    No máximo `janela` partidas ficam em curso à frente da próxima a emitir, por isso cada resultado
+    é entregue assim que ele e todos os anteriores estão prontos. Com max_workers <= 1 a análise é sequencial.
+
+    Com `provisorios=True` (só no modo paralelo), enquanto espera pela próxima partida a emitir, devolve
+    também o seu card provisório (status 'provisional') logo que a IA o produza; o resultado final vem
+    sempre a seguir. Cards provisórios de partidas mais à frente ficam guardados até chegar a sua vez.
+    """
+    analises_existentes = analises_existentes or {}
+
+    if max_workers <= 1:
+        for partida in partidas:
+            existente = analises_existentes.get(partida['id'])
+            yield _resultado_do_cache(existente) if existente else analisar_partida(partida, analysis_date)
+        return
+
+    tarefa = com_contexto_da_app(analisar_partida)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    # Avisos das threads: cards provisórios e None quando uma partida termina (para acordar a espera).
+    avisos = queue.Queue() if provisorios else None
+    ultimo_provisorio = {}
+    pendentes = deque()
+    proxima = 0
+    try:
+        for _ in range(len(partidas)):
+            while proxima < len(partidas) and len(pendentes) < max(janela, 1):
+                partida = partidas[proxima]
+                existente = analises_existentes.get(partida['id'])
+                if existente:
+                    futuro = Future()
+                    futuro.set_result(_resultado_do_cache(existente))
+                elif avisos is not None:
+                    futuro = executor.submit(tarefa, partida, analysis_date, avisos.put)
+                    futuro.add_done_callback(lambda _: avisos.put(None))
+                else:
+                    futuro = executor.submit(tarefa, partida, analysis_date)
+                pendentes.append((partida, futuro))
+                proxima += 1
+
+            partida, futuro = pendentes.popleft()
+            enviado = False
+            while avisos is not None and not futuro.done():
+                if not enviado and partida['id'] in ultimo_provisorio:
+                    enviado = True
+                    yield ultimo_provisorio.pop(partida['id'])
+                    continue
+                aviso = avisos.get()
+                if aviso is not None:
+                    ultimo_provisorio[aviso['match_id']] = aviso
+            ultimo_provisorio.pop(partida['id'], None)
+            yield futuro.result()
+    finally:
+        # Se o cliente desligar, as partidas ainda não iniciadas são canceladas.
+        for _, futuro in pendentes:
+            futuro.cancel()
+        executor.shutdown(wait=False)
+
+def gerar_analises(data_para_buscar):
+    """Gera, em ordem, os eventos (JSON) do stream completo de análises de uma data (todas as ligas de membros).
+
+    O stream do plano gratuito é uma projeção deste (ver ProjecaoPlano); o enquadramento SSE fica a cargo de quem transmite.
+    """
+    watchlist = LIGAS_MEMBROS
     
     jogos_encontrados_total = 0
     
@@ -159,48 +422,64 @@ def gerar_analises(data_para_buscar, user_tier='free'):
         data_seguinte_str = (data_selecionada_obj + timedelta(days=1)).strftime('%Y-%m-%d')
         current_app.logger.info(f"Buscando jogos para a data local {data_para_buscar} e também para a data UTC seguinte {data_seguinte_str} para correção de fuso.")
     except ValueError:
-        yield f"data: {json.dumps({'status': 'error', 'message': 'Formato de data inválido.'})}\n\n"
+        yield json.dumps({'status': 'error', 'message': 'Formato de data inválido.'})
         return
 
+    resultados = None
     try:
+        jogos_por_liga = listar_jogos_por_liga(data_para_buscar, data_seguinte_str, data_selecionada_obj, watchlist)
+
+        # Sequência final de emissão: ligas na ordem da watchlist e jogos por horário de início.
+        sequencia = []
         for nome_liga, liga_dados in watchlist.items():
-            id_liga = liga_dados['id']
-            pais_liga = liga_dados.get('pais', '')
-            flag_liga = liga_dados.get('flag', '')
-            
-            jogos_dia_1 = football_api.buscar_jogos_do_dia(id_liga, nome_liga, data_para_buscar)
-            jogos_dia_2 = football_api.buscar_jogos_do_dia(id_liga, nome_liga, data_seguinte_str)
-            todos_os_jogos_api = jogos_dia_1 + jogos_dia_2
-            
-            jogos_da_liga_filtrados = []
-            if todos_os_jogos_api:
-                ids_vistos = set()
-                for jogo in todos_os_jogos_api:
-                    if jogo['id'] in ids_vistos:
-                        continue
-                    
-                    data_jogo_local = convert_utc_to_sao_paulo_datetime(jogo.get('data'))
-                    if data_jogo_local and data_jogo_local.date() == data_selecionada_obj:
-                        jogos_da_liga_filtrados.append(jogo)
-                        ids_vistos.add(jogo['id'])
-
-            if jogos_da_liga_filtrados:
-                jogos_encontrados_total += len(jogos_da_liga_filtrados)
-                yield f"data: {json.dumps({'status': 'league_start', 'liga_nome': nome_liga, 'pais_nome': pais_liga, 'pais_flag': flag_liga})}\n\n"
-                
-                jogos_da_liga_filtrados.sort(key=lambda x: convert_utc_to_sao_paulo_datetime(x.get('data')) or datetime.min.replace(tzinfo=pytz.UTC))
-                
-                for jogo in jogos_da_liga_filtrados:
-                    resultado_jogo = analisar_partida(jogo, data_para_buscar)
-                    yield f"data: {json.dumps(resultado_jogo)}\n\n"
+            jogos_da_liga_filtrados = jogos_por_liga.get(liga_dados['id'], [])
+            jogos_da_liga_filtrados.sort(key=lambda x: convert_utc_to_sao_paulo_datetime(x.get('data')) or datetime.min.replace(tzinfo=pytz.UTC))
+            sequencia.extend((nome_liga, liga_dados, jogo) for jogo in jogos_da_liga_filtrados)
+
+        jogos_encontrados_total = len(sequencia)
+        partidas = [jogo for _, _, jogo in sequencia]
+        analises_existentes = carregar_analises_existentes(partidas, data_selecionada_obj)
+        current_app.logger.info(f"{len(analises_existentes)} de {len(partidas)} análises já existentes para {data_para_buscar}.")
+        resultados = analisar_partidas_em_ordem(partidas, data_selecionada_obj, analises_existentes, provisorios=True)
+
+        # Eventos emitidos; se nenhuma partida falhar, o stream completo é guardado como snapshot da data.
+        eventos = []
+        houve_erro = False
+
+        liga_atual = None
+        for nome_liga, liga_dados, jogo in sequencia:
+            if nome_liga != liga_atual:
+                liga_atual = nome_liga
+                evento = json.dumps({'status': 'league_start', 'liga_nome': nome_liga, 'pais_nome': liga_dados.get('pais', ''), 'pais_flag': liga_dados.get('flag', '')})
+                eventos.append(evento)
+                yield evento
+
+            resultado_jogo = next(resultados)
+            while resultado_jogo.get('status') == 'provisional':
+                # Card provisório: vai para o stream mas não para o snapshot.
+                yield json.dumps(resultado_jogo)
+                resultado_jogo = next(resultados)
+            houve_erro = houve_erro or bool(resultado_jogo.get('error'))
+            evento = json.dumps({**resultado_jogo, 'match_id': jogo['id']})
+            eventos.append(evento)
+            yield evento
 
         if jogos_encontrados_total == 0:
-            yield f"data: {json.dumps({'status': 'no_games'})}\n\n"
+            evento = json.dumps({'status': 'no_games'})
+            eventos.append(evento)
+            yield evento
         
-        yield f"data: {json.dumps({'status': 'done'})}\n\n"
+        evento = json.dumps({'status': 'done'})
+        eventos.append(evento)
+        if not houve_erro:
+            _guardar_snapshot(data_para_buscar, eventos)
+        yield evento
 
     except GeneratorExit:
-        current_app.logger.warning("Conexão do cliente fechada. Interrompendo a busca de análises.")
+        current_app.logger.warning("Geração de análises interrompida antes do fim.")
     except Exception as e:
         current_app.logger.error(f"Erro inesperado no gerador de análises: {e}", exc_info=True)
-        yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
\ No newline at end of file
+        yield json.dumps({'status': 'error', 'message': str(e)})
+    finally:
+        if resultados is not None:
+            resultados.close()
\ No newline at end of file
@@ -0,0 +1,165 @@
+# app/services/arquivo.py
+import os
+import re
+from datetime import date, timedelta
+from flask import current_app
+from sqlalchemy import and_, select, text
+from sqlalchemy.dialects.postgresql import insert
+from app import db
+from app.models import Analysis, AnalysisArquivo, DailyUserView
+
+# Análises com mais de ARQUIVO_HORIZONTE_DIAS (arredondado ao início do mês) saem da tabela particionada.
+ARQUIVO_HORIZONTE_DIAS = int(os.getenv('ARQUIVO_HORIZONTE_DIAS', 180))
+ARQUIVO_LOTE = int(os.getenv('ARQUIVO_LOTE', 500))
+# As visualizações só contam para a quota do próprio dia; as antigas são apagadas.
+VISUALIZACOES_HORIZONTE_DIAS = int(os.getenv('VISUALIZACOES_HORIZONTE_DIAS', 30))
+# Meses futuros para os quais as partições são criadas antecipadamente.
+PARTICOES_MESES_A_FRENTE = int(os.getenv('PARTICOES_MESES_A_FRENTE', 3))
+
+PARTICAO_PADRAO = "analysis_padrao"
+PADRAO_NOME_PARTICAO = re.compile(r"^analysis_p(\d{4})_(\d{2})$")
+
+
+def _inicio_do_mes(dia):
+    return dia.replace(day=1)
+
+
+def _mes_seguinte(dia):
+    return (dia.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _nome_particao(inicio):
+    return f"analysis_p{inicio.year}_{inicio.month:02d}"
+
+
+def listar_particoes():
+    """Partições mensais existentes como tuplos (nome, início, fim), por ordem cronológica."""
+    nomes = db.session.execute(text("""
+        SELECT filha.relname FROM pg_inherits
+        JOIN pg_class filha ON filha.oid = pg_inherits.inhrelid
+        JOIN pg_class mae ON mae.oid = pg_inherits.inhparent
+        WHERE mae.relname = 'analysis'
+    """)).scalars()
+    particoes = []
+    for nome in nomes:
+        correspondencia = PADRAO_NOME_PARTICAO.match(nome)
+        if correspondencia:
+            inicio = date(int(correspondencia.group(1)), int(correspondencia.group(2)), 1)
+            particoes.append((nome, inicio, _mes_seguinte(inicio)))
+    return sorted(particoes, key=lambda particao: particao[1])
+
+
+def criar_particao(inicio):
+    """Cria a partição do mês que começa em `inicio`.
+
+    A tabela é criada à parte e anexada depois, para que as linhas desse mês que tenham caído na
+    partição padrão (por falta de partição) sejam movidas na mesma transação.
+    """
+    nome = _nome_particao(inicio)
+    fim = _mes_seguinte(inicio)
+    parametros = {'inicio': inicio, 'fim': fim}
+    db.session.execute(text(f"CREATE TABLE {nome} (LIKE analysis INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    db.session.execute(text(f"""
+        WITH movidas AS (
+            DELETE FROM {PARTICAO_PADRAO} WHERE analysis_date >= :inicio AND analysis_date < :fim RETURNING *
+        )
+        INSERT INTO {nome} SELECT * FROM movidas
+    """), parametros)
+    db.session.execute(text(f"ALTER TABLE analysis ATTACH PARTITION {nome} FOR VALUES FROM ('{inicio}') TO ('{fim}')"))
+    db.session.commit()
+    current_app.logger.info(f"Partição {nome} criada ({inicio} a {fim}).")
+
+
+def garantir_particoes(meses_a_frente=PARTICOES_MESES_A_FRENTE):
+    """Garante partições do mês corrente até `meses_a_frente` meses depois. Devolve os nomes das criadas."""
+    existentes = {nome for nome, _, _ in listar_particoes()}
+    criadas = []
+    inicio = _inicio_do_mes(date.today())
+    for _ in range(meses_a_frente + 1):
+        if _nome_particao(inicio) not in existentes:
+            criar_particao(inicio)
+            criadas.append(_nome_particao(inicio))
+        inicio = _mes_seguinte(inicio)
+    return criadas
+
+
+def _copiar_para_arquivo(filtro, lote):
+    """Copia para o arquivo as análises que satisfazem `filtro`, em lotes (idempotente). Devolve os IDs copiados.
+
+    Paginação por ID (keyset), sem cursor aberto entre lotes: nada é confirmado aqui, quem chama faz um único
+    commit no fim, antes de apagar as linhas de origem.
+    """
+    ids = []
+    ultimo_id = 0
+    while True:
+        linhas = db.session.execute(
+            select(Analysis.id, Analysis.match_api_id, Analysis.analysis_date, Analysis.generated_at,
+                   Analysis.mandante_nome, Analysis.visitante_nome, Analysis.content)
+            .where(filtro, Analysis.id > ultimo_id)
+            .order_by(Analysis.id)
+            .limit(lote)
+        ).all()
+        if not linhas:
+            return ids
+        db.session.execute(insert(AnalysisArquivo).values([{
+            'id': linha.id,
+            'match_api_id': linha.match_api_id,
+            'analysis_date': linha.analysis_date,
+            'generated_at': linha.generated_at,
+            'mandante_nome': linha.mandante_nome,
+            'visitante_nome': linha.visitante_nome,
+            'conteudo_comprimido': AnalysisArquivo.comprimir(linha.content),
+        } for linha in linhas]).on_conflict_do_nothing(index_elements=['id']))
+        ids.extend(linha.id for linha in linhas)
+        ultimo_id = linhas[-1].id
+
+
+def arquivar_analises(horizonte_dias=ARQUIVO_HORIZONTE_DIAS, lote=ARQUIVO_LOTE):
+    """Move para o arquivo comprimido as análises de meses anteriores ao horizonte.
+
+    Cada mês inteiro é copiado e a sua partição é apagada (DROP TABLE): a tabela quente e os seus índices
+    não crescem com o histórico e não ficam tuplos mortos para o vacuum. Os links de analysis_detail
+    continuam a funcionar porque os IDs são preservados no arquivo.
+    """
+    limite = _inicio_do_mes(date.today() - timedelta(days=horizonte_dias))
+    resumo = {'limite': limite.isoformat(), 'particoes': [], 'analises': 0}
+    arquivados = []
+
+    for nome, inicio, fim in listar_particoes():
+        if fim > limite:
+            break
+        ids = _copiar_para_arquivo(and_(Analysis.analysis_date >= inicio, Analysis.analysis_date < fim), lote)
+        db.session.commit()
+        db.session.execute(text(f"DROP TABLE {nome}"))
+        db.session.commit()
+        arquivados.extend(ids)
+        resumo['particoes'].append(nome)
+        current_app.logger.info(f"Partição {nome} arquivada ({len(ids)} análises).")
+
+    # Linhas antigas que tenham ficado na partição padrão (datas sem partição mensal).
+    ids = _copiar_para_arquivo(Analysis.analysis_date < limite, lote)
+    if ids:
+        db.session.commit()
+        Analysis.query.filter(Analysis.analysis_date < limite).delete(synchronize_session=False)
+        db.session.commit()
+        arquivados.extend(ids)
+
+    # O sitemap não muda: as análises arquivadas continuam listadas pelo mesmo ID (ver services/sitemap.py).
+    resumo['analises'] = len(arquivados)
+    return resumo
+
+
+def purgar_visualizacoes(horizonte_dias=VISUALIZACOES_HORIZONTE_DIAS):
+    """Apaga as visualizações diárias mais antigas do que o horizonte. Devolve o número de linhas apagadas."""
+    limite = date.today() - timedelta(days=horizonte_dias)
+    apagadas = DailyUserView.query.filter(DailyUserView.view_date < limite).delete(synchronize_session=False)
+    db.session.commit()
+    return apagadas
+
+
+def obter_analise(analysis_id):
+    """Procura a análise na tabela quente e, se já tiver sido arquivada, no arquivo. Devolve None se não existir."""
+    analise = Analysis.query.filter_by(id=analysis_id).first()
+    if analise is None:
+        analise = db.session.get(AnalysisArquivo, analysis_id)
+    return analise
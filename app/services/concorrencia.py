@@ -0,0 +1,28 @@
+# app/services/concorrencia.py
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+
+def com_contexto_da_app(funcao):
+    """Envolve uma função para que corra dentro do contexto da aplicação atual numa thread do pool."""
+    app = current_app._get_current_object()
+
+    def executar(*args, **kwargs):
+        with app.app_context():
+            return funcao(*args, **kwargs)
+    return executar
+
+
+def executar_em_paralelo(tarefas, max_workers):
+    """Executa chamadas independentes num pool limitado de threads.
+
+    `tarefas` é uma lista de tuplos (funcao, *args). Os resultados são devolvidos na mesma ordem
+    das tarefas, por isso quem consome não nota diferença em relação à execução sequencial.
+    Com max_workers <= 1 (ou uma única tarefa) tudo corre na thread atual.
+    """
+    if max_workers <= 1 or len(tarefas) <= 1:
+        return [funcao(*args) for funcao, *args in tarefas]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tarefas))) as executor:
+        futuros = [executor.submit(com_contexto_da_app(funcao), *args) for funcao, *args in tarefas]
+        return [futuro.result() for futuro in futuros]
@@ -0,0 +1,168 @@
+# app/services/cota_api.py
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+from flask import current_app
+from app import redis_client
+
+# Limite por minuto do plano contratado; é ajustado automaticamente pelos cabeçalhos x-ratelimit-* da API.
+API_FOOTBALL_LIMITE_POR_MINUTO = int(os.getenv('API_FOOTBALL_LIMITE_POR_MINUTO', 300))
+# Tempo máximo (em segundos) que um pedido fica em fila à espera de cota antes de desistir.
+API_FOOTBALL_ESPERA_MAXIMA = float(os.getenv('API_FOOTBALL_ESPERA_MAXIMA', 30))
+# Pausa (em segundos) depois de um 429 sem cabeçalho Retry-After utilizável.
+API_FOOTBALL_PAUSA_429 = float(os.getenv('API_FOOTBALL_PAUSA_429', 10))
+
+CHAVE_BALDE = "api_football:balde"
+CHAVE_COTA = "api_football:cota"
+# Existe enquanto a API pedir para esperar (Retry-After); o seu PTTL é o tempo de pausa restante.
+CHAVE_PAUSA = "api_football:pausa"
+
+# Token bucket atómico: repõe tokens pelo tempo decorrido (relógio do Redis, comum a todos os workers)
+# e consome um token se houver. Devolve o tempo de espera em segundos (0 quando o token foi concedido);
+# durante uma pausa pedida pela API devolve o tempo que falta, sem consumir tokens.
+LUA_ADQUIRIR = """
+local pausa = redis.call('PTTL', KEYS[2])
+if pausa > 0 then
+    return tostring(pausa / 1000)
+end
+local taxa = tonumber(ARGV[1])
+local capacidade = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local agora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local dados = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(dados[1]) or capacidade
+local ts = tonumber(dados[2]) or agora
+tokens = math.min(capacidade, tokens + math.max(0, agora - ts) * taxa)
+local espera = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    espera = (1 - tokens) / taxa
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(agora))
+redis.call('EXPIRE', KEYS[1], 120)
+return tostring(espera)
+"""
+
+# Esvazia o balde com o relógio do Redis (a reposição recomeça a contar a partir de agora) e, se ARGV[1]
+# for positivo, pausa todos os workers durante esse número de milissegundos.
+LUA_ESVAZIAR = """
+local t = redis.call('TIME')
+local agora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('HSET', KEYS[1], 'tokens', '0', 'ts', tostring(agora))
+redis.call('EXPIRE', KEYS[1], 120)
+local pausa_ms = tonumber(ARGV[1])
+if pausa_ms > 0 and redis.call('PTTL', KEYS[2]) < pausa_ms then
+    redis.call('SET', KEYS[2], '1', 'PX', pausa_ms)
+end
+return 1
+"""
+
+
+def segundos_retry_after(valor, padrao=API_FOOTBALL_PAUSA_429):
+    """Segundos indicados pelo cabeçalho Retry-After (número de segundos ou data HTTP), ou `padrao`."""
+    if valor:
+        try:
+            return max(0.0, float(valor))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(valor) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            pass
+    return padrao
+
+
+class CotaApiEsgotada(requests.exceptions.RequestException):
+    """Levantada quando não há cota disponível na API-Football dentro do tempo máximo de espera."""
+
+
+class GovernadorCota:
+    """Limitador distribuído (token bucket no Redis) partilhado por todos os workers do gunicorn.
+
+    Todos os pedidos à API-Football passam por `adquirir`, que coloca o chamador em fila por
+    alguns segundos em vez de falhar. A taxa adapta-se aos cabeçalhos x-ratelimit-* devolvidos pela API.
+    """
+
+    def __init__(self, limite_por_minuto, espera_maxima):
+        self.limite_por_minuto = limite_por_minuto
+        self.espera_maxima = espera_maxima
+        self._script = None
+        self._script_esvaziar = None
+
+    def _limite_efetivo(self):
+        limite_api = redis_client.hget(CHAVE_COTA, 'limite_por_minuto')
+        if limite_api:
+            return min(self.limite_por_minuto, int(limite_api))
+        return self.limite_por_minuto
+
+    def adquirir(self):
+        """Espera até haver um token disponível ou levanta CotaApiEsgotada."""
+        inicio = time.monotonic()
+        while True:
+            try:
+                if self._script is None:
+                    self._script = redis_client.register_script(LUA_ADQUIRIR)
+                limite = self._limite_efetivo()
+                espera = float(self._script(keys=[CHAVE_BALDE, CHAVE_PAUSA], args=[limite / 60.0, limite]))
+            except Exception as e:
+                # Sem Redis não há coordenação possível; seguimos sem limitar para não derrubar as análises.
+                current_app.logger.warning(f"Governador de cota indisponível, pedido segue sem limite: {e}")
+                return
+
+            if espera <= 0:
+                return
+            if time.monotonic() - inicio + espera > self.espera_maxima:
+                raise CotaApiEsgotada(f"Cota da API-Football esgotada (espera estimada de {espera:.1f}s).")
+            time.sleep(espera)
+
+    def registrar_resposta(self, headers):
+        """Guarda o estado da cota informado pela API e esvazia o balde quando o minuto se esgota."""
+        campos = {
+            'limite_por_minuto': headers.get('X-RateLimit-Limit'),
+            'restantes_por_minuto': headers.get('X-RateLimit-Remaining'),
+            'limite_diario': headers.get('x-ratelimit-requests-limit'),
+            'restantes_diario': headers.get('x-ratelimit-requests-remaining'),
+        }
+        campos = {chave: valor for chave, valor in campos.items() if valor is not None}
+        if not campos:
+            return
+        try:
+            redis_client.hset(CHAVE_COTA, mapping=campos)
+            if campos.get('restantes_por_minuto') == '0':
+                self._esvaziar(0)
+        except Exception as e:
+            current_app.logger.warning(f"Não foi possível registar a cota da API-Football: {e}")
+
+    def _esvaziar(self, pausa):
+        if self._script_esvaziar is None:
+            self._script_esvaziar = redis_client.register_script(LUA_ESVAZIAR)
+        self._script_esvaziar(keys=[CHAVE_BALDE, CHAVE_PAUSA], args=[int(pausa * 1000)])
+
+    def registrar_limite_excedido(self, retry_after=None):
+        """Chamado quando a API responde 429: esvazia o balde e pausa todos os workers pelo Retry-After."""
+        pausa = segundos_retry_after(retry_after)
+        current_app.logger.warning(f"API-Football respondeu 429 (Retry-After: {retry_after}). Pausando os pedidos por {pausa:.1f}s.")
+        try:
+            self._esvaziar(pausa)
+        except Exception as e:
+            current_app.logger.warning(f"Não foi possível esvaziar o balde de cota: {e}")
+
+    def obter_orcamento(self):
+        """Devolve o orçamento atual de pedidos, para acompanhamento e planeamento de capacidade."""
+        cota = redis_client.hgetall(CHAVE_COTA)
+        balde = redis_client.hgetall(CHAVE_BALDE)
+        return {
+            'limite_por_minuto_configurado': self.limite_por_minuto,
+            'limite_por_minuto_efetivo': self._limite_efetivo(),
+            'tokens_disponiveis': round(float(balde.get('tokens', self._limite_efetivo())), 2),
+            'pausa_restante_segundos': max(0, redis_client.pttl(CHAVE_PAUSA)) / 1000,
+            'restantes_por_minuto': cota.get('restantes_por_minuto'),
+            'limite_diario': cota.get('limite_diario'),
+            'restantes_diario': cota.get('restantes_diario'),
+        }
+
+
+governador = GovernadorCota(limite_por_minuto=API_FOOTBALL_LIMITE_POR_MINUTO, espera_maxima=API_FOOTBALL_ESPERA_MAXIMA)
@@ -1,7 +1,14 @@
 # app/services/football_api.py
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import threading
+import redis
 from flask import current_app
+from app import cache, redis_client
+from .concorrencia import executar_em_paralelo
+from .cota_api import governador, CotaApiEsgotada
 from datetime import datetime
 
 API_KEY = os.getenv('API_FOOTBALL_KEY')
@@ -11,87 +18,347 @@ HEADERS = {
     'x-rapidapi-key': API_KEY
 }
 BASE_URL = "https://v3.football.api-sports.io/"
+API_FOOTBALL_POOL_SIZE = int(os.getenv('API_FOOTBALL_POOL_SIZE', 20))
+API_FOOTBALL_MAX_RETRIES = int(os.getenv('API_FOOTBALL_MAX_RETRIES', 3))
+API_FOOTBALL_BACKOFF = float(os.getenv('API_FOOTBALL_BACKOFF', 0.5))
+API_FOOTBALL_CONNECT_TIMEOUT = float(os.getenv('API_FOOTBALL_CONNECT_TIMEOUT', 5))
+# Timeout de leitura (em segundos) por endpoint; os restantes usam o valor padrão.
+TIMEOUTS_POR_ENDPOINT = {
+    'fixtures': 15,
+    'fixtures/headtohead': 10,
+    'fixtures/statistics': 10
+}
+TIMEOUT_PADRAO = 10
+# Número máximo de pedidos simultâneos à API-Football durante a análise de uma partida (1 = sequencial).
+API_FOOTBALL_CONCORRENCIA = int(os.getenv('API_FOOTBALL_CONCORRENCIA', 6))
+AGENDA_CACHE_TIMEOUT = int(os.getenv('AGENDA_CACHE_TIMEOUT', 1800))
+# Estatísticas ainda incompletas (a API ainda não tem os dois times) ficam em cache só durante este tempo.
+ESTATISTICAS_INCOMPLETAS_TIMEOUT = int(os.getenv('ESTATISTICAS_INCOMPLETAS_TIMEOUT', 3600))
+# Lock por jogo: análises em simultâneo esperam pelo primeiro pedido em vez de repetirem o mesmo jogo.
+ESTATISTICAS_LOCK_TIMEOUT = 60
+ESTATISTICAS_LOCK_ESPERA = float(os.getenv('ESTATISTICAS_LOCK_ESPERA', 15))
+
+class ClienteApiFootball:
+    """Cliente HTTP partilhado para a API-Football.
+
+    Mantém uma única requests.Session com pool de conexões keep-alive e política de retry/backoff,
+    para não pagar um novo handshake TCP/TLS a cada chamada. A sessão é criada de forma preguiçosa
+    e recriada após um fork (cada worker do gunicorn tem o seu próprio pool). Todos os pedidos
+    passam pelo governador de cota; respostas 429 são repetidas através dele, não pelo urllib3.
+    """
+
+    def __init__(self, tamanho_pool, max_tentativas, backoff, timeout_conexao, timeouts_por_endpoint, timeout_padrao, governador):
+        self.tamanho_pool = tamanho_pool
+        self.max_tentativas = max_tentativas
+        self.backoff = backoff
+        self.timeout_conexao = timeout_conexao
+        self.timeouts_por_endpoint = timeouts_por_endpoint
+        self.timeout_padrao = timeout_padrao
+        self.governador = governador
+        self._sessao = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _criar_sessao(self):
+        retry = Retry(
+            total=self.max_tentativas,
+            backoff_factor=self.backoff,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.tamanho_pool, max_retries=retry)
+        sessao = requests.Session()
+        sessao.headers.update(HEADERS)
+        sessao.mount('https://', adapter)
+        return sessao
+
+    def _obter_sessao(self):
+        pid = os.getpid()
+        if self._sessao is None or self._pid != pid:
+            with self._lock:
+                if self._sessao is None or self._pid != pid:
+                    self._sessao = self._criar_sessao()
+                    self._pid = pid
+        return self._sessao
+
+    def get(self, endpoint, params):
+        """Faz um GET ao endpoint e devolve a lista 'response'. Erros HTTP levantam RequestException."""
+        timeout = (self.timeout_conexao, self.timeouts_por_endpoint.get(endpoint, self.timeout_padrao))
+        for _ in range(self.max_tentativas + 1):
+            self.governador.adquirir()
+            response = self._obter_sessao().get(f"{BASE_URL}{endpoint}", params=params, timeout=timeout)
+            self.governador.registrar_resposta(response.headers)
+            limite_excedido, corpo = self._ler_resposta(response)
+            if not limite_excedido:
+                break
+            self.governador.registrar_limite_excedido(response.headers.get('Retry-After'))
+        else:
+            raise CotaApiEsgotada(f"Limite da API-Football excedido após {self.max_tentativas + 1} tentativas em '{endpoint}'.")
+        response.raise_for_status()
+        if corpo is None:
+            corpo = response.json()
+        return corpo.get('response', [])
+
+    @staticmethod
+    def _ler_resposta(response):
+        """Devolve (limite_excedido, corpo). O corpo das respostas 200 é lido uma só vez e reutilizado.
+
+        A API-Football sinaliza o limite com 429 ou com HTTP 200 e 'errors.rateLimit' no corpo.
+        """
+        if response.status_code == 429:
+            return True, None
+        if response.status_code != 200:
+            return False, None
+        try:
+            corpo = response.json()
+        except ValueError:
+            return False, None
+        erros = corpo.get('errors')
+        return isinstance(erros, dict) and 'rateLimit' in erros, corpo
+
+cliente = ClienteApiFootball(
+    tamanho_pool=API_FOOTBALL_POOL_SIZE,
+    max_tentativas=API_FOOTBALL_MAX_RETRIES,
+    backoff=API_FOOTBALL_BACKOFF,
+    timeout_conexao=API_FOOTBALL_CONNECT_TIMEOUT,
+    timeouts_por_endpoint=TIMEOUTS_POR_ENDPOINT,
+    timeout_padrao=TIMEOUT_PADRAO,
+    governador=governador
+)
+
+def _formatar_partida(jogo):
+    """Converte um jogo da resposta de /fixtures no dicionário de partida usado pela aplicação."""
+    fixture = jogo.get('fixture', {})
+    teams = jogo.get('teams', {})
+    home_team = teams.get('home', {})
+    away_team = teams.get('away', {})
+    league_info = jogo.get('league', {})
+    
+    return {
+        "id": fixture.get('id'),
+        "data": fixture.get('date'),
+        "mandante_id": home_team.get('id'),
+        "mandante_nome": home_team.get('name'),
+        "mandante_escudo": home_team.get('logo'),
+        "visitante_id": away_team.get('id'),
+        "visitante_nome": away_team.get('name'),
+        "visitante_escudo": away_team.get('logo'),
+        "liga_id": league_info.get('id'),
+        "liga_nome": league_info.get('name')
+    }
 
 def buscar_jogos_do_dia(id_liga, nome_liga, data):
     """Busca os jogos do dia na API-Football."""
     current_app.logger.info(f"Buscando jogos para '{nome_liga}' (ID: {id_liga}) na data: {data}...")
-    url = f"{BASE_URL}fixtures"
-    
     ano_da_temporada = data.split('-')[0]
     params = {"league": id_liga, "season": ano_da_temporada, "date": data}
 
     try:
-        response = requests.get(url, headers=HEADERS, params=params, timeout=15)
-        response.raise_for_status()
-        dados = response.json().get('response', [])
-        lista_partidas = []
-        for jogo in dados:
-            fixture = jogo.get('fixture', {})
-            teams = jogo.get('teams', {})
-            home_team = teams.get('home', {})
-            away_team = teams.get('away', {})
-            league_info = jogo.get('league', {})
-            
-            lista_partidas.append({
-                "id": fixture.get('id'),
-                "data": fixture.get('date'),
-                "mandante_id": home_team.get('id'),
-                "mandante_nome": home_team.get('name'),
-                "mandante_escudo": home_team.get('logo'),
-                "visitante_id": away_team.get('id'),
-                "visitante_nome": away_team.get('name'),
-                "visitante_escudo": away_team.get('logo'),
-                "liga_id": league_info.get('id'),
-                "liga_nome": league_info.get('name')
-            })
+        dados = cliente.get('fixtures', params)
+        lista_partidas = [_formatar_partida(jogo) for jogo in dados]
         current_app.logger.info(f"--> {len(lista_partidas)} jogos encontrados para '{nome_liga}'.")
         return lista_partidas
     except requests.exceptions.RequestException as e:
         current_app.logger.error(f"Erro ao buscar jogos do dia para {nome_liga}: {e}")
         return []
 
-def _buscar_e_formatar_jogos(url, params, log_message):
-    """Função auxiliar para buscar dados de jogos e formatar a saída."""
+def buscar_jogos_por_data(data, ids_ligas):
+    """Busca numa única chamada todos os jogos de uma data (UTC) e filtra localmente pelas ligas pedidas.
+
+    A agenda completa da data fica em cache, por isso todos os planos e utilizadores partilham a mesma carga.
+    """
+    cache_key = f"agenda_do_dia:{data}"
+    agenda = cache.get(cache_key)
+
+    if agenda is None:
+        current_app.logger.info(f"Buscando a agenda completa de jogos para a data: {data}...")
+        params = {"date": data}
+        try:
+            agenda = [_formatar_partida(jogo) for jogo in cliente.get('fixtures', params)]
+        except requests.exceptions.RequestException as e:
+            current_app.logger.error(f"Erro ao buscar a agenda de jogos para {data}: {e}")
+            return []
+        cache.set(cache_key, agenda, timeout=AGENDA_CACHE_TIMEOUT)
+        current_app.logger.info(f"--> {len(agenda)} jogos encontrados na agenda de {data}.")
+
+    return [partida for partida in agenda if partida['liga_id'] in ids_ligas]
+
+def _buscar_historico(endpoint, params, log_message):
+    """Função auxiliar que busca o histórico de jogos uma única vez e devolve o payload bruto (ou None em caso de erro)."""
     try:
-        response = requests.get(url, headers=HEADERS, params=params, timeout=10)
-        response.raise_for_status()
-        jogos = response.json().get('response', [])
-        
-        resultados_formatados = []
-        jogos_ids = []
-        for jogo in jogos:
-            fixture = jogo.get('fixture', {})
-            teams = jogo.get('teams', {})
-            goals = jogo.get('goals', {})
-            data_jogo = datetime.fromisoformat(fixture.get('date')).strftime('%d.%m.%Y')
-            
-            jogos_ids.append(fixture.get('id'))
-            resultado = (f"{data_jogo} | "
-                         f"{teams['home']['name']} {goals.get('home', 'N/A')} vs "
-                         f"{goals.get('away', 'N/A')} {teams['away']['name']}")
-            resultados_formatados.append(resultado)
-            
-        texto_formatado = "\n".join(resultados_formatados) if resultados_formatados else "Nenhum dado recente encontrado."
-        return texto_formatado, jogos_ids
+        return cliente.get(endpoint, params)
     except requests.exceptions.RequestException as e:
         current_app.logger.error(f"Erro na API-Football: {log_message}. Detalhes: {e}")
+        return None
+
+def _formatar_texto_e_ids(jogos):
+    """Monta a visão em texto e a lista de IDs a partir do payload bruto."""
+    if jogos is None:
         return "Erro ao buscar dados.", []
 
-def buscar_ultimos_jogos(time_id: int):
-    """Busca os últimos 5 jogos de um time."""
+    resultados_formatados = []
+    jogos_ids = []
+    for jogo in jogos:
+        fixture = jogo.get('fixture', {})
+        teams = jogo.get('teams', {})
+        goals = jogo.get('goals', {})
+        data_jogo = datetime.fromisoformat(fixture.get('date')).strftime('%d.%m.%Y')
+        
+        jogos_ids.append(fixture.get('id'))
+        resultado = (f"{data_jogo} | "
+                     f"{teams['home']['name']} {goals.get('home', 'N/A')} vs "
+                     f"{goals.get('away', 'N/A')} {teams['away']['name']}")
+        resultados_formatados.append(resultado)
+        
+    texto_formatado = "\n".join(resultados_formatados) if resultados_formatados else "Nenhum dado recente encontrado."
+    return texto_formatado, jogos_ids
+
+def _formatar_estruturados(jogos):
+    """Monta a visão estruturada (lista de dicionários) a partir do payload bruto."""
+    if not jogos:
+        return []
+
+    lista_jogos_estruturados = []
+    for jogo in jogos:
+        fixture = jogo.get('fixture', {})
+        teams = jogo.get('teams', {})
+        goals = jogo.get('goals', {})
+        data_jogo = datetime.fromisoformat(fixture.get('date')).strftime('%d.%m.%Y')
+        
+        home_goals = goals.get('home', 0)
+        away_goals = goals.get('away', 0)
+        
+        if home_goals is None: home_goals = 0
+        if away_goals is None: away_goals = 0
+
+        lista_jogos_estruturados.append({
+            "data": data_jogo,
+            "mandante_nome": teams['home']['name'],
+            "mandante_escudo": teams['home']['logo'],
+            "mandante_gols": home_goals,
+            "visitante_nome": teams['away']['name'],
+            "visitante_escudo": teams['away']['logo'],
+            "visitante_gols": away_goals,
+            "total_gols": home_goals + away_goals,
+            "diferenca_gols": home_goals - away_goals
+        })
+        
+    return lista_jogos_estruturados
+
+def _montar_historico(jogos):
+    """Constrói as três visões (texto, IDs e estruturada) a partir de um único payload."""
+    texto, jogos_ids = _formatar_texto_e_ids(jogos)
+    return {
+        "texto": texto,
+        "ids": jogos_ids,
+        "estruturados": _formatar_estruturados(jogos),
+        "erro": jogos is None
+    }
+
+def buscar_historico_time(time_id: int):
+    """Busca os últimos 5 jogos de um time com uma única chamada e devolve todas as visões."""
     current_app.logger.info(f"Buscando últimos 5 jogos para o time ID: {time_id}")
-    url = f"{BASE_URL}fixtures"
     params = {'team': time_id, 'last': 5}
     log_message = f"buscar últimos jogos para o time ID {time_id}"
-    return _buscar_e_formatar_jogos(url, params, log_message)
+    return _montar_historico(_buscar_historico('fixtures', params, log_message))
 
-def buscar_h2h(time1_id: int, time2_id: int):
-    """Busca os últimos 5 confrontos diretos."""
+def buscar_historicos_partida(mandante_id: int, visitante_id: int):
+    """Busca em paralelo o histórico dos dois times e o H2H de uma partida."""
+    return executar_em_paralelo([
+        (buscar_historico_time, mandante_id),
+        (buscar_historico_time, visitante_id),
+        (buscar_historico_h2h, mandante_id, visitante_id)
+    ], max_workers=API_FOOTBALL_CONCORRENCIA)
+
+def buscar_historico_h2h(time1_id: int, time2_id: int):
+    """Busca os últimos 5 confrontos diretos com uma única chamada e devolve todas as visões."""
     current_app.logger.info(f"Buscando H2H entre os times: {time1_id} vs {time2_id}")
-    url = f"{BASE_URL}fixtures/headtohead"
     params = {'h2h': f"{time1_id}-{time2_id}", 'last': 5}
     log_message = f"buscar H2H para os times {time1_id} e {time2_id}"
-    return _buscar_e_formatar_jogos(url, params, log_message)
+    return _montar_historico(_buscar_historico('fixtures/headtohead', params, log_message))
+
+def buscar_ultimos_jogos(time_id: int):
+    """Busca os últimos 5 jogos de um time."""
+    historico = buscar_historico_time(time_id)
+    return historico['texto'], historico['ids']
+
+def buscar_h2h(time1_id: int, time2_id: int):
+    """Busca os últimos 5 confrontos diretos."""
+    historico = buscar_historico_h2h(time1_id, time2_id)
+    return historico['texto'], historico['ids']
+
+def _extrair_estatisticas_fixture(data):
+    """Extrai escanteios e cartões de ambos os times a partir da resposta de /fixtures/statistics."""
+    estatisticas = []
+    for team_data in data:
+        corners = 0
+        cards = 0
+        for stat in team_data.get('statistics', []):
+            stat_type = stat.get('type')
+            stat_value = stat.get('value')
+            if stat_value is None: stat_value = 0
+            
+            if stat_type == 'Corner Kicks':
+                corners = int(stat_value)
+            elif stat_type in ['Yellow Cards', 'Red Cards']:
+                cards += int(stat_value)
+
+        estatisticas.append({
+            'team_id': team_data['team']['id'],
+            'team_name': team_data['team']['name'],
+            'corners': corners,
+            'cards': cards
+        })
+    return estatisticas
+
+def obter_estatisticas_fixture(jogo_id):
+    """Devolve as estatísticas (escanteios e cartões) de ambos os times de um jogo.
+
+    Estatísticas de jogos encerrados nunca mudam, por isso ficam guardadas no Redis por ID do jogo
+    sem expiração: cada jogo só é pedido à API-Football uma vez. Respostas incompletas ficam em cache
+    por ESTATISTICAS_INCOMPLETAS_TIMEOUT, e pedidos simultâneos do mesmo jogo esperam pelo primeiro.
+    """
+    cache_key = f"fixture_stats:{jogo_id}"
+    estatisticas = cache.get(cache_key)
+    if estatisticas is not None:
+        return estatisticas
+
+    lock = redis_client.lock(f"lock:{cache_key}", timeout=ESTATISTICAS_LOCK_TIMEOUT)
+    try:
+        adquirido = lock.acquire(blocking=True, blocking_timeout=ESTATISTICAS_LOCK_ESPERA)
+    except redis.exceptions.RedisError as e:
+        current_app.logger.warning(f"Lock das estatísticas do jogo ID {jogo_id} indisponível, a pedir sem coordenação: {e}")
+        adquirido = False
+    try:
+        if adquirido:
+            estatisticas = cache.get(cache_key)
+            if estatisticas is not None:
+                return estatisticas
+
+        try:
+            data = cliente.get('fixtures/statistics', {'fixture': jogo_id})
+        except requests.exceptions.RequestException as e:
+            current_app.logger.error(f"Erro ao buscar estatísticas para o jogo ID {jogo_id}: {e}")
+            return []
+
+        estatisticas = _extrair_estatisticas_fixture(data)
+        # Sem os dados dos dois times a resposta pode ser preenchida mais tarde: fica em cache só por pouco tempo.
+        cache.set(cache_key, estatisticas, timeout=0 if len(estatisticas) >= 2 else ESTATISTICAS_INCOMPLETAS_TIMEOUT)
+        return estatisticas
+    finally:
+        if adquirido:
+            try:
+                lock.release()
+            except redis.exceptions.LockError:
+                pass
+
+def pre_carregar_estatisticas(jogos_ids: list):
+    """Carrega em paralelo as estatísticas de vários jogos (sem repetir IDs) e devolve um dicionário por ID."""
+    ids_unicos = list(dict.fromkeys(jogo_id for jogo_id in jogos_ids if jogo_id))
+    resultados = executar_em_paralelo([(obter_estatisticas_fixture, jogo_id) for jogo_id in ids_unicos],
+                                      max_workers=API_FOOTBALL_CONCORRENCIA)
+    return dict(zip(ids_unicos, resultados))
 
 def buscar_estatisticas_jogos(jogos_ids: list):
     """Busca estatísticas para uma lista de IDs de jogos e retorna uma string simples formatada."""
@@ -100,47 +367,21 @@ def buscar_estatisticas_jogos(jogos_ids: list):
 
     all_stats = []
     for jogo_id in jogos_ids:
-        try:
-            url = f"{BASE_URL}fixtures/statistics"
-            params = {'fixture': jogo_id}
-            response = requests.get(url, headers=HEADERS, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json().get('response', [])
-            
-            if not data or len(data) < 2: continue
-            
-            home_team_data = data[0]
-            away_team_data = data[1]
-
-            stats_jogo = {
-                'home': {'team_name': home_team_data['team']['name'], 'corners': 0, 'cards': 0},
-                'away': {'team_name': away_team_data['team']['name'], 'corners': 0, 'cards': 0}
-            }
-            
-            for team_data in [home_team_data, away_team_data]:
-                team_side = 'home' if team_data['team']['id'] == home_team_data['team']['id'] else 'away'
-                for stat in team_data['statistics']:
-                    stat_type = stat.get('type')
-                    stat_value = stat.get('value')
-                    if stat_value is None: stat_value = 0
-                    
-                    if stat_type == 'Corner Kicks':
-                        stats_jogo[team_side]['corners'] = stat_value
-                    elif stat_type in ['Yellow Cards', 'Red Cards']:
-                        stats_jogo[team_side]['cards'] += int(stat_value)
-            
-            stats_line = (f"{stats_jogo['home']['team_name']} (Escanteios: {stats_jogo['home']['corners']}, Cartões: {stats_jogo['home']['cards']}) vs "
-                          f"{stats_jogo['away']['team_name']} (Escanteios: {stats_jogo['away']['corners']}, Cartões: {stats_jogo['away']['cards']})")
-            all_stats.append(stats_line)
+        estatisticas = obter_estatisticas_fixture(jogo_id)
+        if len(estatisticas) < 2: continue
 
-        except requests.exceptions.RequestException as e:
-            current_app.logger.error(f"Erro ao buscar estatísticas para o jogo ID {jogo_id}: {e}")
-            continue
+        home, away = estatisticas[0], estatisticas[1]
+        stats_line = (f"{home['team_name']} (Escanteios: {home['corners']}, Cartões: {home['cards']}) vs "
+                      f"{away['team_name']} (Escanteios: {away['corners']}, Cartões: {away['cards']})")
+        all_stats.append(stats_line)
 
     return "\n".join(all_stats) if all_stats else "Nenhuma estatística encontrada."
 
-def buscar_estatisticas_time_em_jogos(time_id: int, jogos_ids: list):
-    """Busca estatísticas de um time específico para uma lista de IDs de jogos e retorna dados estruturados."""
+def buscar_estatisticas_time_em_jogos(time_id: int, jogos_ids: list, estatisticas_por_jogo=None):
+    """Busca estatísticas de um time específico para uma lista de IDs de jogos e retorna dados estruturados.
+
+    Se `estatisticas_por_jogo` (resultado de pre_carregar_estatisticas) for passado, os dados são lidos dali.
+    """
     if not jogos_ids:
         return {'corners': [], 'cards': []}
 
@@ -148,92 +389,38 @@ def buscar_estatisticas_time_em_jogos(time_id: int, jogos_ids: list):
     all_cards = []
     
     for jogo_id in jogos_ids:
-        try:
-            url = f"{BASE_URL}fixtures/statistics"
-            params = {'fixture': jogo_id}
-            response = requests.get(url, headers=HEADERS, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json().get('response', [])
-            
-            if not data: continue
-            
-            team_stats = None
-            for team_data in data:
-                if team_data['team']['id'] == time_id:
-                    team_stats = team_data.get('statistics', [])
-                    break
-            
-            if not team_stats: continue
-
-            corners = 0
-            cards = 0
-            
-            for stat in team_stats:
-                stat_type = stat.get('type')
-                stat_value = stat.get('value')
-                if stat_value is None: stat_value = 0
-                
-                if stat_type == 'Corner Kicks':
-                    corners = int(stat_value)
-                elif stat_type in ['Yellow Cards', 'Red Cards']:
-                    cards += int(stat_value)
-            
-            all_corners.append(corners)
-            all_cards.append(cards)
+        if estatisticas_por_jogo is not None and jogo_id in estatisticas_por_jogo:
+            estatisticas = estatisticas_por_jogo[jogo_id]
+        else:
+            estatisticas = obter_estatisticas_fixture(jogo_id)
+        team_stats = next((stats for stats in estatisticas if stats['team_id'] == time_id), None)
+        if not team_stats: continue
 
-        except requests.exceptions.RequestException as e:
-            current_app.logger.error(f"Erro ao buscar estatísticas detalhadas para o time ID {time_id} no jogo {jogo_id}: {e}")
-            continue
+        all_corners.append(team_stats['corners'])
+        all_cards.append(team_stats['cards'])
             
     return {'corners': all_corners, 'cards': all_cards}
 
-def _buscar_jogos_estruturados(url, params, log_message):
-    """Função auxiliar para buscar dados de jogos e formatar a saída como uma lista de dicionários."""
-    try:
-        response = requests.get(url, headers=HEADERS, params=params, timeout=10)
-        response.raise_for_status()
-        jogos = response.json().get('response', [])
-        
-        lista_jogos_estruturados = []
-        for jogo in jogos:
-            fixture = jogo.get('fixture', {})
-            teams = jogo.get('teams', {})
-            goals = jogo.get('goals', {})
-            data_jogo = datetime.fromisoformat(fixture.get('date')).strftime('%d.%m.%Y')
-            
-            home_goals = goals.get('home', 0)
-            away_goals = goals.get('away', 0)
-            
-            if home_goals is None: home_goals = 0
-            if away_goals is None: away_goals = 0
-
-            lista_jogos_estruturados.append({
-                "data": data_jogo,
-                "mandante_nome": teams['home']['name'],
-                "mandante_escudo": teams['home']['logo'],
-                "mandante_gols": home_goals,
-                "visitante_nome": teams['away']['name'],
-                "visitante_escudo": teams['away']['logo'],
-                "visitante_gols": away_goals,
-                "total_gols": home_goals + away_goals,
-                "diferenca_gols": home_goals - away_goals
-            })
-            
-        return lista_jogos_estruturados
-    except requests.exceptions.RequestException as e:
-        current_app.logger.error(f"Erro na API-Football: {log_message}. Detalhes: {e}")
-        return []
+def buscar_totais_jogos(jogos_ids: list, estatisticas_por_jogo=None):
+    """Totais de escanteios e cartões (soma dos dois times) de cada jogo com estatísticas completas."""
+    totais_corners = []
+    totais_cards = []
+    for jogo_id in jogos_ids:
+        if estatisticas_por_jogo is not None and jogo_id in estatisticas_por_jogo:
+            estatisticas = estatisticas_por_jogo[jogo_id]
+        else:
+            estatisticas = obter_estatisticas_fixture(jogo_id)
+        if len(estatisticas) < 2: continue
+
+        totais_corners.append(sum(stats['corners'] for stats in estatisticas))
+        totais_cards.append(sum(stats['cards'] for stats in estatisticas))
+
+    return {'corners': totais_corners, 'cards': totais_cards}
 
 def buscar_ultimos_jogos_estruturados(time_id: int):
     """Busca os últimos 5 jogos de um time em formato estruturado."""
-    url = f"{BASE_URL}fixtures"
-    params = {'team': time_id, 'last': 5}
-    log_message = f"buscar últimos jogos estruturados para o time ID {time_id}"
-    return _buscar_jogos_estruturados(url, params, log_message)
+    return buscar_historico_time(time_id)['estruturados']
 
 def buscar_h2h_estruturado(time1_id: int, time2_id: int):
     """Busca os últimos 5 confrontos diretos em formato estruturado."""
-    url = f"{BASE_URL}fixtures/headtohead"
-    params = {'h2h': f"{time1_id}-{time2_id}", 'last': 5}
-    log_message = f"buscar H2H estruturado para os times {time1_id} e {time2_id}"
-    return _buscar_jogos_estruturados(url, params, log_message)
\ No newline at end of file
+    return buscar_historico_h2h(time1_id, time2_id)['estruturados']
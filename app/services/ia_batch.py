@@ -0,0 +1,189 @@
+# app/services/ia_batch.py
+import json
+import os
+import time
+from datetime import datetime
+import openai
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+from app import cache, db
+from app.models import Analysis
+from . import ai_analyzer, pre_analise
+from .analysis_logic import coletar_dados_partida, colunas_analise, invalidar_snapshots, montar_resultado_final
+from .concorrencia import executar_em_paralelo
+from .pregeracao import PREGERACAO_WORKERS, data_de_amanha, descobrir_partidas, registrar_progresso
+from .sitemap import invalidar_sitemap
+
+# Pré-geração pela Batch API da OpenAI: todos os prompts de uma data num único ficheiro JSONL, processados
+# de forma assíncrona (janela de até 24h) a metade do custo por token e fora dos limites das chamadas diretas.
+# Com IA_BATCH_BASE_URL os pedidos vão para outro servidor compatível (ex.: scripts/fake_openai_batch.py).
+IA_BATCH_BASE_URL = os.getenv('IA_BATCH_BASE_URL')
+IA_BATCH_INTERVALO_POLL = float(os.getenv('IA_BATCH_INTERVALO_POLL', 60))
+# Tempo máximo de espera pelo lote; depois disso o lote fica pendente e pode ser retomado com --batch-id.
+IA_BATCH_ESPERA_MAXIMA = float(os.getenv('IA_BATCH_ESPERA_MAXIMA', 24 * 3600))
+
+IA_BATCH_JANELA = "24h"
+ENDPOINT_CHAT = "/v1/chat/completions"
+ESTADOS_FINAIS = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+def criar_cliente():
+    """Cliente da OpenAI para a Batch API (o mesmo das análises diretas, salvo se IA_BATCH_BASE_URL estiver definido)."""
+    if IA_BATCH_BASE_URL:
+        return openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY') or 'local', base_url=IA_BATCH_BASE_URL)
+    return ai_analyzer.client
+
+
+def _id_pedido(partida):
+    return f"jogo-{partida['id']}"
+
+
+def submeter_lote(cliente, data_para_buscar, pedidos):
+    """Envia o ficheiro JSONL com um pedido de chat completion por partida e cria o lote. Devolve o ID do lote."""
+    conteudo = "\n".join(
+        json.dumps({"custom_id": custom_id, "method": "POST", "url": ENDPOINT_CHAT,
+                    "body": ai_analyzer.parametros_pedido(pedido['mensagens'])}, ensure_ascii=False)
+        for custom_id, pedido in pedidos.items()
+    )
+    ficheiro = cliente.files.create(file=(f"analises-{data_para_buscar}.jsonl", conteudo.encode('utf-8')), purpose="batch")
+    lote = cliente.batches.create(input_file_id=ficheiro.id, endpoint=ENDPOINT_CHAT,
+                                  completion_window=IA_BATCH_JANELA, metadata={"data": data_para_buscar})
+    current_app.logger.info(f"Lote {lote.id} submetido com {len(pedidos)} pedidos para {data_para_buscar}.")
+    return lote.id
+
+
+def aguardar_lote(cliente, batch_id, intervalo_poll=IA_BATCH_INTERVALO_POLL, espera_maxima=IA_BATCH_ESPERA_MAXIMA):
+    """Consulta o lote até chegar a um estado final ou até se esgotar `espera_maxima`. Devolve o último estado lido."""
+    limite = time.monotonic() + espera_maxima
+    while True:
+        lote = cliente.batches.retrieve(batch_id)
+        if lote.status in ESTADOS_FINAIS or time.monotonic() >= limite:
+            return lote
+        contagens = lote.request_counts
+        if contagens:
+            current_app.logger.info(f"Lote {batch_id}: {lote.status} ({contagens.completed}/{contagens.total}).")
+        time.sleep(intervalo_poll)
+
+
+def ler_resultados(cliente, lote):
+    """Texto da resposta do modelo por custom_id. Pedidos com erro ficam de fora (e são registados no log)."""
+    respostas = {}
+    if lote.output_file_id:
+        for linha in cliente.files.content(lote.output_file_id).text.splitlines():
+            if not linha.strip():
+                continue
+            resultado = json.loads(linha)
+            resposta = resultado.get('response') or {}
+            if resposta.get('status_code') == 200:
+                respostas[resultado['custom_id']] = resposta['body']['choices'][0]['message']['content']
+            else:
+                current_app.logger.error(f"Lote {lote.id}: pedido {resultado['custom_id']} falhou: {resultado.get('error') or resposta}")
+    if lote.error_file_id:
+        for linha in cliente.files.content(lote.error_file_id).text.splitlines():
+            if linha.strip():
+                resultado = json.loads(linha)
+                current_app.logger.error(f"Lote {lote.id}: pedido {resultado['custom_id']} falhou: {resultado.get('error')}")
+    return respostas
+
+
+def gravar_analises(analysis_date, analises):
+    """Insere de uma só vez as análises (tuplos partida, dados_partida, dados_ia). Devolve os IDs inseridos.
+
+    As que outro processo já tenha gravado entretanto (restrição única em match_api_id + analysis_date) são ignoradas.
+    """
+    if not analises:
+        return []
+    valores = [colunas_analise(partida['id'], analysis_date, montar_resultado_final(partida, dados_ia, dados_partida))
+               for partida, dados_partida, dados_ia in analises]
+    ids = db.session.execute(
+        insert(Analysis).values(valores)
+        .on_conflict_do_nothing(index_elements=['match_api_id', 'analysis_date'])
+        .returning(Analysis.id)
+    ).scalars().all()
+    db.session.commit()
+    if ids:
+        invalidar_snapshots(analysis_date)
+        invalidar_sitemap(*ids)
+    return ids
+
+
+def pregerar_em_lote(data_para_buscar=None, cliente=None, workers=PREGERACAO_WORKERS, batch_id=None,
+                     intervalo_poll=IA_BATCH_INTERVALO_POLL, espera_maxima=IA_BATCH_ESPERA_MAXIMA):
+    """Gera as análises de uma data (por omissão, amanhã) num único lote da Batch API.
+
+    Os dados das partidas são recolhidos como na geração direta; as partidas sem candidatos da pré-análise
+    e as respostas já em cache não entram no lote. Com `batch_id` retoma um lote submetido antes (por exemplo,
+    depois de esgotada a espera) em vez de submeter outro. `cliente` permite injetar outro cliente da OpenAI.
+    """
+    data_para_buscar = data_para_buscar or data_de_amanha()
+    analysis_date = datetime.strptime(data_para_buscar, '%Y-%m-%d').date()
+    cliente = cliente or criar_cliente()
+    if cliente is None:
+        raise RuntimeError("Cliente da OpenAI não configurado.")
+
+    partidas = descobrir_partidas(data_para_buscar)
+    existentes = set(db.session.execute(
+        db.select(Analysis.match_api_id)
+        .filter(Analysis.analysis_date == analysis_date, Analysis.match_api_id.in_([partida['id'] for partida in partidas]))
+    ).scalars())
+    pendentes = [partida for partida in partidas if partida['id'] not in existentes]
+    current_app.logger.info(f"Pré-geração em lote: {len(pendentes)} de {len(partidas)} partidas por analisar em {data_para_buscar}.")
+    registrar_progresso(data_para_buscar, estado='em_andamento', modo='batch', total=len(partidas),
+                        concluidas=len(existentes), falhas=0, iniciado_em=datetime.utcnow().isoformat())
+
+    dados_por_partida = executar_em_paralelo([(coletar_dados_partida, partida) for partida in pendentes], workers)
+
+    falhas = []
+    prontas = []
+    pedidos = {}
+    for partida, dados_partida in zip(pendentes, dados_por_partida):
+        if dados_partida is None:
+            current_app.logger.error(f"Pré-geração em lote: histórico incompleto para o jogo {partida['id']}.")
+            falhas.append(partida['id'])
+            continue
+        if not dados_partida['dados_para_ia']['candidatos'] and pre_analise.PRE_ANALISE_SALTAR_IA:
+            prontas.append((partida, dados_partida, pre_analise.analise_sem_sinal(partida, dados_partida['dados_brutos'])))
+            continue
+        mensagens = ai_analyzer.montar_mensagens(partida, dados_partida['dados_para_ia'])
+        if mensagens is None:
+            falhas.append(partida['id'])
+            continue
+        chave = ai_analyzer.chave_cache_ia(mensagens)
+        dados_ia = cache.get(chave)
+        if dados_ia is not None:
+            prontas.append((partida, dados_partida, dados_ia))
+            continue
+        pedidos[_id_pedido(partida)] = {'partida': partida, 'dados_partida': dados_partida, 'mensagens': mensagens, 'chave': chave}
+
+    if pedidos:
+        batch_id = batch_id or submeter_lote(cliente, data_para_buscar, pedidos)
+        registrar_progresso(data_para_buscar, estado='lote_submetido', batch_id=batch_id, pedidos_lote=len(pedidos))
+        lote = aguardar_lote(cliente, batch_id, intervalo_poll, espera_maxima)
+        if lote.status not in ESTADOS_FINAIS:
+            # Nada é gravado: ao retomar, as partidas prontas são recalculadas (os dados vêm do cache da API).
+            current_app.logger.warning(f"Lote {batch_id} ainda em '{lote.status}'; retome com --batch-id {batch_id}.")
+            registrar_progresso(data_para_buscar, estado='lote_pendente', batch_id=batch_id)
+            return {'data': data_para_buscar, 'total': len(partidas), 'batch_id': batch_id, 'estado': lote.status}
+
+        respostas = ler_resultados(cliente, lote)
+        for custom_id, pedido in pedidos.items():
+            partida = pedido['partida']
+            if custom_id not in respostas:
+                falhas.append(partida['id'])
+                continue
+            dados_ia, erro = ai_analyzer.validar_resposta(partida, respostas[custom_id],
+                                                         pedido['dados_partida']['dados_para_ia']['candidatos'])
+            if erro:
+                falhas.append(partida['id'])
+                continue
+            cache.set(pedido['chave'], dados_ia, timeout=ai_analyzer.IA_CACHE_TIMEOUT)
+            prontas.append((partida, pedido['dados_partida'], dados_ia))
+
+    inseridas = gravar_analises(analysis_date, prontas)
+    concluidas = len(existentes) + len(prontas)
+    registrar_progresso(data_para_buscar, estado='concluido' if not falhas else 'concluido_com_falhas',
+                        concluidas=concluidas, falhas=len(falhas), jogos_com_falha=','.join(map(str, falhas)))
+    current_app.logger.info(f"Pré-geração em lote de {data_para_buscar} terminada: {concluidas}/{len(partidas)} análises "
+                            f"({len(inseridas)} novas, {len(pedidos)} pela Batch API), {len(falhas)} falhas.")
+    return {'data': data_para_buscar, 'total': len(partidas), 'concluidas': concluidas, 'falhas': falhas,
+            'batch_id': batch_id, 'pedidos_lote': len(pedidos)}
@@ -0,0 +1,105 @@
+# app/services/identidade.py
+import json
+import os
+import threading
+import time
+import redis
+from flask import current_app
+from flask_login import UserMixin
+from app import db, redis_client
+
+# Validade da identidade em cache no Redis (partilhada pelos workers) e na memória de cada processo.
+# A cópia local não é invalidada noutros processos, por isso o seu TTL tem de ser curto.
+IDENTIDADE_TTL_REDIS = int(os.getenv('IDENTIDADE_TTL_REDIS', 300))
+IDENTIDADE_TTL_LOCAL = float(os.getenv('IDENTIDADE_TTL_LOCAL', 5))
+
+# Campos usados no caminho de cada pedido (autorização e plano). Os restantes são lidos da base de dados.
+CAMPOS_IDENTIDADE = ('id', 'subscription_tier', 'email_verified', 'stripe_customer_id')
+
+_cache_local = {}
+_lock_local = threading.Lock()
+
+
+def _chave(user_id):
+    return f"identidade:{user_id}"
+
+
+class IdentidadeUtilizador(UserMixin):
+    """Utilizador autenticado montado a partir da cache, sem consultar a base de dados.
+
+    Expõe diretamente os campos de CAMPOS_IDENTIDADE; qualquer outro atributo (email, username, password,
+    get_reset_token...) carrega o modelo User na primeira utilização. Rotas que alteram o utilizador devem
+    trabalhar sobre `modelo()` e chamar `invalidar_identidade` após o commit.
+    """
+
+    def __init__(self, dados):
+        for campo in CAMPOS_IDENTIDADE:
+            setattr(self, campo, dados[campo])
+        self._modelo = None
+
+    def modelo(self):
+        if self._modelo is None:
+            from app.models import User
+            self._modelo = db.session.get(User, self.id)
+        return self._modelo
+
+    def __getattr__(self, nome):
+        # Só é chamado para atributos que não existem na identidade.
+        if nome.startswith('_'):
+            raise AttributeError(nome)
+        return getattr(self.modelo(), nome)
+
+    def __repr__(self):
+        return f"IdentidadeUtilizador({self.id}, '{self.subscription_tier}')"
+
+
+def _ler_local(user_id):
+    entrada = _cache_local.get(user_id)
+    if entrada and entrada[0] > time.monotonic():
+        return entrada[1]
+    return None
+
+
+def _guardar_local(user_id, dados):
+    with _lock_local:
+        _cache_local[user_id] = (time.monotonic() + IDENTIDADE_TTL_LOCAL, dados)
+
+
+def _carregar_do_banco(user_id):
+    from app.models import User
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    return {campo: getattr(user, campo) for campo in CAMPOS_IDENTIDADE}
+
+
+def carregar_identidade(user_id):
+    """Devolve a identidade do utilizador (memória local -> Redis -> base de dados), ou None se não existir."""
+    dados = _ler_local(user_id)
+    if dados is None:
+        try:
+            guardado = redis_client.get(_chave(user_id))
+            if guardado:
+                dados = json.loads(guardado)
+            else:
+                dados = _carregar_do_banco(user_id)
+                if dados is None:
+                    return None
+                redis_client.set(_chave(user_id), json.dumps(dados), ex=IDENTIDADE_TTL_REDIS)
+        except redis.exceptions.RedisError as e:
+            current_app.logger.warning(f"Cache de identidade indisponível, a ler o utilizador da base de dados: {e}")
+            dados = _carregar_do_banco(user_id)
+            if dados is None:
+                return None
+        _guardar_local(user_id, dados)
+    return IdentidadeUtilizador(dados)
+
+
+def invalidar_identidade(user_id):
+    """Descarta a identidade em cache; chamar depois de qualquer commit que altere CAMPOS_IDENTIDADE."""
+    with _lock_local:
+        _cache_local.pop(user_id, None)
+    try:
+        redis_client.delete(_chave(user_id))
+    except redis.exceptions.RedisError as e:
+        current_app.logger.warning(f"Não foi possível invalidar a identidade do utilizador {user_id}: {e}")
@@ -0,0 +1,157 @@
+# app/services/perfil_db.py
+import os
+import time
+from collections import Counter
+import redis
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from app import db, redis_client
+
+# Instrumentação opcional das consultas SQL por pedido (PERFIL_DB=1). Em modo debug os números saem em
+# cabeçalhos X-DB-*; em produção são agregados por endpoint no Redis (ver `flask perfil-db relatorio`).
+PERFIL_DB_ATIVO = os.getenv('PERFIL_DB', '0').lower() in ['true', 'on', '1']
+# Quantas vezes a mesma instrução pode repetir-se num pedido antes de ser sinalizada como provável N+1.
+PERFIL_DB_LIMIAR_N_MAIS_UM = int(os.getenv('PERFIL_DB_LIMIAR_N_MAIS_UM', 5))
+PERFIL_DB_MAIS_LENTAS = int(os.getenv('PERFIL_DB_MAIS_LENTAS', 3))
+
+CHAVE_ENDPOINTS = "perfil_db:endpoints"
+
+
+def _chave_metricas(endpoint):
+    return f"perfil_db:{endpoint}"
+
+
+class PerfilPedido:
+    """Acumula as consultas de um pedido: número, tempo total, mais lentas, repetições e espera no pool."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo = 0.0
+        self.espera_pool = 0.0
+        self.mais_lentas = []
+        self.repeticoes = Counter()
+
+    def registar(self, instrucao, duracao):
+        self.consultas += 1
+        self.tempo += duracao
+        self.repeticoes[instrucao] += 1
+        self.mais_lentas.append((duracao, instrucao))
+        self.mais_lentas.sort(key=lambda item: item[0], reverse=True)
+        del self.mais_lentas[PERFIL_DB_MAIS_LENTAS:]
+
+    def n_mais_um(self):
+        """Instruções idênticas (mesmo SQL parametrizado) repetidas acima do limiar."""
+        return [(instrucao, vezes) for instrucao, vezes in self.repeticoes.most_common()
+                if vezes >= PERFIL_DB_LIMIAR_N_MAIS_UM]
+
+
+def _perfil_atual():
+    # Só conta consultas feitas na thread do pedido; threads de fundo têm o seu próprio contexto da app.
+    if has_request_context():
+        return g.get('perfil_db')
+    return None
+
+
+def _resumir(instrucao, tamanho=120):
+    return " ".join(instrucao.split())[:tamanho]
+
+
+def _instrumentar_engine(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def antes_de_executar(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('perfil_db_inicio', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def depois_de_executar(conn, cursor, statement, parameters, context, executemany):
+        duracao = time.perf_counter() - conn.info['perfil_db_inicio'].pop()
+        perfil = _perfil_atual()
+        if perfil is not None:
+            perfil.registar(statement, duracao)
+
+    # O SQLAlchemy não expõe a espera pelo checkout em eventos; mede-se à volta de pool.connect.
+    pool = engine.pool
+    connect_original = pool.connect
+
+    def connect_medido():
+        inicio = time.perf_counter()
+        try:
+            return connect_original()
+        finally:
+            perfil = _perfil_atual()
+            if perfil is not None:
+                perfil.espera_pool += time.perf_counter() - inicio
+    pool.connect = connect_medido
+
+
+def _emitir_cabecalhos(perfil, response):
+    response.headers['X-DB-Queries'] = str(perfil.consultas)
+    response.headers['X-DB-Time-Ms'] = f"{perfil.tempo * 1000:.1f}"
+    response.headers['X-DB-Pool-Wait-Ms'] = f"{perfil.espera_pool * 1000:.1f}"
+    if perfil.mais_lentas:
+        response.headers['X-DB-Slowest'] = " | ".join(
+            f"{duracao * 1000:.1f}ms {_resumir(instrucao)}" for duracao, instrucao in perfil.mais_lentas)
+    suspeitas = perfil.n_mais_um()
+    if suspeitas:
+        response.headers['X-DB-N-Plus-One'] = " | ".join(f"{vezes}x {_resumir(instrucao)}" for instrucao, vezes in suspeitas)
+
+
+def _agregar_metricas(perfil, endpoint):
+    chave = _chave_metricas(endpoint)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.sadd(CHAVE_ENDPOINTS, endpoint)
+        pipe.hincrby(chave, 'pedidos', 1)
+        pipe.hincrby(chave, 'consultas', perfil.consultas)
+        pipe.hincrbyfloat(chave, 'tempo_ms', round(perfil.tempo * 1000, 3))
+        pipe.hincrbyfloat(chave, 'espera_pool_ms', round(perfil.espera_pool * 1000, 3))
+        if perfil.n_mais_um():
+            pipe.hincrby(chave, 'pedidos_n_mais_um', 1)
+        pipe.execute()
+    except redis.exceptions.RedisError as e:
+        current_app.logger.warning(f"Não foi possível agregar as métricas de base de dados de {endpoint}: {e}")
+
+
+def obter_metricas():
+    """Métricas agregadas por endpoint, com médias por pedido."""
+    metricas = {}
+    for endpoint in sorted(redis_client.smembers(CHAVE_ENDPOINTS)):
+        dados = redis_client.hgetall(_chave_metricas(endpoint))
+        pedidos = int(dados.get('pedidos', 0))
+        if not pedidos:
+            continue
+        metricas[endpoint] = {
+            'pedidos': pedidos,
+            'consultas_por_pedido': round(int(dados.get('consultas', 0)) / pedidos, 2),
+            'tempo_ms_por_pedido': round(float(dados.get('tempo_ms', 0)) / pedidos, 2),
+            'espera_pool_ms_por_pedido': round(float(dados.get('espera_pool_ms', 0)) / pedidos, 2),
+            'pedidos_n_mais_um': int(dados.get('pedidos_n_mais_um', 0)),
+        }
+    return metricas
+
+
+def iniciar_perfil_db(app):
+    """Liga a instrumentação às engines da app e os hooks de início e fim de pedido."""
+    with app.app_context():
+        for engine in db.engines.values():
+            _instrumentar_engine(engine)
+
+    @app.before_request
+    def iniciar_perfil():
+        g.perfil_db = PerfilPedido()
+
+    @app.after_request
+    def terminar_perfil(response):
+        perfil = g.pop('perfil_db', None)
+        if perfil is None:
+            return response
+        suspeitas = perfil.n_mais_um()
+        if suspeitas:
+            instrucao, vezes = suspeitas[0]
+            app.logger.warning(f"Provável N+1 em {request.endpoint}: {vezes}x {_resumir(instrucao)}")
+        if app.debug:
+            _emitir_cabecalhos(perfil, response)
+        elif request.endpoint:
+            _agregar_metricas(perfil, request.endpoint)
+        return response
+
+    app.logger.info("Perfil de consultas SQL ativo.")
@@ -0,0 +1,192 @@
+# app/services/pre_analise.py
+import os
+import numpy as np
+
+# Pré-análise determinística: aplica localmente as regras dos PASSOS 1 a 3 do prompt (contagens de linhas
+# batidas, consistência entre conjuntos de dados e handicap) e devolve os mercados candidatos com a sua
+# evidência. A IA só escreve o texto e escolhe entre os candidatos; sem candidatos a IA não é chamada.
+
+# Fração mínima de jogos que têm de bater a linha em CADA conjunto de dados (4 de 5 jogos = 0.8).
+PRE_ANALISE_LIMIAR = float(os.getenv('PRE_ANALISE_LIMIAR', 0.8))
+# Conjuntos com menos jogos do que isto não permitem concluir nada.
+PRE_ANALISE_MIN_JOGOS = int(os.getenv('PRE_ANALISE_MIN_JOGOS', 3))
+# Sem nenhum candidato a análise é escrita a partir de um modelo, sem chamar a IA.
+PRE_ANALISE_SALTAR_IA = os.getenv('PRE_ANALISE_SALTAR_IA', '1').lower() in ['true', 'on', '1']
+
+SEM_MERCADO = "Sem mercado recomendado"
+
+CONJUNTOS = ('mandante', 'visitante', 'h2h')
+CATEGORIAS_HISTORICO = {'mandante': 'ultimos_jogos_mandante', 'visitante': 'ultimos_jogos_visitante', 'h2h': 'confrontos_diretos'}
+
+# Linhas avaliadas por mercado e limites da sugestão com margem de segurança (uma linha abaixo no Over,
+# uma acima no Under). Over 0.5 nunca é sugerido.
+MERCADOS_TOTAIS = {
+    'gols': {'nome': "Gols", 'linhas': np.arange(0.5, 5.0, 1.0), 'over_minimo': 1.5, 'under_maximo': 4.5},
+    'escanteios': {'nome': "Escanteios", 'linhas': np.arange(4.5, 14.0, 1.0), 'over_minimo': 5.5, 'under_maximo': 13.5},
+    'cartoes': {'nome': "Cartões", 'linhas': np.arange(0.5, 8.0, 1.0), 'over_minimo': 1.5, 'under_maximo': 7.5},
+}
+MARGEM_SEGURANCA = 1.0
+
+
+def _matriz(series):
+    """Empilha séries de tamanhos diferentes numa matriz conjuntos x jogos, preenchida com NaN."""
+    largura = max((len(serie) for serie in series), default=0)
+    matriz = np.full((len(series), largura), np.nan)
+    for i, serie in enumerate(series):
+        matriz[i, :len(serie)] = serie
+    return matriz
+
+
+def _taxas(matriz, linhas):
+    """Fração de jogos acima e abaixo de cada linha, por conjunto (duas matrizes conjuntos x linhas)."""
+    validos = ~np.isnan(matriz)
+    jogos = validos.sum(axis=1)[:, None]
+    valores = np.where(validos, matriz, 0.0)[:, :, None]
+    validos = validos[:, :, None]
+    acima = ((valores > linhas) & validos).sum(axis=1) / jogos
+    abaixo = ((valores < linhas) & validos).sum(axis=1) / jogos
+    return acima, abaixo, jogos[:, 0]
+
+
+def _evidencia(taxas, jogos, linha, sentido):
+    contagens = ", ".join(f"{conjunto} {round(taxa * n)}/{n}" for conjunto, taxa, n in zip(CONJUNTOS, taxas, jogos))
+    return f"{sentido} de {linha:g}: {contagens}"
+
+
+def _mercados_de_totais(tipo, series, limiar):
+    """PASSOS 1 e 3: Over/Under só quando a tendência se repete nos três conjuntos (mandante, visitante, H2H)."""
+    if any(len(serie) < PRE_ANALISE_MIN_JOGOS for serie in series):
+        return []
+    config = MERCADOS_TOTAIS[tipo]
+    linhas = config['linhas']
+    acima, abaixo, jogos = _taxas(_matriz(series), linhas)
+    candidatos = []
+
+    consistente = np.flatnonzero(acima.min(axis=0) >= limiar)
+    if consistente.size:
+        linha = max(linhas[consistente.max()] - MARGEM_SEGURANCA, config['over_minimo'])
+        if linha <= linhas[consistente.max()]:
+            i = int(np.flatnonzero(linhas == linha)[0])
+            candidatos.append({
+                'mercado': f"Mais de {linha:g} {config['nome']}", 'tipo': tipo,
+                'evidencia': _evidencia(acima[:, i], jogos, linha, "Acima"),
+                'confianca': round(float(acima[:, i].min()), 2),
+            })
+
+    consistente = np.flatnonzero(abaixo.min(axis=0) >= limiar)
+    if consistente.size:
+        linha = min(linhas[consistente.min()] + MARGEM_SEGURANCA, config['under_maximo'])
+        i = int(np.flatnonzero(linhas == linha)[0])
+        candidatos.append({
+            'mercado': f"Menos de {linha:g} {config['nome']}", 'tipo': tipo,
+            'evidencia': _evidencia(abaixo[:, i], jogos, linha, "Abaixo"),
+            'confianca': round(float(abaixo[:, i].min()), 2),
+        })
+    return candidatos
+
+
+def _gols(jogos, nome_time):
+    """Gols marcados e sofridos por `nome_time` em cada jogo (jogos em que não participa são ignorados)."""
+    em_casa = np.array([jogo['mandante_nome'] == nome_time for jogo in jogos], dtype=bool)
+    fora = np.array([jogo['visitante_nome'] == nome_time for jogo in jogos], dtype=bool)
+    gols_mandante = np.array([jogo['mandante_gols'] for jogo in jogos], dtype=float)
+    gols_visitante = np.array([jogo['visitante_gols'] for jogo in jogos], dtype=float)
+    participa = em_casa | fora
+    marcados = np.where(em_casa, gols_mandante, gols_visitante)[participa]
+    sofridos = np.where(em_casa, gols_visitante, gols_mandante)[participa]
+    return marcados, sofridos
+
+
+def _saldos(jogos, nome_time):
+    marcados, sofridos = _gols(jogos, nome_time)
+    return marcados - sofridos
+
+
+def _mercados_de_vencedor(partida, confrontos, limiar):
+    """PASSO 2: vencedor, dupla chance ou handicap, apenas com base no H2H."""
+    saldo = _saldos(confrontos, partida['mandante_nome'])
+    n = len(saldo)
+    if n < PRE_ANALISE_MIN_JOGOS:
+        return []
+
+    candidatos = []
+    for time, saldo_time in ((partida['mandante_nome'], saldo), (partida['visitante_nome'], -saldo)):
+        vitorias = int((saldo_time > 0).sum())
+        empates = int((saldo_time == 0).sum())
+        if vitorias >= 4 and vitorias / n >= limiar:
+            candidatos.append({'mercado': f"Vitória do {time}", 'tipo': 'vencedor',
+                               'evidencia': f"H2H: {vitorias} vitórias de {time} em {n} jogos",
+                               'confianca': round(vitorias / n, 2)})
+        elif (vitorias + empates) / n >= limiar:
+            candidatos.append({'mercado': f"Dupla Chance: {time} ou Empate", 'tipo': 'vencedor',
+                               'evidencia': f"H2H: {vitorias} vitórias e {empates} empates de {time} em {n} jogos",
+                               'confianca': round((vitorias + empates) / n, 2)})
+    if candidatos:
+        return candidatos
+
+    # H2H equilibrado: handicap positivo para a equipa que perde mais vezes, se perder por pouco.
+    derrotas, time, saldo_time = max((int((saldo < 0).sum()), partida['mandante_nome'], saldo),
+                                     (int((saldo > 0).sum()), partida['visitante_nome'], -saldo),
+                                     key=lambda opcao: opcao[0])
+    if not derrotas:
+        return []
+    for handicap in (1.5, 2.5):
+        cobertos = int((saldo_time > -handicap).sum())
+        if cobertos / n >= limiar:
+            return [{'mercado': f"Handicap +{handicap:g} {time}", 'tipo': 'handicap',
+                     'evidencia': f"H2H: {time} perdeu {derrotas} de {n} jogos, {cobertos} dentro de +{handicap:g}",
+                     'confianca': round(cobertos / n, 2)}]
+    return []
+
+
+def calcular_candidatos(partida, dados_brutos, totais_por_conjunto, limiar=PRE_ANALISE_LIMIAR):
+    """Mercados candidatos da partida, do mais para o menos confiante.
+
+    `dados_brutos` é o histórico processado em analysis_logic; `totais_por_conjunto` tem, para mandante,
+    visitante e h2h, os totais de escanteios e cartões por jogo (football_api.buscar_totais_jogos).
+    """
+    historicos = [dados_brutos[CATEGORIAS_HISTORICO[conjunto]]['jogos'] for conjunto in CONJUNTOS]
+    candidatos = _mercados_de_totais('gols', [[jogo['total_gols'] for jogo in jogos] for jogos in historicos], limiar)
+    candidatos += _mercados_de_vencedor(partida, historicos[2], limiar)
+    candidatos += _mercados_de_totais('escanteios', [totais_por_conjunto[conjunto]['corners'] for conjunto in CONJUNTOS], limiar)
+    candidatos += _mercados_de_totais('cartoes', [totais_por_conjunto[conjunto]['cards'] for conjunto in CONJUNTOS], limiar)
+    return sorted(candidatos, key=lambda candidato: candidato['confianca'], reverse=True)
+
+
+def _desempenho(jogos, nome_time):
+    marcados, sofridos = _gols(jogos, nome_time)
+    if not len(marcados):
+        return {"forma": "Sem jogos recentes disponíveis.", "ponto_forte": "-", "ponto_fraco": "-"}
+    saldo = marcados - sofridos
+    return {
+        "forma": (f"{int((saldo > 0).sum())}V {int((saldo == 0).sum())}E {int((saldo < 0).sum())}D nos últimos "
+                  f"{len(saldo)} jogos, com média de {(marcados + sofridos).mean():.1f} gols por jogo."),
+        "ponto_forte": f"Marca em média {marcados.mean():.1f} gols por jogo.",
+        "ponto_fraco": f"Sofre em média {sofridos.mean():.1f} gols por jogo.",
+    }
+
+
+def analise_sem_sinal(partida, dados_brutos):
+    """Análise completa (mesma estrutura da resposta da IA) para partidas sem nenhum mercado consistente."""
+    confrontos = dados_brutos['confrontos_diretos']['jogos']
+    if confrontos:
+        saldo = _saldos(confrontos, partida['mandante_nome'])
+        media = np.mean([jogo['total_gols'] for jogo in confrontos])
+        confronto_direto = (f"{int((saldo > 0).sum())} vitórias do {partida['mandante_nome']}, {int((saldo == 0).sum())} empates "
+                            f"e {int((saldo < 0).sum())} vitórias do {partida['visitante_nome']} nos últimos {len(confrontos)} "
+                            f"confrontos, com média de {media:.1f} gols por jogo.")
+    else:
+        confronto_direto = "Sem confrontos diretos recentes."
+    justificativa = ("Nenhuma tendência de gols, vencedor, escanteios ou cartões se repete de forma consistente entre a "
+                     "forma recente das equipas e o confronto direto; não há mercado com margem de segurança suficiente.")
+    return {
+        "mercado_principal": SEM_MERCADO,
+        "analise_detalhada": {
+            "desempenho_mandante": _desempenho(dados_brutos['ultimos_jogos_mandante']['jogos'], partida['mandante_nome']),
+            "desempenho_visitante": _desempenho(dados_brutos['ultimos_jogos_visitante']['jogos'], partida['visitante_nome']),
+            "confronto_direto": confronto_direto,
+            "informacoes_relevantes": justificativa,
+            "mercados_favoraveis": [],
+            "cenario_provavel": {"mercado": SEM_MERCADO, "justificativa": justificativa},
+        }
+    }
@@ -0,0 +1,121 @@
+# app/services/pregeracao.py
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import pytz
+from flask import current_app
+from app import redis_client
+from .analysis_logic import LIGAS_SELECIONADAS, analisar_partida, listar_jogos_por_liga
+from .concorrencia import com_contexto_da_app
+from .arquivo import garantir_particoes
+
+PREGERACAO_WORKERS = int(os.getenv('PREGERACAO_WORKERS', 4))
+PREGERACAO_TENTATIVAS = int(os.getenv('PREGERACAO_TENTATIVAS', 3))
+PREGERACAO_ESPERA_ENTRE_TENTATIVAS = float(os.getenv('PREGERACAO_ESPERA_ENTRE_TENTATIVAS', 30))
+
+
+def data_de_amanha():
+    """Data de amanhã no fuso de São Paulo, no formato 'YYYY-MM-DD'."""
+    hoje = datetime.now(pytz.timezone("America/Sao_Paulo")).date()
+    return (hoje + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def descobrir_partidas(data_para_buscar):
+    """Lista todas as partidas da data (hora de São Paulo) em todas as ligas selecionadas."""
+    data_selecionada_obj = datetime.strptime(data_para_buscar, '%Y-%m-%d').date()
+    data_seguinte_str = (data_selecionada_obj + timedelta(days=1)).strftime('%Y-%m-%d')
+    jogos_por_liga = listar_jogos_por_liga(data_para_buscar, data_seguinte_str, data_selecionada_obj, LIGAS_SELECIONADAS)
+    return [jogo for liga_dados in LIGAS_SELECIONADAS.values() for jogo in jogos_por_liga.get(liga_dados['id'], [])]
+
+
+def _chave_progresso(data_para_buscar):
+    return f"pregeracao:{data_para_buscar}"
+
+
+def registrar_progresso(data_para_buscar, **campos):
+    """Guarda o estado da pré-geração da data no Redis (expira após uma semana)."""
+    campos['atualizado_em'] = datetime.utcnow().isoformat()
+    chave = _chave_progresso(data_para_buscar)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hset(chave, mapping={campo: str(valor) for campo, valor in campos.items()})
+        pipe.expire(chave, 7 * 86400)
+        pipe.execute()
+    except Exception as e:
+        current_app.logger.warning(f"Não foi possível registar o progresso da pré-geração de {data_para_buscar}: {e}")
+
+
+def obter_progresso(data_para_buscar):
+    return redis_client.hgetall(_chave_progresso(data_para_buscar))
+
+
+def _analisar_com_tentativas(partida, analysis_date, tentativas, espera):
+    """Executa analisar_partida repetindo quando o resultado vem com erro."""
+    resultado = None
+    for tentativa in range(1, tentativas + 1):
+        try:
+            resultado = analisar_partida(partida, analysis_date)
+        except Exception as e:
+            current_app.logger.error(f"Pré-geração: exceção ao analisar o jogo {partida['id']} (tentativa {tentativa}): {e}", exc_info=True)
+            resultado = {"error": True}
+        if not resultado.get('error'):
+            return resultado
+        if tentativa < tentativas:
+            time.sleep(espera * tentativa)
+    return resultado
+
+
+def pregerar_analises(data_para_buscar=None, workers=PREGERACAO_WORKERS, tentativas=PREGERACAO_TENTATIVAS,
+                      espera=PREGERACAO_ESPERA_ENTRE_TENTATIVAS):
+    """Gera antecipadamente as análises de todas as partidas de uma data (por omissão, amanhã).
+
+    As partidas são analisadas num pool limitado; cada uma é repetida até `tentativas` vezes.
+    Depois de concluída, os pedidos dos utilizadores para essa data são apenas leituras na base de dados.
+    """
+    data_para_buscar = data_para_buscar or data_de_amanha()
+    analysis_date = datetime.strptime(data_para_buscar, '%Y-%m-%d').date()
+    partidas = descobrir_partidas(data_para_buscar)
+    total = len(partidas)
+    current_app.logger.info(f"Pré-geração: {total} partidas encontradas para {data_para_buscar}.")
+    registrar_progresso(data_para_buscar, estado='em_andamento', total=total, concluidas=0, falhas=0,
+                        iniciado_em=datetime.utcnow().isoformat())
+
+    concluidas = 0
+    falhas = []
+    if partidas:
+        tarefa = com_contexto_da_app(_analisar_com_tentativas)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futuros = {executor.submit(tarefa, partida, analysis_date, tentativas, espera): partida for partida in partidas}
+            for futuro in as_completed(futuros):
+                partida = futuros[futuro]
+                if futuro.result().get('error'):
+                    falhas.append(partida['id'])
+                    current_app.logger.error(f"Pré-geração: falha definitiva no jogo {partida['id']} ({partida['mandante_nome']} vs {partida['visitante_nome']}).")
+                else:
+                    concluidas += 1
+                registrar_progresso(data_para_buscar, concluidas=concluidas, falhas=len(falhas))
+
+    registrar_progresso(data_para_buscar, estado='concluido' if not falhas else 'concluido_com_falhas',
+                        concluidas=concluidas, falhas=len(falhas), jogos_com_falha=','.join(map(str, falhas)))
+    current_app.logger.info(f"Pré-geração de {data_para_buscar} terminada: {concluidas}/{total} análises, {len(falhas)} falhas.")
+    return {'data': data_para_buscar, 'total': total, 'concluidas': concluidas, 'falhas': falhas}
+
+
+def executar_agendador(hora_execucao, workers=PREGERACAO_WORKERS, tentativas=PREGERACAO_TENTATIVAS):
+    """Worker de longa duração: todos os dias, à hora indicada (São Paulo), pré-gera as análises de amanhã."""
+    sao_paulo_tz = pytz.timezone("America/Sao_Paulo")
+    hora, minuto = (int(parte) for parte in hora_execucao.split(':'))
+    while True:
+        agora = datetime.now(sao_paulo_tz)
+        proxima = agora.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+        if proxima <= agora:
+            proxima += timedelta(days=1)
+        current_app.logger.info(f"Agendador de pré-geração: próxima execução em {proxima.isoformat()}.")
+        time.sleep((proxima - agora).total_seconds())
+        try:
+            # As partições dos próximos meses são criadas antes de serem precisas (ver services/arquivo.py).
+            garantir_particoes()
+            pregerar_analises(workers=workers, tentativas=tentativas)
+        except Exception as e:
+            current_app.logger.error(f"Agendador de pré-geração: execução falhou: {e}", exc_info=True)
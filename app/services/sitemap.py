@@ -0,0 +1,159 @@
+# app/services/sitemap.py
+import os
+from datetime import datetime
+from itertools import chain
+from flask import render_template, stream_template, url_for, current_app
+from sqlalchemy import select, func, union_all
+from app import db, cache
+from app.models import Analysis, AnalysisArquivo
+
+# Número máximo de análises por sitemap filho (o protocolo permite até 50.000 URLs por ficheiro).
+SITEMAP_TAMANHO_PAGINA = int(os.getenv('SITEMAP_TAMANHO_PAGINA', 10000))
+SITEMAP_CACHE_TIMEOUT = int(os.getenv('SITEMAP_CACHE_TIMEOUT', 7 * 86400))
+# O índice não é apagado a cada análise gravada (só quando começa uma faixa nova); esta validade
+# limita o atraso do lastmod da última página.
+SITEMAP_INDICE_TIMEOUT = int(os.getenv('SITEMAP_INDICE_TIMEOUT', 3600))
+
+CHAVE_INDICE = "sitemap:indice"
+# Última página listada no índice em cache.
+CHAVE_ULTIMA_PAGINA = "sitemap:ultima_pagina"
+CHAVE_PAGINAS = "sitemap:paginas"
+# Tamanho aproximado (caracteres) de cada bloco enviado ao cliente quando um sitemap filho é transmitido.
+SITEMAP_TAMANHO_BLOCO = 64 * 1024
+
+
+def _chave_analises(pagina):
+    return f"sitemap:analises:{pagina}"
+
+
+def pagina_do_id(analysis_id):
+    """As páginas são faixas fixas de IDs, por isso uma página antiga nunca muda quando chegam análises novas."""
+    return (analysis_id - 1) // SITEMAP_TAMANHO_PAGINA + 1
+
+
+def _todas_as_analises():
+    """IDs e datas de geração das análises da tabela quente e do arquivo: as arquivadas continuam publicadas
+    (analysis_detail encontra-as pelo mesmo ID) e, por isso, continuam no sitemap."""
+    return union_all(
+        select(Analysis.id, Analysis.generated_at),
+        select(AnalysisArquivo.id, AnalysisArquivo.generated_at)
+    ).subquery()
+
+
+def invalidar_sitemap(*analysis_ids):
+    """Chamado quando análises são gravadas ou arquivadas: apaga as páginas desses IDs.
+
+    O índice só é apagado quando algum ID cai numa página que ele ainda não lista.
+    """
+    paginas = {pagina_do_id(analysis_id) for analysis_id in analysis_ids}
+    chaves = [_chave_analises(pagina) for pagina in paginas]
+    try:
+        ultima_pagina = cache.get(CHAVE_ULTIMA_PAGINA)
+        if ultima_pagina is None or max(paginas, default=0) > ultima_pagina:
+            chaves.append(CHAVE_INDICE)
+        cache.delete_many(*chaves)
+    except Exception as e:
+        current_app.logger.warning(f"Não foi possível invalidar o sitemap das análises {analysis_ids}: {e}")
+
+
+def gerar_indice():
+    """Sitemap index com o sitemap das páginas estáticas e um sitemap filho por faixa de IDs de análises."""
+    indice = cache.get(CHAVE_INDICE)
+    if indice is not None:
+        return indice
+
+    analises = _todas_as_analises()
+    pagina = ((analises.c.id - 1) // SITEMAP_TAMANHO_PAGINA + 1).label('pagina')
+    faixas = db.session.execute(
+        select(pagina, func.max(analises.c.generated_at)).group_by(pagina).order_by(pagina)
+    ).all()
+
+    sitemaps = [{'loc': url_for('main.sitemap_paginas', _external=True), 'lastmod': datetime.now().strftime('%Y-%m-%d')}]
+    for numero, lastmod in faixas:
+        sitemaps.append({
+            'loc': url_for('main.sitemap_analises', pagina=int(numero), _external=True),
+            'lastmod': lastmod.strftime('%Y-%m-%d')
+        })
+
+    indice = render_template('sitemap_index_template.xml', sitemaps=sitemaps)
+    cache.set(CHAVE_INDICE, indice, timeout=SITEMAP_INDICE_TIMEOUT)
+    cache.set(CHAVE_ULTIMA_PAGINA, int(faixas[-1][0]) if faixas else 0, timeout=SITEMAP_INDICE_TIMEOUT)
+    return indice
+
+
+def gerar_sitemap_paginas():
+    """Sitemap das páginas estáticas do site (renovado diariamente por causa do lastmod)."""
+    sitemap_xml = cache.get(CHAVE_PAGINAS)
+    if sitemap_xml is not None:
+        return sitemap_xml
+
+    lastmod = datetime.now().strftime('%Y-%m-%d')
+    static_urls = [
+        url_for('main.index', _external=True),
+        url_for('main.futebol', _external=True),
+        url_for('main.plans', _external=True),
+        url_for('main.terms', _external=True),
+        url_for('main.privacy', _external=True),
+        url_for('main.contact', _external=True),
+    ]
+    pages = [{'loc': url, 'lastmod': lastmod, 'changefreq': 'daily', 'priority': '0.8'} for url in static_urls]
+
+    sitemap_xml = render_template('sitemap_template.xml', pages=pages)
+    cache.set(CHAVE_PAGINAS, sitemap_xml, timeout=86400)
+    return sitemap_xml
+
+
+def _paginas_de_analises(pagina):
+    """Percorre a faixa de IDs (tabela quente e arquivo) com um cursor do lado do servidor, lendo apenas id e generated_at."""
+    primeiro_id = (pagina - 1) * SITEMAP_TAMANHO_PAGINA + 1
+    ultimo_id = pagina * SITEMAP_TAMANHO_PAGINA
+    analises = _todas_as_analises()
+    linhas = db.session.execute(
+        select(analises.c.id, analises.c.generated_at)
+        .where(analises.c.id.between(primeiro_id, ultimo_id))
+        .order_by(analises.c.id)
+        .execution_options(yield_per=1000)
+    )
+    for analysis_id, generated_at in linhas:
+        yield {
+            'loc': url_for('main.analysis_detail', analysis_id=analysis_id, _external=True),
+            'lastmod': generated_at.strftime('%Y-%m-%d'),
+            'changefreq': 'weekly',
+            'priority': '1.0'
+        }
+
+
+def _transmitir_e_guardar(pagina, partes):
+    """Envia o XML em blocos à medida que é renderizado e, no fim, guarda-o inteiro em cache."""
+    gerado = []
+    bloco = []
+    tamanho = 0
+    for parte in partes:
+        bloco.append(parte)
+        tamanho += len(parte)
+        if tamanho >= SITEMAP_TAMANHO_BLOCO:
+            gerado.append("".join(bloco))
+            yield gerado[-1]
+            bloco, tamanho = [], 0
+    gerado.append("".join(bloco))
+    yield gerado[-1]
+    cache.set(_chave_analises(pagina), "".join(gerado), timeout=SITEMAP_CACHE_TIMEOUT)
+
+
+def gerar_sitemap_analises(pagina):
+    """Sitemap filho de uma faixa de IDs de análises, guardado em cache até chegar uma análise nessa faixa.
+
+    Devolve o XML em cache (str), um gerador que o transmite enquanto lê as linhas (e o guarda em cache no
+    fim; tem de correr com stream_with_context), ou None se a faixa não tiver análises.
+    """
+    sitemap_xml = cache.get(_chave_analises(pagina))
+    if sitemap_xml is not None:
+        return sitemap_xml
+
+    current_app.logger.info(f"Gerando o sitemap de análises da página {pagina}.")
+    paginas = _paginas_de_analises(pagina)
+    # Só a primeira linha é lida antes de responder: decide entre 404 e o stream.
+    primeira = next(paginas, None)
+    if primeira is None:
+        return None
+    return _transmitir_e_guardar(pagina, stream_template('sitemap_template.xml', pages=chain([primeira], paginas)))
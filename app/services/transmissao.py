@@ -0,0 +1,196 @@
+# app/services/transmissao.py
+import json
+import os
+import threading
+import time
+import redis
+from flask import current_app
+from app import db, redis_client
+from .analysis_logic import gerar_analises, ProjecaoPlano
+
+# Tempo (segundos) que o log de eventos de uma geração fica disponível para retomar o stream.
+SSE_LOG_TIMEOUT = int(os.getenv('SSE_LOG_TIMEOUT', 3600))
+SSE_LOG_TIMEOUT_CONCLUIDO = int(os.getenv('SSE_LOG_TIMEOUT_CONCLUIDO', 600))
+# Validade do lock da geração em segundo plano. Uma thread de heartbeat renova-o a cada
+# GERACAO_LOCK_RENOVACAO segundos, independentemente do tempo que cada evento demora a ser produzido.
+GERACAO_LOCK_TIMEOUT = int(os.getenv('GERACAO_LOCK_TIMEOUT', 300))
+GERACAO_LOCK_RENOVACAO = float(os.getenv('GERACAO_LOCK_RENOVACAO', GERACAO_LOCK_TIMEOUT / 3))
+SSE_INTERVALO_POLL = float(os.getenv('SSE_INTERVALO_POLL', 0.5))
+SSE_KEEP_ALIVE = float(os.getenv('SSE_KEEP_ALIVE', 15))
+SSE_RETRY_MS = int(os.getenv('SSE_RETRY_MS', 3000))
+
+# Acrescenta um evento ao log só se o lock da geração ainda pertencer a quem escreve (mesmo token). Uma geração
+# que perdeu o lock não pode escrever no log de outra que entretanto o descartou e recomeçou.
+LUA_ACRESCENTAR_EVENTO = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('RPUSH', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[3]))
+return 1
+"""
+
+
+def _chave_log(data_para_buscar):
+    return f"eventos_sse:{data_para_buscar}"
+
+
+def _lock_geracao(data_para_buscar):
+    # thread_local=False: o lock é adquirido no pedido e libertado pela thread de geração.
+    return redis_client.lock(f"lock:geracao_sse:{data_para_buscar}", timeout=GERACAO_LOCK_TIMEOUT, thread_local=False)
+
+
+def _evento_final(payload):
+    return json.loads(payload).get('status') in ('done', 'error')
+
+
+def _evento_provisorio(evento):
+    return evento.get('status') == 'provisional'
+
+
+def formatar_evento_sse(event_id, payload):
+    # Cards provisórios vão sem id: não contam para o Last-Event-ID, que assim só avança com eventos
+    # definitivos e continua válido mesmo que uma nova geração produza outros (ou nenhum) provisórios.
+    if event_id is None:
+        return f"data: {payload}\n\n"
+    return f"id: {event_id}\ndata: {payload}\n\n"
+
+
+def formatar_eventos_sse(payloads, user_tier, ultimo_id=0):
+    """Enquadra em SSE os eventos visíveis para o plano, com IDs estáveis (posição 1..n no stream completo),
+    a partir do evento seguinte a `ultimo_id`. Os snapshots não contêm cards provisórios."""
+    projecao = ProjecaoPlano(user_tier)
+    return "".join(formatar_evento_sse(indice, payload)
+                   for indice, payload in enumerate(payloads, start=1)
+                   if projecao.visivel(json.loads(payload)) and indice > ultimo_id)
+
+
+class GeracaoSemLock(Exception):
+    """A geração perdeu o lock (expirou ou foi tomado por outra geração) e tem de parar."""
+
+
+def _acrescentar_evento(lock, chave_log, payload):
+    """Grava o evento no log se a geração ainda for dona do lock; caso contrário levanta GeracaoSemLock."""
+    timeout = SSE_LOG_TIMEOUT_CONCLUIDO if _evento_final(payload) else SSE_LOG_TIMEOUT
+    acrescentar = redis_client.register_script(LUA_ACRESCENTAR_EVENTO)
+    if not acrescentar(keys=[lock.name, chave_log], args=[lock.local.token, payload, timeout]):
+        raise GeracaoSemLock(f"lock {lock.name} perdido")
+
+
+def _renovar_lock(lock, parar):
+    """Heartbeat: renova o lock até `parar` ser sinalizado ou o lock deixar de pertencer à geração."""
+    while not parar.wait(GERACAO_LOCK_RENOVACAO):
+        try:
+            lock.reacquire()
+        except redis.exceptions.LockError:
+            return
+        except redis.exceptions.RedisError:
+            # Falha transitória: tenta de novo no próximo ciclo, ainda dentro da validade do lock.
+            continue
+
+
+def _executar_geracao(app, data_para_buscar, lock):
+    """Corre gerar_analises até ao fim, gravando cada evento no log do Redis, independentemente dos clientes ligados."""
+    chave_log = _chave_log(data_para_buscar)
+    parar = threading.Event()
+    threading.Thread(target=_renovar_lock, args=(lock, parar), daemon=True).start()
+    with app.app_context():
+        try:
+            for payload in gerar_analises(data_para_buscar):
+                _acrescentar_evento(lock, chave_log, payload)
+        except GeracaoSemLock:
+            # Outra geração já descartou este log e recomeçou; não escrevemos mais nada nele.
+            current_app.logger.warning(f"Geração em segundo plano de {data_para_buscar} perdeu o lock; interrompida.")
+        except Exception as e:
+            current_app.logger.error(f"Erro na geração em segundo plano de {data_para_buscar}: {e}", exc_info=True)
+            try:
+                _acrescentar_evento(lock, chave_log, json.dumps({'status': 'error', 'message': str(e)}))
+            except (GeracaoSemLock, redis.exceptions.RedisError):
+                pass
+        finally:
+            parar.set()
+            try:
+                lock.release()
+            except redis.exceptions.LockError:
+                pass
+
+
+def iniciar_geracao(data_para_buscar, descartar_log=False):
+    """Arranca a geração em segundo plano da data se nenhuma estiver em curso. Devolve True se arrancou."""
+    lock = _lock_geracao(data_para_buscar)
+    if not lock.acquire(blocking=False):
+        return False
+    if descartar_log:
+        redis_client.delete(_chave_log(data_para_buscar))
+    app = current_app._get_current_object()
+    threading.Thread(target=_executar_geracao, args=(app, data_para_buscar, lock), daemon=True).start()
+    current_app.logger.info(f"Geração em segundo plano iniciada para {data_para_buscar}.")
+    return True
+
+
+def _geracao_em_curso(data_para_buscar):
+    return _lock_geracao(data_para_buscar).locked()
+
+
+def transmitir_eventos(data_para_buscar, user_tier, ultimo_id=0):
+    """Transmite em SSE o log de eventos da data, projetado para o plano, retomando após `ultimo_id` (Last-Event-ID).
+
+    Existe uma única geração por data (plano membro), que corre numa thread própria e continua mesmo que o
+    cliente desligue; todas as ligações, de qualquer plano, partilham-na. O stream só espera no Redis
+    (time.sleep), por isso é cooperativo num worker gevent (ver gunicorn.conf.py). Uma nova ligação (sem
+    Last-Event-ID) sobre um log já terminado volta a gerar, para repetir as partidas que falharam.
+    """
+    chave_log = _chave_log(data_para_buscar)
+    # A ligação fica aberta durante minutos só a ler do Redis: devolve já a conexão da base de dados
+    # (usada para carregar o utilizador) ao pool, para que centenas de streams não o esgotem.
+    db.session.close()
+
+    if ultimo_id == 0 and redis_client.exists(chave_log) and not _geracao_em_curso(data_para_buscar):
+        iniciar_geracao(data_para_buscar, descartar_log=True)
+    elif not redis_client.exists(chave_log):
+        iniciar_geracao(data_para_buscar)
+
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+
+    # A projeção depende da liga corrente, por isso o log é sempre lido desde o início;
+    # os eventos até `ultimo_id` só atualizam o estado e não são reenviados. Os IDs contam apenas os
+    # eventos definitivos (posição no stream sem provisórios, igual à do snapshot).
+    projecao = ProjecaoPlano(user_tier)
+    lidos = 0
+    definitivos = 0
+    enviado_id = ultimo_id
+    ultimo_envio = time.monotonic()
+    while True:
+        novos = redis_client.lrange(chave_log, lidos, -1)
+        for payload in novos:
+            lidos += 1
+            evento = json.loads(payload)
+            provisorio = _evento_provisorio(evento)
+            if not provisorio:
+                definitivos += 1
+            if projecao.visivel(evento) and definitivos >= ultimo_id and (provisorio or definitivos > ultimo_id):
+                yield formatar_evento_sse(None if provisorio else definitivos, payload)
+                ultimo_envio = time.monotonic()
+                if not provisorio:
+                    enviado_id = definitivos
+            if evento.get('status') in ('done', 'error'):
+                return
+
+        if novos:
+            continue
+
+        if not _geracao_em_curso(data_para_buscar) and redis_client.llen(chave_log) <= lidos:
+            # A geração morreu (ex.: worker reiniciado) ou o log expirou: recomeça. O novo log pode ter outros
+            # (ou nenhuns) cards provisórios, por isso as posições na lista mudam; só a ordem dos eventos
+            # definitivos é determinística. A leitura recomeça do início e salta os definitivos já enviados,
+            # tal como na retoma por Last-Event-ID.
+            iniciar_geracao(data_para_buscar, descartar_log=True)
+            projecao = ProjecaoPlano(user_tier)
+            lidos = 0
+            definitivos = 0
+            ultimo_id = enviado_id
+
+        if time.monotonic() - ultimo_envio >= SSE_KEEP_ALIVE:
+            ultimo_envio = time.monotonic()
+            yield ": keep-alive\n\n"
+        time.sleep(SSE_INTERVALO_POLL)
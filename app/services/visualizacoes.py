@@ -0,0 +1,167 @@
+# app/services/visualizacoes.py
+import json
+import os
+import threading
+import time
+from datetime import date
+import redis
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+from app import db, redis_client
+from app.models import DailyUserView
+
+# Número de análises diferentes que um utilizador do plano gratuito pode abrir por dia.
+LIMITE_VISUALIZACOES_GRATUITAS = int(os.getenv('LIMITE_VISUALIZACOES_GRATUITAS', 3))
+# Intervalo (segundos) e tamanho dos lotes com que as visualizações novas são gravadas no Postgres.
+VISUALIZACOES_INTERVALO_ESCRITA = float(os.getenv('VISUALIZACOES_INTERVALO_ESCRITA', 5))
+VISUALIZACOES_LOTE = int(os.getenv('VISUALIZACOES_LOTE', 500))
+# O conjunto de um dia só é preciso durante esse dia; a margem cobre diferenças de fuso entre workers.
+VISUALIZACOES_TIMEOUT = 2 * 86400
+
+CHAVE_PENDENTES = "visualizacoes:pendentes"
+# Membro sentinela: distingue um conjunto já carregado da base de dados (ainda que sem visualizações)
+# de um conjunto que não existe no Redis.
+SENTINELA = "-"
+
+# Check-and-add atómico. Devolve {estado, total}: estado 1 = já vista hoje, 2 = nova visualização
+# registada, 0 = limite atingido, -1 = conjunto ausente (tem de ser carregado da base de dados).
+LUA_REGISTAR = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {-1, 0}
+end
+local total = redis.call('SCARD', KEYS[1]) - 1
+if redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 1 then
+    return {1, total}
+end
+if total >= tonumber(ARGV[2]) then
+    return {0, total}
+end
+redis.call('SADD', KEYS[1], ARGV[1])
+redis.call('RPUSH', KEYS[2], ARGV[3])
+return {2, total + 1}
+"""
+
+
+def _chave_dia(user_id, dia):
+    return f"visualizacoes:{user_id}:{dia.isoformat()}"
+
+
+class MedidorVisualizacoes:
+    """Contagem diária das análises abertas por utilizadores do plano gratuito, mantida no Redis.
+
+    A verificação da quota é um único script atómico (correto com vários separadores abertos em
+    simultâneo). As visualizações novas entram numa fila no Redis e são gravadas em DailyUserView
+    em lotes por uma thread de cada worker; a base de dados continua a ser a fonte de verdade
+    quando o conjunto do dia ainda não está no Redis.
+    """
+
+    def __init__(self, limite, intervalo_escrita, tamanho_lote):
+        self.limite = limite
+        self.intervalo_escrita = intervalo_escrita
+        self.tamanho_lote = tamanho_lote
+        self._script = None
+        self._escritor_pid = None
+        self._lock = threading.Lock()
+
+    def _carregar_do_banco(self, user_id, dia):
+        ids = [view.analysis_id for view in
+               DailyUserView.query.filter_by(user_id=user_id, view_date=dia).with_entities(DailyUserView.analysis_id)]
+        chave = _chave_dia(user_id, dia)
+        pipe = redis_client.pipeline()
+        pipe.sadd(chave, SENTINELA, *ids)
+        pipe.expire(chave, VISUALIZACOES_TIMEOUT)
+        pipe.execute()
+
+    def registar(self, user_id, analysis_id):
+        """Regista a visualização se a quota o permitir. Devolve True se o utilizador pode ver a análise."""
+        dia = date.today()
+        chave = _chave_dia(user_id, dia)
+        pendente = json.dumps({'user_id': user_id, 'analysis_id': analysis_id, 'view_date': dia.isoformat()})
+        try:
+            if self._script is None:
+                self._script = redis_client.register_script(LUA_REGISTAR)
+            estado, _ = self._script(keys=[chave, CHAVE_PENDENTES], args=[analysis_id, self.limite, pendente])
+            if estado == -1:
+                self._carregar_do_banco(user_id, dia)
+                estado, _ = self._script(keys=[chave, CHAVE_PENDENTES], args=[analysis_id, self.limite, pendente])
+        except redis.exceptions.RedisError as e:
+            current_app.logger.warning(f"Medidor de visualizações indisponível, a usar a base de dados: {e}")
+            return self._registar_no_banco(user_id, analysis_id, dia)
+
+        if estado == 2:
+            self._garantir_escritor()
+        return estado != 0
+
+    def contar(self, user_id):
+        """Número de análises diferentes vistas hoje pelo utilizador."""
+        dia = date.today()
+        chave = _chave_dia(user_id, dia)
+        try:
+            total = redis_client.scard(chave)
+            if total == 0:
+                self._carregar_do_banco(user_id, dia)
+                total = redis_client.scard(chave)
+            return total - 1
+        except redis.exceptions.RedisError as e:
+            current_app.logger.warning(f"Medidor de visualizações indisponível, a usar a base de dados: {e}")
+            return DailyUserView.query.filter_by(user_id=user_id, view_date=dia).count()
+
+    def _registar_no_banco(self, user_id, analysis_id, dia):
+        ja_vista = DailyUserView.query.filter_by(user_id=user_id, analysis_id=analysis_id, view_date=dia).first()
+        if ja_vista:
+            return True
+        if DailyUserView.query.filter_by(user_id=user_id, view_date=dia).count() >= self.limite:
+            return False
+        self._gravar([{'user_id': user_id, 'analysis_id': analysis_id, 'view_date': dia}])
+        return True
+
+    def _gravar(self, linhas):
+        # ON CONFLICT DO NOTHING: a restrição única torna a escrita idempotente (reenvios e workers em paralelo).
+        db.session.execute(insert(DailyUserView).values(linhas).on_conflict_do_nothing(
+            constraint='_user_analysis_date_uc'))
+        db.session.commit()
+
+    def descarregar(self):
+        """Grava em lote as visualizações pendentes. Devolve o número de registos processados."""
+        total = 0
+        while True:
+            pendentes = redis_client.lpop(CHAVE_PENDENTES, self.tamanho_lote)
+            if not pendentes:
+                return total
+            linhas = [json.loads(p) for p in pendentes]
+            for linha in linhas:
+                linha['view_date'] = date.fromisoformat(linha['view_date'])
+            try:
+                self._gravar(linhas)
+            except Exception:
+                db.session.rollback()
+                # Devolve o lote à fila para a próxima tentativa, sem perder visualizações.
+                redis_client.lpush(CHAVE_PENDENTES, *reversed(pendentes))
+                raise
+            total += len(linhas)
+
+    def _executar_escritor(self, app):
+        with app.app_context():
+            while True:
+                time.sleep(self.intervalo_escrita)
+                try:
+                    self.descarregar()
+                except Exception as e:
+                    current_app.logger.error(f"Erro ao gravar visualizações pendentes: {e}", exc_info=True)
+                finally:
+                    db.session.remove()
+
+    def _garantir_escritor(self):
+        # Uma thread de escrita por processo: após o fork do gunicorn cada worker arranca a sua.
+        pid = os.getpid()
+        if self._escritor_pid == pid:
+            return
+        with self._lock:
+            if self._escritor_pid == pid:
+                return
+            app = current_app._get_current_object()
+            threading.Thread(target=self._executar_escritor, args=(app,), daemon=True).start()
+            self._escritor_pid = pid
+
+
+medidor = MedidorVisualizacoes(LIMITE_VISUALIZACOES_GRATUITAS, VISUALIZACOES_INTERVALO_ESCRITA, VISUALIZACOES_LOTE)
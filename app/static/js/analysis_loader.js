@@ -35,6 +35,55 @@ function initializeAnalysisLoader(apiUrl) {
         }
     }
 
+    function renderCard(resultado, provisional) {
+        let link = `<a href="/analysis/${resultado.analysis_id}" role="button" class="outline">Ver Análise</a>`;
+        let recommendation = `<strong>${resultado.recomendacao}</strong>`;
+        if (provisional) {
+            link = `<a href="#" role="button" class="outline secondary disabled" aria-busy="true">A finalizar</a>`;
+        } else if (resultado.error) {
+            link = `<a href="#" role="button" class="outline secondary disabled">Indisponível</a>`;
+            recommendation = `<strong style="color: var(--danger);">${resultado.recomendacao}</strong>`;
+        }
+        const matchId = resultado.match_id ? ` data-match-id="${resultado.match_id}"` : '';
+
+        return `
+            <article class="match-card"${matchId}>
+                <div class="match-card-time">${resultado.horario || 'N/A'}</div>
+                <div class="match-card-header">
+                    <div class="team">
+                        <img src="${resultado.mandante_escudo}" alt="Escudo do ${resultado.mandante_nome}">
+                        <strong>${resultado.mandante_nome}</strong>
+                    </div>
+                    <span class="vs">vs</span>
+                    <div class="team">
+                        <img src="${resultado.visitante_escudo}" alt="Escudo do ${resultado.visitante_nome}">
+                        <strong>${resultado.visitante_nome}</strong>
+                    </div>
+                </div>
+                <footer class="match-card-footer">
+                    <div class="scenario">
+                        <span>Cenário Provável:</span>
+                        ${recommendation}
+                    </div>
+                    ${link}
+                </footer>
+            </article>
+        `;
+    }
+
+    // Um card provisório (mercado principal ainda antes da análise completa) é substituído pelo card final.
+    function placeCard(resultado, provisional) {
+        const cardHtml = renderCard(resultado, provisional);
+        const existing = resultado.match_id ? container.querySelector(`[data-match-id="${resultado.match_id}"]`) : null;
+        if (existing) {
+            existing.outerHTML = cardHtml;
+        } else if (currentLeagueContainer) {
+            currentLeagueContainer.insertAdjacentHTML('beforeend', cardHtml);
+        }
+    }
+
+    let currentLeagueContainer = null;
+
     datePicker.value = new Date().toISOString().split('T')[0];
     fetchAnalyses();
 
@@ -65,12 +114,18 @@ function initializeAnalysisLoader(apiUrl) {
         const fullApiUrl = `${apiUrl}?date=${selectedDate}`;
         eventSource = new EventSource(fullApiUrl);
 
-        let currentLeagueContainer = null;
+        currentLeagueContainer = null;
         let leagueId = '';
         let hasFoundGames = false;
+        let reconnecting = false;
 
         eventSource.onmessage = function(event) {
             const resultado = JSON.parse(event.data);
+
+            if (reconnecting) {
+                reconnecting = false;
+                startLoadingAnimation(hasFoundGames ? 'Gerando análises' : 'Encontrando partidas');
+            }
             
             if (skeletonGrid.style.display === 'grid') {
                 skeletonGrid.style.display = 'none';
@@ -93,6 +148,9 @@ function initializeAnalysisLoader(apiUrl) {
                         `);
                         currentLeagueContainer = document.querySelector(`#container-${leagueId} .league-grid`);
                         break;
+                    case 'provisional':
+                        placeCard(resultado, true);
+                        break;
                     case 'no_games':
                         stopLoadingAnimation();
                         skeletonLoader.style.display = 'none';
@@ -107,43 +165,28 @@ function initializeAnalysisLoader(apiUrl) {
                         container.insertAdjacentHTML('beforeend', `<p style="text-align: center; color: var(--success); margin-top: 2em;">✅ Busca Concluída!</p>`);
                         eventSource.close();
                         break;
+                    case 'error':
+                        // Evento terminal: sem fechar aqui o navegador reconectaria indefinidamente com Last-Event-ID.
+                        eventSource.close();
+                        stopLoadingAnimation();
+                        skeletonLoader.style.display = 'none';
+                        loaderText.style.display = 'none';
+                        container.insertAdjacentHTML('beforeend', `<p style="color: var(--danger); text-align: center;">${resultado.message || 'Erro ao gerar as análises.'}</p>`);
+                        break;
                 }
                 return;
             }
 
-            if (!currentLeagueContainer) return;
-
-            // --- LÓGICA DO CARD ATUALIZADA ---
-            const link = resultado.error ? `<a href="#" role="button" class="outline secondary disabled">Indisponível</a>` : `<a href="/analysis/${resultado.analysis_id}" role="button" class="outline">Ver Análise</a>`;
-            const recommendation = resultado.error ? `<strong style="color: var(--danger);">${resultado.recomendacao}</strong>` : `<strong>${resultado.recomendacao}</strong>`;
-
-            const cardHtml = `
-                <article class="match-card">
-                    <div class="match-card-time">${resultado.horario || 'N/A'}</div>
-                    <div class="match-card-header">
-                        <div class="team">
-                            <img src="${resultado.mandante_escudo}" alt="Escudo do ${resultado.mandante_nome}">
-                            <strong>${resultado.mandante_nome}</strong>
-                        </div>
-                        <span class="vs">vs</span>
-                        <div class="team">
-                            <img src="${resultado.visitante_escudo}" alt="Escudo do ${resultado.visitante_nome}">
-                            <strong>${resultado.visitante_nome}</strong>
-                        </div>
-                    </div>
-                    <footer class="match-card-footer">
-                        <div class="scenario">
-                            <span>Cenário Provável:</span>
-                            ${recommendation}
-                        </div>
-                        ${link}
-                    </footer>
-                </article>
-            `;
-            currentLeagueContainer.insertAdjacentHTML('beforeend', cardHtml);
+            placeCard(resultado, false);
         };
 
         eventSource.onerror = function() {
+            // Enquanto o navegador tenta reconectar, o servidor retoma o stream a partir do último evento recebido (Last-Event-ID).
+            if (eventSource.readyState === EventSource.CONNECTING) {
+                reconnecting = true;
+                startLoadingAnimation('Reconectando');
+                return;
+            }
             eventSource.close();
             stopLoadingAnimation();
             skeletonLoader.style.display = 'none';
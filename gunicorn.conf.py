@@ -0,0 +1,28 @@
+# gunicorn.conf.py
+#
+# Configuração do gunicorn (carregada automaticamente quando o gunicorn é iniciado na raiz do projeto):
+#     gunicorn run:app
+#
+# Modo gevent (recomendado em produção): GUNICORN_WORKER_CLASS=gevent
+# Cada worker passa a atender centenas de ligações SSE de /api/analise em simultâneo. O worker gevent
+# faz monkey-patching da biblioteca padrão, por isso o I/O de football_api (requests), ai_analyzer
+# (cliente OpenAI/httpx), Redis e as esperas do stream (time.sleep) tornam-se cooperativos sem alterações
+# no código; as threads dos pools de concorrência passam a ser greenlets. O psycopg2 não é coberto pelo
+# monkey-patching e é tornado cooperativo pelo psycogreen no post_fork abaixo.
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+# Número máximo de ligações simultâneas por worker (apenas para workers assíncronos como o gevent).
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+# Os streams SSE duram vários minutos; em workers síncronos um timeout curto mataria o worker a meio.
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30 if worker_class == 'gevent' else 600))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        server.log.info("psycopg2 em modo cooperativo (gevent) no worker %s", worker.pid)
@@ -0,0 +1,36 @@
+"""Torna única a análise por partida e data
+
+Revision ID: 8f3c2a91d4e7
+Revises: 5352d328ae1a
+Create Date: 2026-10-17 21:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3c2a91d4e7'
+down_revision = '5352d328ae1a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Remove análises duplicadas (mantém a mais antiga) antes de criar o índice único.
+    op.execute("""
+        DELETE FROM analysis a
+        USING analysis b
+        WHERE a.match_api_id = b.match_api_id
+          AND a.analysis_date = b.analysis_date
+          AND a.id > b.id
+    """)
+    with op.batch_alter_table('analysis', schema=None) as batch_op:
+        batch_op.drop_index('idx_match_date')
+        batch_op.create_index('idx_match_date', ['match_api_id', 'analysis_date'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('analysis', schema=None) as batch_op:
+        batch_op.drop_index('idx_match_date')
+        batch_op.create_index('idx_match_date', ['match_api_id', 'analysis_date'], unique=False)
@@ -0,0 +1,61 @@
+"""Guarda o conteúdo da análise em JSONB e projeta os campos do card em colunas
+
+Revision ID: c41e7b2f9a05
+Revises: 8f3c2a91d4e7
+Create Date: 2026-10-17 22:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7b2f9a05'
+down_revision = '8f3c2a91d4e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('analysis', schema=None) as batch_op:
+        batch_op.alter_column('content',
+               existing_type=sa.Text(),
+               type_=postgresql.JSONB(astext_type=sa.Text()),
+               existing_nullable=False,
+               postgresql_using='content::jsonb')
+        batch_op.add_column(sa.Column('mandante_nome', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('mandante_escudo', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('visitante_nome', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('visitante_escudo', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('liga_nome', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('horario', sa.String(length=5), nullable=True))
+        batch_op.add_column(sa.Column('recomendacao', sa.Text(), nullable=True))
+
+    # Preenche as novas colunas a partir do conteúdo já existente.
+    op.execute("""
+        UPDATE analysis SET
+            mandante_nome = content->>'mandante_nome',
+            mandante_escudo = content->>'mandante_escudo',
+            visitante_nome = content->>'visitante_nome',
+            visitante_escudo = content->>'visitante_escudo',
+            liga_nome = content->>'liga_nome',
+            horario = content->>'horario',
+            recomendacao = content->>'recomendacao'
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('analysis', schema=None) as batch_op:
+        batch_op.drop_column('recomendacao')
+        batch_op.drop_column('horario')
+        batch_op.drop_column('liga_nome')
+        batch_op.drop_column('visitante_escudo')
+        batch_op.drop_column('visitante_nome')
+        batch_op.drop_column('mandante_escudo')
+        batch_op.drop_column('mandante_nome')
+        batch_op.alter_column('content',
+               existing_type=postgresql.JSONB(astext_type=sa.Text()),
+               type_=sa.Text(),
+               existing_nullable=False,
+               postgresql_using='content::text')
@@ -0,0 +1,134 @@
+"""Converte analysis_date para DATE, particiona analysis por mês e cria o arquivo de análises
+
+Revision ID: e5b8d17c3a40
+Revises: c41e7b2f9a05
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from datetime import date, timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b8d17c3a40'
+down_revision = 'c41e7b2f9a05'
+branch_labels = None
+depends_on = None
+
+# Meses futuros com partição criada já na migração (depois, `flask analises particoes` ou o agendador).
+MESES_A_FRENTE = 3
+
+COLUNAS = ("id, match_api_id, analysis_date, content, generated_at, mandante_nome, mandante_escudo, "
+           "visitante_nome, visitante_escudo, liga_nome, horario, recomendacao")
+
+
+def _mes_seguinte(dia):
+    return (dia.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    # A tabela existente não pode ser convertida em particionada: é renomeada e os dados são copiados.
+    op.execute("ALTER TABLE analysis RENAME TO analysis_antiga")
+    op.execute("ALTER TABLE analysis_antiga RENAME CONSTRAINT analysis_pkey TO analysis_antiga_pkey")
+    op.execute("ALTER INDEX idx_match_date RENAME TO idx_match_date_antigo")
+
+    # A chave de partição tem de fazer parte da chave primária e de qualquer índice único.
+    op.execute("""
+        CREATE TABLE analysis (
+            id INTEGER NOT NULL DEFAULT nextval('analysis_id_seq'),
+            match_api_id INTEGER NOT NULL,
+            analysis_date DATE NOT NULL,
+            content JSONB NOT NULL,
+            generated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            mandante_nome VARCHAR(100),
+            mandante_escudo VARCHAR(255),
+            visitante_nome VARCHAR(100),
+            visitante_escudo VARCHAR(255),
+            liga_nome VARCHAR(100),
+            horario VARCHAR(5),
+            recomendacao TEXT,
+            CONSTRAINT analysis_pkey PRIMARY KEY (id, analysis_date)
+        ) PARTITION BY RANGE (analysis_date)
+    """)
+    op.execute("CREATE UNIQUE INDEX idx_match_date ON analysis (match_api_id, analysis_date)")
+    # Rede de segurança: linhas de meses sem partição; são movidas quando a partição do mês é criada.
+    op.execute("CREATE TABLE analysis_padrao PARTITION OF analysis DEFAULT")
+
+    hoje = date.today().replace(day=1)
+    primeira = conn.execute(sa.text("SELECT min(analysis_date) FROM analysis_antiga")).scalar()
+    inicio = min(date.fromisoformat(primeira).replace(day=1), hoje) if primeira else hoje
+    fim = hoje
+    for _ in range(MESES_A_FRENTE + 1):
+        fim = _mes_seguinte(fim)
+    while inicio < fim:
+        seguinte = _mes_seguinte(inicio)
+        op.execute(f"CREATE TABLE analysis_p{inicio.year}_{inicio.month:02d} PARTITION OF analysis "
+                   f"FOR VALUES FROM ('{inicio}') TO ('{seguinte}')")
+        inicio = seguinte
+
+    op.execute(f"""
+        INSERT INTO analysis ({COLUNAS})
+        SELECT {COLUNAS.replace('analysis_date', 'analysis_date::date')} FROM analysis_antiga
+    """)
+    op.execute("ALTER TABLE analysis_antiga ALTER COLUMN id DROP DEFAULT")
+    op.execute("ALTER SEQUENCE analysis_id_seq OWNED BY analysis.id")
+    op.execute("DROP TABLE analysis_antiga")
+
+    op.create_table('analysis_arquivo',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('match_api_id', sa.Integer(), nullable=False),
+        sa.Column('analysis_date', sa.Date(), nullable=False),
+        sa.Column('generated_at', sa.DateTime(), nullable=False),
+        sa.Column('mandante_nome', sa.String(length=100), nullable=True),
+        sa.Column('visitante_nome', sa.String(length=100), nullable=True),
+        sa.Column('conteudo_comprimido', sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # O conteúdo já vem comprimido com zlib; evita que o TOAST tente comprimi-lo outra vez.
+    op.execute("ALTER TABLE analysis_arquivo ALTER COLUMN conteudo_comprimido SET STORAGE EXTERNAL")
+
+    with op.batch_alter_table('daily_user_view', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_daily_user_view_view_date'), ['view_date'], unique=False)
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.execute(sa.text("SELECT count(*) FROM analysis_arquivo")).scalar():
+        raise RuntimeError("Existem análises arquivadas; restaure-as para a tabela analysis antes de reverter esta migração.")
+
+    with op.batch_alter_table('daily_user_view', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_daily_user_view_view_date'))
+
+    op.drop_table('analysis_arquivo')
+
+    op.execute("ALTER TABLE analysis RENAME TO analysis_particionada")
+    op.execute("ALTER TABLE analysis_particionada RENAME CONSTRAINT analysis_pkey TO analysis_particionada_pkey")
+    op.execute("ALTER INDEX idx_match_date RENAME TO idx_match_date_particionado")
+    op.execute("""
+        CREATE TABLE analysis (
+            id INTEGER NOT NULL DEFAULT nextval('analysis_id_seq'),
+            match_api_id INTEGER NOT NULL,
+            analysis_date VARCHAR(10) NOT NULL,
+            content JSONB NOT NULL,
+            generated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            mandante_nome VARCHAR(100),
+            mandante_escudo VARCHAR(255),
+            visitante_nome VARCHAR(100),
+            visitante_escudo VARCHAR(255),
+            liga_nome VARCHAR(100),
+            horario VARCHAR(5),
+            recomendacao TEXT,
+            CONSTRAINT analysis_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("CREATE UNIQUE INDEX idx_match_date ON analysis (match_api_id, analysis_date)")
+    op.execute(f"""
+        INSERT INTO analysis ({COLUNAS})
+        SELECT {COLUNAS.replace('analysis_date', "to_char(analysis_date, 'YYYY-MM-DD')")} FROM analysis_particionada
+    """)
+    op.execute("ALTER TABLE analysis_particionada ALTER COLUMN id DROP DEFAULT")
+    op.execute("ALTER SEQUENCE analysis_id_seq OWNED BY analysis.id")
+    op.execute("DROP TABLE analysis_particionada")
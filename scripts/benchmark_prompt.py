@@ -0,0 +1,117 @@
+# scripts/benchmark_prompt.py
+#
+# Compara o prompt da análise em JSON indentado (formato antigo) com o formato compacto atual:
+# tokens de entrada e, com --openai, tempo até ao primeiro token e tempo total no modelo configurado.
+#
+#     python scripts/benchmark_prompt.py                 # dados sintéticos, só tokens
+#     python scripts/benchmark_prompt.py --db 20         # últimas 20 análises guardadas
+#     python scripts/benchmark_prompt.py --openai -n 3   # inclui latência (consome créditos da OpenAI)
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import ai_analyzer  # noqa: E402
+
+ESCUDO = "https://media.api-sports.io/football/teams/{}.png"
+
+
+def _jogo(mandante, visitante, gols_m, gols_v, dia):
+    return {
+        "data": f"{dia:02d}.09.2026",
+        "mandante_nome": mandante, "mandante_escudo": ESCUDO.format(len(mandante) * 7), "mandante_gols": gols_m,
+        "visitante_nome": visitante, "visitante_escudo": ESCUDO.format(len(visitante) * 11), "visitante_gols": gols_v,
+        "total_gols": gols_m + gols_v, "diferenca_gols": gols_m - gols_v
+    }
+
+
+def dados_sinteticos():
+    """Dados com a forma de `dados_para_ia` em analysis_logic (5 jogos por histórico)."""
+    placares = [(2, 1), (0, 0), (3, 2), (1, 1), (2, 0)]
+    historico = {
+        "ultimos_jogos_mandante": [_jogo("Flamengo", rival, *placar, dia) for rival, placar, dia in
+                                   zip(["Vasco", "Santos", "Bahia", "Grêmio", "Ceará"], placares, range(1, 6))],
+        "ultimos_jogos_visitante": [_jogo(rival, "Palmeiras", *placar, dia) for rival, placar, dia in
+                                    zip(["Fortaleza", "Botafogo", "Cruzeiro", "Internacional", "Vitória"], placares, range(6, 11))],
+        "confrontos_diretos": [_jogo("Flamengo", "Palmeiras", *placar, dia) for placar, dia in zip(placares, range(11, 16))],
+    }
+    stats = {"escanteios": {"jogos": [10, 8, 11, 9, 12]}, "cartoes": {"jogos": [4, 3, 5, 2, 4]}}
+    return {
+        "estatisticas": {tipo: {"mandante": stats, "visitante": stats} for tipo in ("individuais", "h2h")},
+        "historico_recente": {categoria: {"jogos": jogos} for categoria, jogos in historico.items()},
+    }, {"mandante_nome": "Flamengo", "visitante_nome": "Palmeiras"}
+
+
+def dados_da_base(limite):
+    """Reconstrói `dados_para_ia` a partir das últimas análises guardadas (o conteúdo guarda os dados brutos)."""
+    from app import create_app
+    from app.models import Analysis
+    app = create_app()
+    amostras = []
+    with app.app_context():
+        for analise in Analysis.query.order_by(Analysis.generated_at.desc()).limit(limite):
+            content = analise.content
+            estatisticas = {tipo: {time: {nome: {"jogos": valores["jogos"]} for nome, valores in stats.items()}
+                                   for time, stats in times.items()}
+                            for tipo, times in content.get("estatisticas", {}).items()}
+            historico = {categoria: {"jogos": dados["jogos"]} for categoria, dados in content.get("dados_brutos", {}).items()}
+            partida = {"mandante_nome": content["mandante_nome"], "visitante_nome": content["visitante_nome"]}
+            amostras.append(({"estatisticas": estatisticas, "historico_recente": historico}, partida))
+    return amostras
+
+
+def json_indentado(dados):
+    return json.dumps(dados, indent=2)
+
+
+def medir_latencia(prompt):
+    """Tempo até ao primeiro token e tempo total de uma chamada em streaming."""
+    inicio = time.perf_counter()
+    primeiro = None
+    stream = ai_analyzer.client.chat.completions.create(
+        messages=[{"role": "system", "content": ai_analyzer.MENSAGEM_SISTEMA}, {"role": "user", "content": prompt}],
+        model=ai_analyzer.MODELO_IA,
+        response_format={"type": "json_object"},
+        temperature=ai_analyzer.TEMPERATURA_IA,
+        stream=True
+    )
+    for chunk in stream:
+        if primeiro is None and chunk.choices and chunk.choices[0].delta.content:
+            primeiro = time.perf_counter() - inicio
+    return primeiro or 0.0, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do prompt da análise: JSON indentado vs formato compacto.")
+    parser.add_argument('--db', type=int, default=0, help="Usa as últimas N análises da base de dados.")
+    parser.add_argument('--openai', action='store_true', help="Mede também a latência no modelo (chamadas reais).")
+    parser.add_argument('-n', type=int, default=3, help="Repetições por formato na medição de latência.")
+    args = parser.parse_args()
+
+    amostras = dados_da_base(args.db) if args.db else [dados_sinteticos()]
+    if not amostras:
+        sys.exit("Nenhuma análise encontrada na base de dados.")
+
+    formatos = {"json_indent2": json_indentado, "compacto": ai_analyzer.formatar_dados_compactos}
+    resultados = {}
+    for nome, serializar in formatos.items():
+        prompts = [ai_analyzer.montar_prompt(partida, dados, serializar=serializar) for dados, partida in amostras]
+        tokens = [ai_analyzer.contar_tokens(prompt) for prompt in prompts]
+        resultados[nome] = {"tokens_medio": round(statistics.mean(tokens), 1), "tokens_max": max(tokens)}
+        if args.openai:
+            medicoes = [medir_latencia(prompts[i % len(prompts)]) for i in range(args.n)]
+            resultados[nome]["primeiro_token_s"] = round(statistics.median(m[0] for m in medicoes), 2)
+            resultados[nome]["total_s"] = round(statistics.median(m[1] for m in medicoes), 2)
+
+    antes, depois = resultados["json_indent2"]["tokens_medio"], resultados["compacto"]["tokens_medio"]
+    resultados["reducao_tokens_pct"] = round(100 * (antes - depois) / antes, 1)
+    resultados["contagem"] = "tiktoken" if ai_analyzer.tiktoken else "estimativa (4 caracteres por token)"
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+# scripts/fake_openai_batch.py
+#
+# Servidor local que imita os endpoints de ficheiros e lotes da OpenAI usados por app/services/ia_batch.py,
+# para testar a pré-geração em lote sem custos. Cada pedido recebe uma análise válida que escolhe o primeiro
+# mercado da secção CANDIDATOS do prompt.
+#
+#     python scripts/fake_openai_batch.py --porta 8765 --atraso 5
+#     IA_BATCH_BASE_URL=http://127.0.0.1:8765/v1 IA_BATCH_INTERVALO_POLL=1 flask analises pregerar --modo batch
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import default as politica_email
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FICHEIROS = {}
+LOTES = {}
+_lock = threading.Lock()
+ATRASO = 0.0
+FALHAR_A_CADA = 0
+
+PADRAO_CANDIDATOS = re.compile(r"CANDIDATOS \(mercado\|confianca\|evidencia\)\n(.*?)\n\s*```", re.S)
+
+
+def _novo_id(prefixo):
+    return f"{prefixo}-{uuid.uuid4().hex[:24]}"
+
+
+def _ficheiro(conteudo, nome, finalidade):
+    ficheiro_id = _novo_id("file")
+    FICHEIROS[ficheiro_id] = {"id": ficheiro_id, "object": "file", "bytes": len(conteudo), "created_at": int(time.time()),
+                              "filename": nome, "purpose": finalidade, "status": "processed", "conteudo": conteudo}
+    return FICHEIROS[ficheiro_id]
+
+
+def _analise(prompt):
+    """Resposta com a estrutura de AnaliseCompletaIA, usando os candidatos que o prompt traz."""
+    correspondencia = PADRAO_CANDIDATOS.search(prompt)
+    candidatos = [linha.strip().split("|") for linha in correspondencia.group(1).splitlines()] if correspondencia else []
+    favoraveis = [{"mercado": mercado, "justificativa": evidencia} for mercado, _, evidencia in candidatos] or \
+                 [{"mercado": "Mais de 1.5 Gols", "justificativa": "Resposta do servidor falso."}]
+    desempenho = {"forma": "Forma recente (servidor falso).", "ponto_forte": "-", "ponto_fraco": "-"}
+    return {
+        "mercado_principal": favoraveis[0]["mercado"],
+        "analise_detalhada": {
+            "desempenho_mandante": desempenho,
+            "desempenho_visitante": desempenho,
+            "confronto_direto": "Confronto direto (servidor falso).",
+            "informacoes_relevantes": "Gerado por scripts/fake_openai_batch.py.",
+            "mercados_favoraveis": favoraveis,
+            "cenario_provavel": favoraveis[0],
+        }
+    }
+
+
+def _processar(lote):
+    """Gera o ficheiro de resultados no formato da Batch API (uma linha por custom_id)."""
+    saidas = []
+    erros = []
+    for i, linha in enumerate(FICHEIROS[lote["input_file_id"]]["conteudo"].decode("utf-8").splitlines()):
+        pedido = json.loads(linha)
+        if FALHAR_A_CADA and (i + 1) % FALHAR_A_CADA == 0:
+            erros.append({"id": _novo_id("batch_req"), "custom_id": pedido["custom_id"], "response": None,
+                          "error": {"code": "server_error", "message": "Falha simulada."}})
+            continue
+        prompt = pedido["body"]["messages"][-1]["content"]
+        corpo = {"id": _novo_id("chatcmpl"), "object": "chat.completion", "created": int(time.time()),
+                 "model": pedido["body"]["model"],
+                 "choices": [{"index": 0, "finish_reason": "stop",
+                              "message": {"role": "assistant", "content": json.dumps(_analise(prompt), ensure_ascii=False)}}]}
+        saidas.append({"id": _novo_id("batch_req"), "custom_id": pedido["custom_id"],
+                       "response": {"status_code": 200, "request_id": _novo_id("req"), "body": corpo}, "error": None})
+
+    def jsonl(linhas):
+        return "\n".join(json.dumps(linha, ensure_ascii=False) for linha in linhas).encode("utf-8")
+    lote["output_file_id"] = _ficheiro(jsonl(saidas), "output.jsonl", "batch_output")["id"] if saidas else None
+    lote["error_file_id"] = _ficheiro(jsonl(erros), "errors.jsonl", "batch_output")["id"] if erros else None
+    lote["request_counts"] = {"total": len(saidas) + len(erros), "completed": len(saidas), "failed": len(erros)}
+    lote["status"] = "completed"
+    lote["completed_at"] = int(time.time())
+
+
+class Manipulador(BaseHTTPRequestHandler):
+
+    def _responder(self, corpo, estado=200, tipo="application/json"):
+        dados = corpo if isinstance(corpo, bytes) else json.dumps(corpo).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _corpo(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        with _lock:
+            if self.path == "/v1/files":
+                mensagem = BytesParser(policy=politica_email).parsebytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + self._corpo())
+                campos = {parte.get_param("name", header="content-disposition"): parte for parte in mensagem.iter_parts()}
+                ficheiro = _ficheiro(campos["file"].get_payload(decode=True), campos["file"].get_filename(),
+                                     campos["purpose"].get_content().strip())
+                return self._responder({chave: valor for chave, valor in ficheiro.items() if chave != "conteudo"})
+            if self.path == "/v1/batches":
+                pedido = json.loads(self._corpo())
+                lote = {"id": _novo_id("batch"), "object": "batch", "endpoint": pedido["endpoint"],
+                        "input_file_id": pedido["input_file_id"], "completion_window": pedido["completion_window"],
+                        "status": "in_progress", "created_at": int(time.time()), "metadata": pedido.get("metadata"),
+                        "output_file_id": None, "error_file_id": None,
+                        "request_counts": {"total": 0, "completed": 0, "failed": 0}, "_pronto_em": time.time() + ATRASO}
+                LOTES[lote["id"]] = lote
+                return self._responder(self._publico(lote))
+        self._responder({"error": {"message": "Não encontrado."}}, 404)
+
+    def do_GET(self):
+        with _lock:
+            partes = self.path.strip("/").split("/")
+            if partes[:2] == ["v1", "batches"] and len(partes) == 3 and partes[2] in LOTES:
+                lote = LOTES[partes[2]]
+                if lote["status"] == "in_progress" and time.time() >= lote["_pronto_em"]:
+                    _processar(lote)
+                return self._responder(self._publico(lote))
+            if partes[:2] == ["v1", "files"] and len(partes) == 4 and partes[3] == "content" and partes[2] in FICHEIROS:
+                return self._responder(FICHEIROS[partes[2]]["conteudo"], tipo="application/octet-stream")
+        self._responder({"error": {"message": "Não encontrado."}}, 404)
+
+    @staticmethod
+    def _publico(lote):
+        return {chave: valor for chave, valor in lote.items() if not chave.startswith("_")}
+
+
+def main():
+    global ATRASO, FALHAR_A_CADA
+    parser = argparse.ArgumentParser(description="Servidor falso da Batch API da OpenAI.")
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--atraso', type=float, default=0.0, help="Segundos até cada lote ficar concluído.")
+    parser.add_argument('--falhar-a-cada', type=int, default=0, help="Faz falhar um em cada N pedidos (0 = nenhum).")
+    args = parser.parse_args()
+    ATRASO, FALHAR_A_CADA = args.atraso, args.falhar_a_cada
+    servidor = ThreadingHTTPServer(("127.0.0.1", args.porta), Manipulador)
+    print(f"Batch API falsa em http://127.0.0.1:{args.porta}/v1")
+    servidor.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
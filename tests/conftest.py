@@ -0,0 +1,53 @@
+# tests/conftest.py
+#
+# A aplicação de teste usa a base de dados de TEST_DATABASE_URL (Postgres, como em produção) ou, por omissão,
+# SQLite em memória; o Redis é substituído pelo fakeredis e a cache da Flask-Caching por uma cache em memória.
+import itertools
+import os
+
+import fakeredis
+import pytest
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import ColumnDefault
+
+for variavel, valor in {'SECRET_KEY': 'teste', 'MAIL_PORT': '587', 'MAIL_USE_TLS': 'true'}.items():
+    os.environ.setdefault(variavel, valor)
+
+from app import cache, create_app, db, redis_client  # noqa: E402
+from app.models import Analysis  # noqa: E402
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL', 'sqlite://')
+SQLITE = TEST_DATABASE_URL.startswith('sqlite')
+
+
+_ids_analises = itertools.count(1)
+
+
+@compiles(JSONB, 'sqlite')
+def _jsonb_em_sqlite(tipo, compilador, **kw):
+    return 'JSON'
+
+
+def _proximo_id_analise():
+    return next(_ids_analises)
+
+
+if SQLITE:
+    # Em SQLite a sequência analysis_id_seq não existe e a chave primária composta não é autoincremental.
+    # O default fica fixo (o SQLAlchemy guarda-o nas instruções compiladas); cada teste reinicia o contador.
+    Analysis.__table__.c.id.default = ColumnDefault(_proximo_id_analise)
+
+
+@pytest.fixture
+def app():
+    cache.config = {'CACHE_TYPE': 'SimpleCache'}
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': TEST_DATABASE_URL, 'RATELIMIT_ENABLED': False})
+    redis_client._redis_client = fakeredis.FakeRedis(decode_responses=True)
+    global _ids_analises
+    _ids_analises = itertools.count(1)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
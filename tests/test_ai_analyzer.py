@@ -0,0 +1,38 @@
+# tests/test_ai_analyzer.py
+import json
+
+from app.services import ai_analyzer
+
+from .test_ia_batch import MERCADO, _analise, _partida
+
+CANDIDATOS = [{'mercado': MERCADO, 'tipo': 'gols', 'confianca': 1.0, 'evidencia': "Acima de 1.5: 5/5"},
+              {'mercado': "Menos de 10.5 Escanteios", 'tipo': 'escanteios', 'confianca': 0.8, 'evidencia': "Abaixo de 10.5: 4/5"}]
+
+
+def _resposta(mercado):
+    analise = _analise()
+    analise['mercado_principal'] = mercado
+    analise['analise_detalhada']['cenario_provavel']['mercado'] = mercado
+    return json.dumps(analise, ensure_ascii=False)
+
+
+def test_mercado_fora_dos_candidatos_e_rejeitado(app):
+    dados_ia, erro = ai_analyzer.validar_resposta(_partida(1), _resposta("Vitória do Casa 1"), CANDIDATOS)
+
+    assert dados_ia is None
+    assert "fora dos candidatos" in erro
+
+
+def test_mercado_candidato_fica_com_o_nome_do_candidato(app):
+    dados_ia, erro = ai_analyzer.validar_resposta(_partida(1), _resposta("menos de 10.5  escanteios"), CANDIDATOS)
+
+    assert erro is None
+    assert dados_ia['mercado_principal'] == "Menos de 10.5 Escanteios"
+    assert dados_ia['analise_detalhada']['cenario_provavel']['mercado'] == "Menos de 10.5 Escanteios"
+
+
+def test_sem_candidatos_qualquer_mercado_e_aceite(app):
+    dados_ia, erro = ai_analyzer.validar_resposta(_partida(1), _resposta("Vitória do Casa 1"))
+
+    assert erro is None
+    assert dados_ia['mercado_principal'] == "Vitória do Casa 1"
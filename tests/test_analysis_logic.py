@@ -0,0 +1,28 @@
+# tests/test_analysis_logic.py
+from datetime import date
+
+import redis
+
+from app import cache, db, redis_client
+from app.models import Analysis
+from app.services import ai_analyzer, analysis_logic
+
+from .test_ia_batch import MERCADO, _analise, _dados_partida, _partida
+
+DATA = date(2026, 10, 18)
+
+
+def test_falha_ao_invalidar_caches_nao_estraga_analise_gravada(app, monkeypatch):
+    def indisponivel(*args, **kwargs):
+        raise redis.exceptions.ConnectionError("Redis indisponível")
+
+    monkeypatch.setattr(analysis_logic, 'coletar_dados_partida', _dados_partida)
+    monkeypatch.setattr(ai_analyzer, 'gerar_analise_ia', lambda partida, dados, **kw: (_analise(), None))
+    monkeypatch.setattr(redis_client._redis_client, 'delete', indisponivel)
+    monkeypatch.setattr(cache.cache, 'delete_many', indisponivel)
+
+    card = analysis_logic._gerar_analise(_partida(1), DATA, "Casa 1 vs Fora 1")
+
+    assert not card.get('error')
+    assert card['recomendacao'] == MERCADO
+    assert db.session.execute(db.select(Analysis.match_api_id)).scalars().all() == [1]
@@ -0,0 +1,43 @@
+# tests/test_cota_api.py
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import football_api
+from app.services.cota_api import CotaApiEsgotada, GovernadorCota, segundos_retry_after
+
+
+def test_retry_after_em_segundos_data_ou_padrao():
+    assert segundos_retry_after('3') == 3.0
+    assert segundos_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert segundos_retry_after(None, padrao=7) == 7
+    assert segundos_retry_after('depois', padrao=7) == 7
+
+
+def test_429_pausa_todos_os_pedidos_pelo_retry_after(app):
+    governador = GovernadorCota(limite_por_minuto=300, espera_maxima=1)
+    governador.adquirir()
+
+    governador.registrar_limite_excedido('5')
+
+    # A pausa não cabe na espera máxima: o chamador desiste já em vez de repetir o pedido de imediato.
+    with pytest.raises(CotaApiEsgotada):
+        governador.adquirir()
+    assert 4 < governador.obter_orcamento()['pausa_restante_segundos'] <= 5
+
+
+def test_cliente_espera_o_retry_after_antes_de_repetir(app, monkeypatch):
+    respostas = [SimpleNamespace(status_code=429, headers={'Retry-After': '1'}),
+                 SimpleNamespace(status_code=200, headers={}, json=lambda: {'response': [{'id': 1}]}, raise_for_status=lambda: None)]
+    pedidos = []
+
+    def get(url, params, timeout):
+        pedidos.append(time.monotonic())
+        return respostas[len(pedidos) - 1]
+
+    monkeypatch.setattr(football_api.cliente, '_obter_sessao', lambda: SimpleNamespace(get=get))
+
+    assert football_api.cliente.get('fixtures', {'id': 1}) == [{'id': 1}]
+    assert len(pedidos) == 2
+    assert pedidos[1] - pedidos[0] >= 0.9
@@ -0,0 +1,35 @@
+# tests/test_football_api.py
+import threading
+import time
+
+from app.services import football_api
+
+ESTATISTICAS_DE_UM_TIME = [{'team': {'id': 10, 'name': "Casa"},
+                            'statistics': [{'type': 'Corner Kicks', 'value': 5}, {'type': 'Yellow Cards', 'value': 2}]}]
+
+
+def test_estatisticas_incompletas_pedidas_uma_vez_mesmo_em_simultaneo(app, monkeypatch):
+    pedidos = []
+
+    def get(endpoint, params):
+        pedidos.append(params['fixture'])
+        time.sleep(0.2)
+        return ESTATISTICAS_DE_UM_TIME
+
+    monkeypatch.setattr(football_api.cliente, 'get', get)
+
+    def obter(resultados):
+        with app.app_context():
+            resultados.append(football_api.obter_estatisticas_fixture(99))
+
+    resultados = []
+    threads = [threading.Thread(target=obter, args=(resultados,)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    obter(resultados)
+
+    assert pedidos == [99]
+    assert len(resultados) == 4
+    assert all(resultado == resultados[0] and len(resultado) == 1 for resultado in resultados)
@@ -0,0 +1,182 @@
+# tests/test_ia_batch.py
+#
+# Pré-geração em lote com um cliente falso da Batch API injetado por `cliente=`: o cliente guarda os
+# ficheiros e lotes em memória e responde a cada pedido com uma análise válida (ou com um erro).
+import json
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from app import db
+from app.models import Analysis
+from app.services import analysis_logic, ia_batch, pregeracao
+
+DATA = '2026-10-18'
+MERCADO = "Mais de 1.5 Gols"
+
+
+def _partida(match_id):
+    return {'id': match_id, 'data': f'{DATA}T18:00:00+00:00', 'mandante_id': match_id * 10, 'visitante_id': match_id * 10 + 1,
+            'mandante_nome': f"Casa {match_id}", 'visitante_nome': f"Fora {match_id}", 'mandante_escudo': '', 'visitante_escudo': '',
+            'liga_nome': "Liga Teste"}
+
+
+def _dados_partida(partida):
+    jogos = [{'data': '2026-10-01', 'mandante_nome': partida['mandante_nome'], 'visitante_nome': partida['visitante_nome'],
+              'mandante_gols': 2, 'visitante_gols': 1, 'total_gols': 3, 'diferenca_gols': 1}] * 5
+    historico = {'jogos': jogos}
+    return {
+        'estatisticas': {},
+        'dados_brutos': {'ultimos_jogos_mandante': historico, 'ultimos_jogos_visitante': historico, 'confrontos_diretos': historico},
+        'dados_para_ia': {'historico_recente': {'mandante': historico}, 'estatisticas': {},
+                          'candidatos': [{'mercado': MERCADO, 'tipo': 'gols', 'confianca': 1.0, 'evidencia': "Acima de 1.5: 5/5"}]},
+    }
+
+
+def _analise():
+    desempenho = {"forma": "Forma recente.", "ponto_forte": "-", "ponto_fraco": "-"}
+    favoravel = {"mercado": MERCADO, "justificativa": "Acima de 1.5 em todos os conjuntos."}
+    return {"mercado_principal": MERCADO,
+            "analise_detalhada": {"desempenho_mandante": desempenho, "desempenho_visitante": desempenho,
+                                  "confronto_direto": "-", "informacoes_relevantes": "-",
+                                  "mercados_favoraveis": [favoravel], "cenario_provavel": favoravel}}
+
+
+class ClienteBatchFalso:
+    """Imita client.files e client.batches da OpenAI. O lote fica concluído na consulta número `concluir_na_consulta`."""
+
+    def __init__(self, falhar=(), concluir_na_consulta=1, ao_consultar=None, mercados=None):
+        self.falhar = set(falhar)
+        self.mercados = mercados or {}
+        self.concluir_na_consulta = concluir_na_consulta
+        self.ao_consultar = ao_consultar
+        self.ficheiros = {}
+        self.lotes = {}
+        self.consultas = 0
+        self.files = SimpleNamespace(create=self._criar_ficheiro, content=self._conteudo)
+        self.batches = SimpleNamespace(create=self._criar_lote, retrieve=self._consultar_lote)
+
+    def _novo_ficheiro(self, conteudo):
+        ficheiro_id = f"file-{len(self.ficheiros) + 1}"
+        self.ficheiros[ficheiro_id] = conteudo
+        return ficheiro_id
+
+    def _criar_ficheiro(self, file, purpose):
+        nome, conteudo = file
+        return SimpleNamespace(id=self._novo_ficheiro(conteudo.decode('utf-8')))
+
+    def _conteudo(self, ficheiro_id):
+        return SimpleNamespace(text=self.ficheiros[ficheiro_id])
+
+    def _criar_lote(self, input_file_id, endpoint, completion_window, metadata):
+        lote_id = f"batch-{len(self.lotes) + 1}"
+        self.lotes[lote_id] = input_file_id
+        return SimpleNamespace(id=lote_id)
+
+    def _consultar_lote(self, lote_id):
+        self.consultas += 1
+        if self.ao_consultar:
+            self.ao_consultar()
+        if self.consultas < self.concluir_na_consulta:
+            return SimpleNamespace(id=lote_id, status='in_progress', request_counts=None, output_file_id=None, error_file_id=None)
+
+        saidas, erros = [], []
+        for linha in self.ficheiros[self.lotes[lote_id]].splitlines():
+            custom_id = json.loads(linha)['custom_id']
+            if custom_id in self.falhar:
+                erros.append({"custom_id": custom_id, "response": None, "error": {"code": "server_error", "message": "Falha simulada."}})
+            else:
+                analise = _analise()
+                analise['mercado_principal'] = self.mercados.get(custom_id, MERCADO)
+                corpo = {"choices": [{"message": {"role": "assistant", "content": json.dumps(analise, ensure_ascii=False)}}]}
+                saidas.append({"custom_id": custom_id, "response": {"status_code": 200, "body": corpo}, "error": None})
+        return SimpleNamespace(
+            id=lote_id, status='completed',
+            request_counts=SimpleNamespace(total=len(saidas) + len(erros), completed=len(saidas), failed=len(erros)),
+            output_file_id=self._novo_ficheiro("\n".join(map(json.dumps, saidas))) if saidas else None,
+            error_file_id=self._novo_ficheiro("\n".join(map(json.dumps, erros))) if erros else None,
+        )
+
+
+@pytest.fixture
+def partidas(app, monkeypatch):
+    partidas = [_partida(match_id) for match_id in (1, 2, 3)]
+    monkeypatch.setattr(ia_batch, 'descobrir_partidas', lambda data_para_buscar: partidas)
+    monkeypatch.setattr(ia_batch, 'coletar_dados_partida', _dados_partida)
+    if db.engine.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        monkeypatch.setattr(ia_batch, 'insert', insert)
+    return partidas
+
+
+def _analisadas():
+    return set(db.session.execute(
+        db.select(Analysis.match_api_id).filter(Analysis.analysis_date == date.fromisoformat(DATA))
+    ).scalars())
+
+
+def test_falhas_parciais_do_lote(partidas):
+    cliente = ClienteBatchFalso(falhar={'jogo-2'})
+
+    resultado = ia_batch.pregerar_em_lote(DATA, cliente=cliente, workers=1, intervalo_poll=0)
+
+    assert resultado['pedidos_lote'] == 3
+    assert resultado['concluidas'] == 2
+    assert resultado['falhas'] == [2]
+    assert _analisadas() == {1, 3}
+    progresso = pregeracao.obter_progresso(DATA)
+    assert progresso['estado'] == 'concluido_com_falhas'
+    assert progresso['jogos_com_falha'] == '2'
+
+
+def test_mercado_inventado_pelo_modelo_conta_como_falha(partidas):
+    cliente = ClienteBatchFalso(mercados={'jogo-3': "Vitória do Casa 3"})
+
+    resultado = ia_batch.pregerar_em_lote(DATA, cliente=cliente, workers=1, intervalo_poll=0)
+
+    assert resultado['falhas'] == [3]
+    assert _analisadas() == {1, 2}
+
+
+def test_retoma_lote_pendente_com_batch_id(partidas):
+    cliente = ClienteBatchFalso(concluir_na_consulta=2)
+
+    pendente = ia_batch.pregerar_em_lote(DATA, cliente=cliente, workers=1, intervalo_poll=0, espera_maxima=0)
+
+    assert pendente['estado'] == 'in_progress'
+    assert pregeracao.obter_progresso(DATA)['estado'] == 'lote_pendente'
+    assert _analisadas() == set()
+    ficheiros_submetidos = len(cliente.ficheiros)
+
+    resultado = ia_batch.pregerar_em_lote(DATA, cliente=cliente, workers=1, batch_id=pendente['batch_id'], intervalo_poll=0)
+
+    assert len(cliente.lotes) == 1
+    assert len(cliente.ficheiros) == ficheiros_submetidos + 1  # só o ficheiro de resultados
+    assert resultado['batch_id'] == pendente['batch_id']
+    assert resultado['concluidas'] == 3 and resultado['falhas'] == []
+    assert _analisadas() == {1, 2, 3}
+
+
+def test_analise_gravada_por_pedido_direto_durante_o_lote(partidas):
+    def pedido_direto():
+        # Um visitante abre o jogo 1 enquanto o lote está a ser processado.
+        if not _analisadas():
+            partida = partidas[0]
+            resultado_final = analysis_logic.montar_resultado_final(partida, _analise(), _dados_partida(partida))
+            resultado_final['recomendacao'] = "Gravada pelo pedido direto"
+            db.session.add(analysis_logic.criar_analise(partida['id'], date.fromisoformat(DATA), resultado_final))
+            db.session.commit()
+
+    cliente = ClienteBatchFalso(ao_consultar=pedido_direto)
+
+    resultado = ia_batch.pregerar_em_lote(DATA, cliente=cliente, workers=1, intervalo_poll=0)
+
+    assert resultado['pedidos_lote'] == 3
+    assert resultado['falhas'] == []
+    assert _analisadas() == {1, 2, 3}
+    recomendacoes = dict(db.session.execute(
+        db.select(Analysis.match_api_id, Analysis.recomendacao).filter(Analysis.analysis_date == date.fromisoformat(DATA))
+    ).all())
+    assert recomendacoes[1] == "Gravada pelo pedido direto"
+    assert recomendacoes[2] == MERCADO
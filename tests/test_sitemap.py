@@ -0,0 +1,40 @@
+# tests/test_sitemap.py
+from datetime import date
+
+from app import cache, db
+from app.services import analysis_logic, sitemap
+
+from .test_ia_batch import _analise, _dados_partida, _partida
+
+
+def _gravar_analises(*match_ids):
+    for match_id in match_ids:
+        partida = _partida(match_id)
+        resultado_final = analysis_logic.montar_resultado_final(partida, _analise(), _dados_partida(partida))
+        db.session.add(analysis_logic.criar_analise(match_id, date(2026, 10, 18), resultado_final))
+    db.session.commit()
+
+
+def test_sitemap_de_analises_e_transmitido_e_guardado_em_cache(app, monkeypatch):
+    monkeypatch.setattr(sitemap, 'SITEMAP_TAMANHO_BLOCO', 100)
+    _gravar_analises(1, 2, 3)
+    cliente = app.test_client()
+
+    resposta = cliente.get('/sitemap-analises-1.xml')
+
+    assert resposta.status_code == 200
+    # Transmitido: o tamanho não é conhecido quando a resposta começa.
+    assert 'Content-Length' not in resposta.headers
+    xml = resposta.get_data(as_text=True)
+    assert all(f"/analysis/{analysis_id}</loc>" in xml for analysis_id in (1, 2, 3))
+    assert cache.get(sitemap._chave_analises(1)) == xml
+
+    resposta = cliente.get('/sitemap-analises-1.xml')
+    assert 'Content-Length' in resposta.headers
+    assert resposta.get_data(as_text=True) == xml
+
+
+def test_pagina_de_sitemap_sem_analises_devolve_404(app):
+    _gravar_analises(1)
+
+    assert app.test_client().get('/sitemap-analises-2.xml').status_code == 404
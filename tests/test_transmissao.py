@@ -0,0 +1,42 @@
+# tests/test_transmissao.py
+import json
+
+from app import redis_client
+from app.services import transmissao
+
+DATA = '2026-10-18'
+
+
+def test_geracao_que_perde_o_lock_nao_escreve_no_novo_log(app, monkeypatch):
+    chave_log = transmissao._chave_log(DATA)
+
+    def gerar_analises(data_para_buscar):
+        yield json.dumps({'status': 'league_start', 'liga_nome': "Liga Teste"})
+        # O lock expirou a meio da geração: um cliente descartou o log e arrancou outra geração.
+        redis_client.delete(f"lock:geracao_sse:{DATA}", chave_log)
+        outra = transmissao._lock_geracao(DATA)
+        assert outra.acquire(blocking=False)
+        redis_client.rpush(chave_log, json.dumps({'status': 'league_start', 'liga_nome': "Nova geração"}))
+        yield json.dumps({'status': 'done'})
+
+    monkeypatch.setattr(transmissao, 'gerar_analises', gerar_analises)
+    lock = transmissao._lock_geracao(DATA)
+    assert lock.acquire(blocking=False)
+
+    transmissao._executar_geracao(app, DATA, lock)
+
+    eventos = [json.loads(payload) for payload in redis_client.lrange(chave_log, 0, -1)]
+    assert eventos == [{'status': 'league_start', 'liga_nome': "Nova geração"}]
+    assert transmissao._geracao_em_curso(DATA)
+
+
+def test_geracao_grava_os_eventos_e_liberta_o_lock(app, monkeypatch):
+    payloads = [json.dumps({'status': 'league_start', 'liga_nome': "Liga Teste"}), json.dumps({'status': 'done'})]
+    monkeypatch.setattr(transmissao, 'gerar_analises', lambda data_para_buscar: iter(payloads))
+    lock = transmissao._lock_geracao(DATA)
+    assert lock.acquire(blocking=False)
+
+    transmissao._executar_geracao(app, DATA, lock)
+
+    assert redis_client.lrange(transmissao._chave_log(DATA), 0, -1) == payloads
+    assert not transmissao._geracao_em_curso(DATA)